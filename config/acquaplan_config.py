@@ -4,6 +4,7 @@ Vocabulários controlados e schemas
 """
 
 from dataclasses import dataclass, field
+from pathlib import Path
 from typing import List, Optional, Dict
 from enum import Enum
 
@@ -136,6 +137,23 @@ class AcquaplanMetadata:
     # Timestamps
     processing_timestamp: str = ""
     
+    # Modo de processamento: "two_pass" | "single_pass"
+    processing_mode: str = ""
+    
+    # Resposta do modelo: "complete", "partial" (JSON cortado/incompleto,
+    # campos em missing_fields não foram recuperados) ou "skipped" (frame
+    # descartado na pré-triagem, sem chamada ao modelo; motivo em skip_reason)
+    status: str = "complete"
+    missing_fields: List[str] = field(default_factory=list)
+    skip_reason: str = ""
+    
+    # Quase-duplicata: file_id do representante cujo resultado foi reaproveitado
+    derived_from: str = ""
+    
+    # Chamadas ao modelo (tokens e tempos do Ollama, ver src/model_telemetry.py);
+    # vai no manifest ao lado de "metadata", não nos metadados gravados
+    telemetry: List[Dict] = field(default_factory=list)
+    
     def to_dict(self) -> Dict:
         """Converte para dicionário serializável"""
         return {
@@ -155,7 +173,12 @@ class AcquaplanMetadata:
             'location_guess': self.location_guess.__dict__ if self.location_guess else None,
             'activities': self.activities,
             'technical_quality': self.technical_quality,
-            'processing_timestamp': self.processing_timestamp
+            'processing_timestamp': self.processing_timestamp,
+            'processing_mode': self.processing_mode,
+            'status': self.status,
+            'missing_fields': self.missing_fields,
+            'skip_reason': self.skip_reason,
+            'derived_from': self.derived_from
         }
 
 # ============================================================================
@@ -281,6 +304,41 @@ class Config:
     # - llava:7b (mais rápido)
     VISION_MODEL = "llama3.2-vision:11b"
     
+    # Modelo do Pass 2 (só texto, sem imagem). None = o próprio VISION_MODEL.
+    # Um modelo de texto pequeno (ex.: "llama3.2:3b") fica carregado junto com
+    # o de visão (OLLAMA_MAX_LOADED_MODELS=2) e o Pass 2 de uma imagem roda em
+    # paralelo com o Pass 1 da próxima, com fila própria
+    TEXT_MODEL = None
+    TEXT_MAX_CONCURRENT_REQUESTS = None  # None = MAX_CONCURRENT_REQUESTS
+    
+    # Cascata (--cascade): Pass 1 no modelo rápido; refaz no VISION_MODEL se a
+    # resposta vier inválida/incompleta, com habitat ou espécie abaixo da
+    # confiança mínima, ou com flags arqueológicas
+    USE_CASCADE = False
+    FAST_VISION_MODEL = "llava:7b"
+    CASCADE_HABITAT_CONFIDENCE = 0.6   # = MIN_HABITAT_CONFIDENCE
+    CASCADE_SPECIES_CONFIDENCE = 0.7
+    CASCADE_ESCALATE_ARCHAEOLOGY = True
+    
+    # Modo de processamento
+    # - two_pass: Pass 1 (visão) + Pass 2 (normalização em texto), duas chamadas
+    # - single_pass: um prompt só gera todos os campos (metade das chamadas)
+    PROCESSING_MODE = "two_pass"
+    PROCESSING_MODES = ['two_pass', 'single_pass']
+    
+    # Normalização (Pass 2) no modo two_pass
+    # - llm: modelo gera título, descrições e keywords
+    # - hybrid: keywords e título por regras locais, modelo só para as descrições
+    # - fast: tudo por regras locais, sem chamar o modelo
+    NORMALIZER_PROFILE = "llm"
+    NORMALIZER_PROFILES = ['llm', 'hybrid', 'fast']
+    
+    # Pass 2 em lote: saídas do Pass 1 de K imagens numa única chamada
+    # (1 = uma chamada por imagem; ajuste K com scripts/benchmark.py pass2-batch)
+    PASS2_BATCH_SIZE = 1
+    PASS2_BATCH_MAX_WAIT = 2.0  # segundos esperando o lote encher
+    PASS2_BATCH_NUM_CTX = 16384
+    
     # Limites
     MAX_KEYWORDS = 80
     MIN_KEYWORDS = 30
@@ -294,9 +352,99 @@ class Config:
     MANIFEST_FILENAME = "acquaplan_manifest.jsonl"
     PROCESSED_CACHE = "processed_files.json"
     
+    # Instrumentação: durações por estágio (p50/p95/p99) gravadas no fim do run,
+    # em JSON ao lado do manifest e, se definido, no textfile do node exporter
+    METRICS_FILENAME = "acquaplan_metrics.json"
+    PROMETHEUS_TEXTFILE = None  # ex.: /var/lib/node_exporter/textfile_collector/acquaplan.prom
+    
+    # Pré-processamento (entrada do modelo)
+    # llama3.2-vision trabalha com tiles de 560px (até 2x2 = 1120px);
+    # para llava use 672
+    PREPROCESS_IMAGES = True
+    MODEL_INPUT_SIZE = 1120
+    THUMBNAIL_QUALITY = 90
+    THUMBNAIL_CACHE_DIR = Path.home() / ".acquaplan" / "thumbnails"
+    PREPROCESS_EXTENSIONS = ['.jpg', '.jpeg', '.tif', '.tiff', '.png']
+    
+    # RAWs: o modelo recebe o JPEG embutido pela câmera (ordem de preferência)
+    RAW_EXTENSIONS = ['.CR3', '.CR2', '.NEF', '.ARW', '.DNG', '.RAF']
+    RAW_PREVIEW_TAGS = ['PreviewImage', 'JpgFromRaw']
+    RAW_PREVIEW_CACHE_DIR = Path.home() / ".acquaplan" / "raw_previews"
+    
+    # Varredura das pastas (src/folder_scanner.py): uma passada, com subpastas;
+    # o processamento começa a cada pasta listada
+    SCAN_RECURSIVE = True
+    SCAN_EXCLUDE = ['.*', '*.lrdata']  # ocultos (._IMG do macOS, temporários), previews do Lightroom
+    
+    # Cache de inferência (chave: hash do conteúdo + modelo + prompt + opções)
+    # Mude PROMPT_VERSION ao alterar prompts para não reaproveitar saídas antigas
+    USE_INFERENCE_CACHE = True
+    PROMPT_VERSION = "1.3.2"
+    INFERENCE_CACHE_PATH = Path.home() / ".acquaplan" / "inference_cache.sqlite"
+    INFERENCE_CACHE_MAX_MB = 512
+    
+    # Quase-duplicatas (rajadas, bracketing, variantes -Edit) dentro da pasta:
+    # o modelo roda no representante e o resultado é copiado para os membros
+    REUSE_NEAR_DUPLICATES = True
+    NEAR_DUPLICATE_MAX_DISTANCE = 6  # bits de diferença no dHash de 64 bits
+    
     # Batch processing
     BATCH_SIZE = 10
-    RETRY_ATTEMPTS = 3
+    RETRY_ATTEMPTS = 3                # tentativas por passe (1 = sem retry)
+    RETRY_BACKOFF_SECONDS = 2.0       # espera antes da 2ª tentativa; dobra a cada falha
+    RETRY_MAX_BACKOFF_SECONDS = 60.0
+    
+    # Staging das saídas de cada passe por imagem: falha no Pass 2 não
+    # refaz o Pass 1 (retomada com --resume)
+    USE_PASS_STAGING = True
+    STAGING_PATH = Path.home() / ".acquaplan" / "pass_staging.sqlite"
+    STAGING_MAX_AGE_DAYS = 30
+    
+    # Pré-triagem local (NumPy) na imagem reduzida: preenche technical_quality
+    # e evita chamar o modelo para frames sem salvação
+    PRESCREEN_QUALITY = True
+    PRESCREEN_SIZE = 512
+    PRESCREEN_BLUR_THRESHOLD = 60.0   # variância do Laplaciano abaixo disso: blurred
+    PRESCREEN_HOPELESS_BLUR = 8.0     # abaixo disso: tremida/fora de foco sem salvação
+    PRESCREEN_CLIP_FRACTION = 0.25    # fração de pixels clipados: under/overexposed
+    PRESCREEN_HOPELESS_CLIP = 0.9     # quadro quase todo preto/branco (tampa, céu estourado)
+    # Frames sem salvação: defer (modelo no fim do batch), skip (sem modelo;
+    # só tecnica:* é gravado e o frame volta na próxima execução) ou process
+    PRESCREEN_HOPELESS_POLICY = "defer"
+    PRESCREEN_POLICIES = ['skip', 'defer', 'process']
+    
+    # Requisições simultâneas ao Ollama no batch em pipeline
+    # (combine com OLLAMA_NUM_PARALLEL no servidor; 1 = sequencial)
+    MAX_CONCURRENT_REQUESTS = 2
+    
+    # Timeout por chamada ao modelo em segundos (AsyncVisionPipeline)
+    REQUEST_TIMEOUT = 300
+    
+    # Respostas em streaming: se o modelo seguir emitindo espaços/texto depois
+    # que o objeto JSON fecha, a geração é interrompida (ver STREAM_DONE_WAIT)
+    STREAM_RESPONSES = True
+    
+    # Depois do '}', segundos esperando o pedaço final (done) com os totais do
+    # Ollama (tokens do prompt, carga do modelo); sem ele a telemetria é estimada
+    STREAM_DONE_WAIT = 0.5
+    
+    # Vocabulário da saída do Pass 1 / passe único:
+    # - full: campos e keywords por extenso
+    # - compact: códigos para habitat, flags, atividades, qualidade e vocabulário
+    #   de keywords (expandidos localmente), texto livre só onde precisa
+    OUTPUT_VOCABULARY = "full"
+    OUTPUT_VOCABULARIES = ['full', 'compact']
+    
+    # JSON cortado (num_predict) ou com campos faltando: recupera os campos
+    # completos e faz UMA requisição de continuação pedindo só os que faltam
+    REPAIR_CONTINUATION = True
+    
+    # Ciclo de vida do modelo no Ollama: carrega no início do batch (chamada
+    # de aquecimento cronometrada), mantém carregado com keep_alive entre as
+    # chamadas e descarrega no fim para liberar a memória
+    WARMUP_ON_START = True
+    KEEP_ALIVE = "30m"
+    UNLOAD_AFTER_BATCH = True
     
     # ExifTool
     EXIFTOOL_COMMON_ARGS = [
@@ -305,6 +453,21 @@ class Config:
         '-codedcharacterset=utf8'
     ]
     
+    # Processos exiftool persistentes (-stay_open): gravação de XMP, previews
+    # de RAW e leituras passam pelo mesmo pool
+    EXIFTOOL_PATH = "exiftool"
+    EXIFTOOL_POOL_SIZE = 2
+    EXIFTOOL_TIMEOUT = 120  # segundos por comando; estourou, o processo é reiniciado
+    
+    # XMP sidecar gravado em Python (src/xmp_writer.py) para estes formatos;
+    # DNG, JPEG e TIFF guardam os metadados no próprio arquivo (exiftool)
+    XMP_SIDECAR_EXTENSIONS = ['.CR3', '.CR2', '.NEF', '.ARW', '.RAF']
+    XMP_NAMESPACE = "http://ns.acquaplan.org/xmp/1.0/"  # prefixo acquaplan:
+    
+    # Gravação (XMP, manifest, cache) numa thread à parte; com a fila cheia o
+    # consumidor espera (backpressure) em vez de acumular resultados na memória
+    WRITER_QUEUE_SIZE = 32
+    
     # Google Drive
     DRIVE_BATCH_SIZE = 50
     DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive']
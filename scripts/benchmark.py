@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Benchmarks do Acquaplan Tagger sobre as imagens de teste/
+Compara latência e qualidade das keywords entre configurações do pipeline
+"""
+
+import json
+import statistics
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config, KEYWORD_CATEGORIES
+from src.vision_pipeline import VisionPipeline
+
+DEFAULT_IMAGES = Path(__file__).parent.parent / "teste"
+
+# Categorias aceitas em "categoria:valor" (vocabulário + prompt do Pass 2)
+KNOWN_CATEGORIES = {
+    unicodedata.normalize('NFKD', c).encode('ascii', 'ignore').decode()
+    for c in list(KEYWORD_CATEGORIES) + ['tecnica', 'conservacao', 'cores', 'elementos']
+}
+
+
+def list_images(folder: Path, limit: int = None) -> List[Path]:
+    images = sorted(
+        p for p in folder.iterdir()
+        if p.suffix.lower() in Config.PREPROCESS_EXTENSIONS
+    )
+    return images[:limit] if limit else images
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def keyword_quality(keywords: List[str]) -> Dict:
+    """
+    Métricas simples de qualidade das keywords
+    
+    - count: total de keywords
+    - unique_ratio: fração sem duplicatas (case-insensitive)
+    - hierarchical_ratio: fração no formato categoria:valor
+    - known_category_ratio: fração cuja categoria está no vocabulário
+    """
+    if not keywords:
+        return {'count': 0, 'unique_ratio': 0.0, 'hierarchical_ratio': 0.0, 'known_category_ratio': 0.0}
+    
+    lowered = [str(k).strip().lower() for k in keywords]
+    hierarchical = [k for k in lowered if ':' in k]
+    known = [
+        k for k in hierarchical
+        if unicodedata.normalize('NFKD', k.split(':', 1)[0]).encode('ascii', 'ignore').decode() in KNOWN_CATEGORIES
+    ]
+    
+    return {
+        'count': len(lowered),
+        'unique_ratio': len(set(lowered)) / len(lowered),
+        'hierarchical_ratio': len(hierarchical) / len(lowered),
+        'known_category_ratio': len(known) / len(lowered),
+    }
+
+
+def summarize_run(latencies: List[float], qualities: List[Dict], errors: int) -> Dict:
+    summary = {
+        'images': len(latencies),
+        'errors': errors,
+        'latency_mean': statistics.mean(latencies) if latencies else 0.0,
+        'latency_p50': percentile(latencies, 0.50),
+        'latency_p95': percentile(latencies, 0.95),
+    }
+    for metric in ('count', 'unique_ratio', 'hierarchical_ratio', 'known_category_ratio'):
+        values = [q[metric] for q in qualities]
+        summary[f'keywords_{metric}'] = statistics.mean(values) if values else 0.0
+    return summary
+
+
+# ============================================================================
+# MODOS: two_pass x single_pass
+# ============================================================================
+
+def benchmark_modes(images: List[Path], model: str = None) -> Dict:
+    """
+    Roda cada imagem nos dois modos, sem cache de inferência
+    
+    Returns:
+        Dict com resumo por modo e a sobreposição de keywords entre modos
+    """
+    report = {'modes': {}, 'per_image': {}}
+    keywords_by_mode = {}
+    
+    for mode in Config.PROCESSING_MODES:
+        print(f"\n⏱️  Modo {mode}")
+        pipeline = VisionPipeline(model=model, cache=False, mode=mode)
+        latencies, qualities, errors = [], [], 0
+        keywords_by_mode[mode] = {}
+        
+        for idx, image in enumerate(images, 1):
+            print(f"[{idx}/{len(images)}] {image.name}")
+            start = time.perf_counter()
+            
+            try:
+                metadata = pipeline.process_image(str(image))
+            except Exception as e:
+                errors += 1
+                print(f"  ❌ Erro: {e}")
+                continue
+            
+            elapsed = time.perf_counter() - start
+            quality = keyword_quality(metadata.keywords)
+            latencies.append(elapsed)
+            qualities.append(quality)
+            keywords_by_mode[mode][image.name] = metadata.keywords
+            
+            report['per_image'].setdefault(image.name, {})[mode] = {
+                'latency': elapsed,
+                'title': metadata.title,
+                'habitat': metadata.habitat_guess,
+                **quality
+            }
+            print(f"  {elapsed:.1f}s | {quality['count']} keywords")
+        
+        report['modes'][mode] = summarize_run(latencies, qualities, errors)
+    
+    # Sobreposição (Jaccard) das keywords entre os modos, por imagem
+    overlaps = []
+    two, single = (keywords_by_mode.get(m, {}) for m in Config.PROCESSING_MODES)
+    for name in set(two) & set(single):
+        a = {k.lower() for k in two[name]}
+        b = {k.lower() for k in single[name]}
+        if a or b:
+            overlap = len(a & b) / len(a | b)
+            overlaps.append(overlap)
+            report['per_image'][name]['keyword_overlap'] = overlap
+    report['keyword_overlap_mean'] = statistics.mean(overlaps) if overlaps else 0.0
+    
+    return report
+
+
+def print_modes_report(report: Dict):
+    print("\n" + "="*80)
+    print(f"{'modo':<14}{'imgs':>6}{'erros':>7}{'média s':>10}{'p50 s':>9}{'p95 s':>9}"
+          f"{'kw':>7}{'únicas':>9}{'cat:val':>9}{'vocab':>8}")
+    for mode, s in report['modes'].items():
+        print(
+            f"{mode:<14}{s['images']:>6}{s['errors']:>7}{s['latency_mean']:>10.1f}"
+            f"{s['latency_p50']:>9.1f}{s['latency_p95']:>9.1f}{s['keywords_count']:>7.1f}"
+            f"{s['keywords_unique_ratio']:>9.0%}{s['keywords_hierarchical_ratio']:>9.0%}"
+            f"{s['keywords_known_category_ratio']:>8.0%}"
+        )
+    print(f"\n🔁 Sobreposição média de keywords entre modos: {report['keyword_overlap_mean']:.0%}")
+    print("="*80)
+
+
+# ============================================================================
+# PASS 2 EM LOTE: escolha de K
+# ============================================================================
+
+def benchmark_pass2_batch(images: List[Path], sizes: List[int], model: str = None) -> Dict:
+    """
+    Roda o Pass 1 uma vez e mede o Pass 2 com lotes de K imagens
+    
+    Imagens que faltam na resposta do lote são refeitas individualmente;
+    esse custo entra no tempo e aparece como fallbacks.
+    """
+    pipeline = VisionPipeline(model=model, cache=False, mode='two_pass', normalizer='llm')
+    report = {'sizes': {}}
+    
+    print("\n🔍 Pass 1 (uma vez para todos os K)")
+    raw_items = []
+    for idx, image in enumerate(images, 1):
+        print(f"[{idx}/{len(images)}] {image.name}")
+        try:
+            raw_items.append(pipeline.pass1_extraction(str(image)))
+        except Exception as e:
+            print(f"  ❌ Erro: {e}")
+    
+    for size in sizes:
+        print(f"\n⏱️  K = {size}")
+        start = time.perf_counter()
+        qualities, fallbacks, errors = [], 0, 0
+        
+        for offset in range(0, len(raw_items), size):
+            chunk = raw_items[offset:offset + size]
+            if size == 1:
+                results = [None]
+            else:
+                results = pipeline.pass2_normalization_batch(chunk)
+            
+            for raw_data, normalized in zip(chunk, results):
+                if normalized is None:
+                    fallbacks += size > 1
+                    try:
+                        normalized = pipeline.pass2_normalization(raw_data)
+                    except Exception as e:
+                        errors += 1
+                        print(f"  ❌ Erro: {e}")
+                        continue
+                qualities.append(keyword_quality(normalized.get('keywords_normalized', [])))
+        
+        elapsed = time.perf_counter() - start
+        summary = summarize_run([elapsed / max(1, len(raw_items))] * len(qualities), qualities, errors)
+        summary['total_seconds'] = elapsed
+        summary['fallbacks'] = fallbacks
+        report['sizes'][str(size)] = summary
+        print(f"  {elapsed:.1f}s | {fallbacks} fallbacks")
+    
+    valid = {
+        k: s for k, s in report['sizes'].items()
+        if s['errors'] == 0 and s['fallbacks'] <= 0.1 * max(1, s['images'])
+    }
+    if valid:
+        report['best_k'] = int(min(valid, key=lambda k: valid[k]['total_seconds']))
+    
+    return report
+
+
+def print_pass2_batch_report(report: Dict):
+    print("\n" + "="*80)
+    print(f"{'K':>4}{'total s':>10}{'s/img':>9}{'fallbacks':>11}{'erros':>7}{'kw':>7}{'cat:val':>9}")
+    for size, s in report['sizes'].items():
+        print(
+            f"{size:>4}{s['total_seconds']:>10.1f}{s['latency_mean']:>9.2f}{s['fallbacks']:>11}"
+            f"{s['errors']:>7}{s['keywords_count']:>7.1f}{s['keywords_hierarchical_ratio']:>9.0%}"
+        )
+    if 'best_k' in report:
+        print(f"\n🏁 Melhor K: {report['best_k']} (use Config.PASS2_BATCH_SIZE ou --pass2-batch)")
+    print("="*80)
+
+
+# ============================================================================
+# VOCABULÁRIO: full x compact
+# ============================================================================
+
+def benchmark_vocabulary(images: List[Path], mode: str = None, model: str = None) -> Dict:
+    """
+    Roda cada imagem com a saída por extenso e com códigos compactos
+    
+    Tokens gerados vêm do JsonTimings do pipeline (eval_count ou pedaços do
+    streaming); a sobreposição compara as keywords finais dos dois vocabulários.
+    """
+    mode = mode or Config.PROCESSING_MODE
+    report = {'mode': mode, 'vocabularies': {}, 'per_image': {}}
+    keywords_by_vocab = {}
+    
+    for vocabulary in Config.OUTPUT_VOCABULARIES:
+        print(f"\n⏱️  Vocabulário {vocabulary} ({mode})")
+        pipeline = VisionPipeline(model=model, cache=False, mode=mode, vocabulary=vocabulary)
+        latencies, qualities, errors = [], [], 0
+        keywords_by_vocab[vocabulary] = {}
+        
+        for idx, image in enumerate(images, 1):
+            print(f"[{idx}/{len(images)}] {image.name}")
+            start = time.perf_counter()
+            
+            try:
+                metadata = pipeline.process_image(str(image))
+            except Exception as e:
+                errors += 1
+                print(f"  ❌ Erro: {e}")
+                continue
+            
+            elapsed = time.perf_counter() - start
+            quality = keyword_quality(metadata.keywords)
+            latencies.append(elapsed)
+            qualities.append(quality)
+            keywords_by_vocab[vocabulary][image.name] = metadata.keywords
+            report['per_image'].setdefault(image.name, {})[vocabulary] = {'latency': elapsed, **quality}
+            print(f"  {elapsed:.1f}s | {quality['count']} keywords")
+        
+        summary = summarize_run(latencies, qualities, errors)
+        timings = pipeline.json_timings.summary()
+        summary['tokens_by_stage'] = {stage: t['tokens_mean'] for stage, t in timings.items()}
+        summary['tokens_mean'] = sum(t or 0 for t in summary['tokens_by_stage'].values())
+        report['vocabularies'][vocabulary] = summary
+    
+    full, compact = (report['vocabularies'].get(v, {}) for v in Config.OUTPUT_VOCABULARIES)
+    if full.get('tokens_mean') and compact.get('latency_mean'):
+        report['token_savings'] = 1 - compact['tokens_mean'] / full['tokens_mean']
+        report['latency_savings'] = 1 - compact['latency_mean'] / full['latency_mean']
+    
+    overlaps = []
+    a_kw, b_kw = (keywords_by_vocab.get(v, {}) for v in Config.OUTPUT_VOCABULARIES)
+    for name in set(a_kw) & set(b_kw):
+        a = {k.lower() for k in a_kw[name]}
+        b = {k.lower() for k in b_kw[name]}
+        if a or b:
+            overlaps.append(len(a & b) / len(a | b))
+    report['keyword_overlap_mean'] = statistics.mean(overlaps) if overlaps else 0.0
+    
+    return report
+
+
+def print_vocabulary_report(report: Dict):
+    print("\n" + "="*80)
+    print(f"{'vocabulário':<14}{'imgs':>6}{'erros':>7}{'média s':>10}{'p95 s':>9}{'tokens':>9}"
+          f"{'kw':>7}{'cat:val':>9}{'vocab':>8}")
+    for vocabulary, s in report['vocabularies'].items():
+        print(
+            f"{vocabulary:<14}{s['images']:>6}{s['errors']:>7}{s['latency_mean']:>10.1f}"
+            f"{s['latency_p95']:>9.1f}{s['tokens_mean']:>9.0f}{s['keywords_count']:>7.1f}"
+            f"{s['keywords_hierarchical_ratio']:>9.0%}{s['keywords_known_category_ratio']:>8.0%}"
+        )
+    if 'token_savings' in report:
+        print(f"\n✂️  Economia do compact: {report['token_savings']:.0%} tokens gerados, "
+              f"{report['latency_savings']:.0%} latência")
+    print(f"🔁 Sobreposição média de keywords: {report['keyword_overlap_mean']:.0%}")
+    print("="*80)
+
+
+# ============================================================================
+# CASCATA: modelo rápido + escalonamento x só o modelo grande
+# ============================================================================
+
+def benchmark_cascade(images: List[Path], model: str = None) -> Dict:
+    """
+    Roda as imagens com e sem cascata
+    
+    Reporta taxa de escalonamento (por motivo), latência por camada e a
+    concordância de habitat com o modelo grande, para ajustar os limiares
+    CASCADE_* do Config.
+    """
+    report = {'runs': {}, 'per_image': {}}
+    habitats = {}
+    
+    for label, cascade in (('large', False), ('cascade', True)):
+        print(f"\n⏱️  {label}")
+        pipeline = VisionPipeline(model=model, cache=False, cascade=cascade)
+        latencies, qualities, errors = [], [], 0
+        habitats[label] = {}
+        
+        for idx, image in enumerate(images, 1):
+            print(f"[{idx}/{len(images)}] {image.name}")
+            start = time.perf_counter()
+            
+            try:
+                metadata = pipeline.process_image(str(image))
+            except Exception as e:
+                errors += 1
+                print(f"  ❌ Erro: {e}")
+                continue
+            
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed)
+            qualities.append(keyword_quality(metadata.keywords))
+            habitats[label][image.name] = metadata.habitat_guess
+            report['per_image'].setdefault(image.name, {})[label] = {
+                'latency': elapsed,
+                'habitat': metadata.habitat_guess,
+            }
+        
+        report['runs'][label] = summarize_run(latencies, qualities, errors)
+        if cascade:
+            report['cascade'] = pipeline.cascade_stats.summary()
+    
+    common = set(habitats['large']) & set(habitats['cascade'])
+    agree = [habitats['large'][n] == habitats['cascade'][n] for n in common]
+    report['habitat_agreement'] = sum(agree) / len(agree) if agree else 0.0
+    
+    return report
+
+
+def print_cascade_report(report: Dict):
+    print("\n" + "="*80)
+    print(f"{'execução':<12}{'imgs':>6}{'erros':>7}{'média s':>10}{'p50 s':>9}{'p95 s':>9}{'kw':>7}")
+    for label, s in report['runs'].items():
+        print(
+            f"{label:<12}{s['images']:>6}{s['errors']:>7}{s['latency_mean']:>10.1f}"
+            f"{s['latency_p50']:>9.1f}{s['latency_p95']:>9.1f}{s['keywords_count']:>7.1f}"
+        )
+    
+    c = report.get('cascade', {})
+    if c:
+        print(f"\n🪜 Escalonadas: {c['escalated']}/{c['images']} ({c['escalation_rate']:.0%})")
+        for reason, count in sorted(c['reasons'].items(), key=lambda x: -x[1]):
+            print(f"   {reason}: {count}")
+        for tier, t in c['tiers'].items():
+            print(f"   Pass 1 {tier}: média {t['mean']:.1f}s | p95 {t['p95']:.1f}s ({t['count']})")
+    print(f"🎯 Habitat igual ao modelo grande: {report['habitat_agreement']:.0%}")
+    print("="*80)
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="Benchmarks do Acquaplan Tagger"
+    )
+    parser.add_argument(
+        '--images',
+        type=Path,
+        default=DEFAULT_IMAGES,
+        help='Pasta com imagens de teste (padrão: teste/)'
+    )
+    parser.add_argument('--limit', type=int, help='Usar apenas as N primeiras imagens')
+    parser.add_argument('--model', help='Modelo de visão (padrão: Config.VISION_MODEL)')
+    parser.add_argument('--output', type=Path, help='Salvar relatório completo em JSON')
+    
+    subparsers = parser.add_subparsers(dest='command', help='Benchmark')
+    
+    subparsers.add_parser('modes', help='two_pass x single_pass: latência e keywords')
+    
+    pass2_batch = subparsers.add_parser('pass2-batch', help='Pass 2 em lote: tempo por K')
+    pass2_batch.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[1, 2, 4, 8],
+        help='Tamanhos de lote a testar'
+    )
+    
+    vocabulary = subparsers.add_parser('vocabulary', help='Saída full x compact: tokens e latência')
+    vocabulary.add_argument(
+        '--mode',
+        choices=Config.PROCESSING_MODES,
+        default=Config.PROCESSING_MODE,
+        help='Modo de processamento usado nas duas rodadas'
+    )
+    
+    subparsers.add_parser('cascade', help='Cascata x só o modelo grande: escalonamento e latência')
+    
+    args = parser.parse_args()
+    
+    if not args.command:
+        parser.print_help()
+        return
+    
+    images = list_images(args.images, args.limit)
+    if not images:
+        print(f"⚠️  Nenhuma imagem em {args.images}")
+        return
+    
+    if args.command == 'modes':
+        report = benchmark_modes(images, model=args.model)
+        print_modes_report(report)
+    
+    elif args.command == 'pass2-batch':
+        report = benchmark_pass2_batch(images, args.sizes, model=args.model)
+        print_pass2_batch_report(report)
+    
+    elif args.command == 'vocabulary':
+        report = benchmark_vocabulary(images, mode=args.mode, model=args.model)
+        print_vocabulary_report(report)
+    
+    elif args.command == 'cascade':
+        report = benchmark_cascade(images, model=args.model)
+        print_cascade_report(report)
+    
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"📄 Relatório: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+Suíte de benchmarks reproduzível contra o Ollama de mentira (scripts/fake_ollama.py)
+Roda VisionPipeline, LightroomTagger e ManifestTools sobre as imagens de teste/
+e mede imagens/s, latência por estágio e memória; compara duas revisões do git
+
+Exemplos:
+    python scripts/benchmark_suite.py run --output atual.json
+    python scripts/benchmark_suite.py compare HEAD~3 --latency 0.2 --tokens-per-sec 60
+"""
+
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+import sys
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_IMAGES = REPO_ROOT / "teste"
+SCENARIOS = ['pipeline', 'tagger', 'manifest']
+
+# Prefixo da linha de resultado impressa pelo subprocesso de cada cenário
+RESULT_PREFIX = "BENCH_RESULT "
+
+
+# ============================================================================
+# Cenários (rodam num subprocesso: memória medida isolada, Config limpa)
+# ============================================================================
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: KiB; macOS: bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _isolate_config(Config, workdir: Path, concurrency: int, cache: bool):
+    """Caches em diretório temporário; nada do usuário é lido ou escrito"""
+    Config.THUMBNAIL_CACHE_DIR = workdir / "thumbnails"
+    Config.RAW_PREVIEW_CACHE_DIR = workdir / "raw_previews"
+    Config.INFERENCE_CACHE_PATH = workdir / "inference_cache.sqlite"
+    Config.STAGING_PATH = workdir / "pass_staging.sqlite"
+    Config.USE_INFERENCE_CACHE = cache
+    Config.MAX_CONCURRENT_REQUESTS = concurrency
+
+
+def _supported_kwargs(callable_, **kwargs) -> Dict:
+    """Só os argumentos que a revisão testada conhece"""
+    import inspect
+    params = inspect.signature(callable_).parameters
+    return {k: v for k, v in kwargs.items() if k in params and v is not None}
+
+
+def _stage_summary(pipeline) -> Dict:
+    """Latência por estágio com o que a revisão tiver (StageMetrics ou JsonTimings)"""
+    metrics = getattr(pipeline, 'metrics', None)
+    if metrics is not None and hasattr(metrics, 'summary'):
+        return {
+            stage: {k: s[k] for k in ('count', 'mean', 'p50', 'p95', 'p99', 'sum') if k in s}
+            for stage, s in metrics.summary().items()
+        }
+    timings = getattr(pipeline, 'json_timings', None)
+    if timings is not None:
+        return {f"json_{stage}": s for stage, s in timings.summary().items()}
+    return {}
+
+
+def _manifest_entry(path: Path, metadata) -> Dict:
+    return {
+        'file_path': str(path),
+        'metadata': metadata.to_dict(),
+        'telemetry': getattr(metadata, 'telemetry', []),
+        'project': 'lightroom',
+        'timestamp': metadata.processing_timestamp
+    }
+
+
+def scenario_pipeline(images: List[Path], workdir: Path, args) -> Dict:
+    """VisionPipeline.process_image em sequência (o caminho do test_notebook.py)"""
+    from config.acquaplan_config import Config
+    _isolate_config(Config, workdir, args.concurrency, args.cache)
+    from src.vision_pipeline import VisionPipeline
+    
+    pipeline = VisionPipeline()
+    latencies, errors = [], 0
+    manifest = workdir / "pipeline_manifest.jsonl"
+    
+    start = time.perf_counter()
+    with open(manifest, 'w', encoding='utf-8') as f:
+        for image in images:
+            t = time.perf_counter()
+            try:
+                metadata = pipeline.process_image(str(image))
+                f.write(json.dumps(_manifest_entry(image, metadata), ensure_ascii=False) + '\n')
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - t)
+    wall = time.perf_counter() - start
+    
+    return {
+        'images': len(images),
+        'errors': errors,
+        'wall_seconds': wall,
+        'images_per_sec': (len(images) - errors) / wall if wall else 0.0,
+        'image_p50': statistics.median(latencies) if latencies else 0.0,
+        'image_max': max(latencies, default=0.0),
+        'stages': _stage_summary(pipeline),
+    }
+
+
+def scenario_tagger(images: List[Path], workdir: Path, args) -> Dict:
+    """LightroomTagger.process_folder numa cópia das imagens (batch completo + sink)"""
+    from config.acquaplan_config import Config
+    _isolate_config(Config, workdir, args.concurrency, args.cache)
+    from src.lightroom_tagger import LightroomTagger
+    
+    folder = workdir / "photos"
+    folder.mkdir(exist_ok=True)
+    for image in images:
+        target = folder / image.name
+        if not target.exists():
+            shutil.copy2(image, target)
+    
+    # Sem exiftool não há como gravar XMP: mede o resto em dry run
+    dry_run = shutil.which('exiftool') is None
+    tagger = LightroomTagger(**_supported_kwargs(
+        LightroomTagger,
+        manifest_path=workdir / "tagger_manifest.jsonl",
+        dry_run=dry_run,
+        concurrency=args.concurrency,
+        use_cache=args.cache
+    ))
+    
+    extensions = sorted({p.suffix.upper() for p in images})
+    start = time.perf_counter()
+    results = tagger.process_folder(folder, extensions=extensions, skip_processed=False)
+    wall = time.perf_counter() - start
+    
+    return {
+        'images': len(images),
+        'errors': len(images) - len(results),
+        'wall_seconds': wall,
+        'images_per_sec': len(results) / wall if wall else 0.0,
+        'dry_run': dry_run,
+        'stages': _stage_summary(tagger.pipeline),
+    }
+
+
+def scenario_manifest(images: List[Path], workdir: Path, args) -> Dict:
+    """ManifestTools sobre o manifest dos cenários anteriores, replicado --manifest-scale vezes"""
+    from src.manifest_tools import ManifestTools
+    
+    sources = [workdir / "tagger_manifest.jsonl", workdir / "pipeline_manifest.jsonl"]
+    lines = []
+    for source in sources:
+        if source.exists():
+            lines = [line for line in source.read_text(encoding='utf-8').splitlines() if line.strip()]
+            if lines:
+                break
+    if not lines:
+        raise RuntimeError("Nenhum manifest gerado pelos cenários pipeline/tagger")
+    
+    manifest = workdir / "scaled_manifest.jsonl"
+    with open(manifest, 'w', encoding='utf-8') as f:
+        for _ in range(args.manifest_scale):
+            f.write('\n'.join(lines) + '\n')
+    
+    stages = {}
+    
+    def timed(stage: str, fn):
+        t = time.perf_counter()
+        value = fn()
+        stages[stage] = {'count': 1, 'p50': time.perf_counter() - t}
+        return value
+    
+    start = time.perf_counter()
+    tools = timed('load', lambda: ManifestTools(manifest))
+    timed('stats', tools.stats)
+    timed('export_analysis', lambda: tools.to_csv_analysis(workdir / "analysis.csv"))
+    if hasattr(tools, 'telemetry'):
+        timed('telemetry', tools.telemetry)
+    wall = time.perf_counter() - start
+    
+    entries = len(lines) * args.manifest_scale
+    return {
+        'entries': entries,
+        'errors': 0,
+        'wall_seconds': wall,
+        'entries_per_sec': entries / wall if wall else 0.0,
+        'stages': stages,
+    }
+
+
+SCENARIO_FUNCS = {
+    'pipeline': scenario_pipeline,
+    'tagger': scenario_tagger,
+    'manifest': scenario_manifest,
+}
+
+
+def run_scenario_child(args):
+    """Ponto de entrada do subprocesso: importa o código da revisão em --repo"""
+    os.environ['OLLAMA_HOST'] = args.host
+    sys.path.insert(0, str(Path(args.repo).resolve()))
+    
+    images = list_images(args.images, args.limit)
+    workdir = Path(args.workdir)
+    
+    # A saída do pipeline (emojis por imagem) não interessa ao relatório
+    import io
+    import contextlib
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            result = SCENARIO_FUNCS[args.scenario](images, workdir, args)
+        result['ok'] = True
+    except Exception as e:
+        result = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+    result['peak_rss_mb'] = _peak_rss_mb()
+    
+    print(RESULT_PREFIX + json.dumps(result, ensure_ascii=False))
+
+
+# ============================================================================
+# Orquestração
+# ============================================================================
+
+def list_images(folder: Path, limit: int = None) -> List[Path]:
+    images = sorted(p for p in Path(folder).iterdir() if p.suffix.lower() in ('.jpg', '.jpeg'))
+    return images[:limit] if limit else images
+
+
+def start_server(args):
+    sys.path.insert(0, str(REPO_ROOT))
+    from scripts.fake_ollama import FakeOllama
+    return FakeOllama(
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        prompt_tokens_per_sec=args.prompt_tokens_per_sec,
+        load_time=args.load_time,
+        parallel=args.parallel,
+        error_rate=args.error_rate,
+        truncate_rate=args.truncate_rate,
+        seed=args.seed
+    ).start()
+
+
+def run_suite(repo: Path, args, label: str = None) -> Dict:
+    """Todos os cenários de uma revisão (cada repetição num diretório limpo)"""
+    label = label or str(repo)
+    report = {'repo': str(repo), 'label': label, 'scenarios': {}}
+    
+    for scenario in args.scenarios:
+        report['scenarios'][scenario] = {'runs': []}
+    
+    for repeat in range(args.repeat):
+        server = start_server(args)
+        workdir = Path(tempfile.mkdtemp(prefix="acquaplan_bench_"))
+        try:
+            for scenario in args.scenarios:
+                print(f"⏱️  [{label}] {scenario} ({repeat + 1}/{args.repeat})...")
+                result = _run_child(repo, scenario, workdir, server.url, args)
+                report['scenarios'][scenario]['runs'].append(result)
+                if not result.get('ok'):
+                    print(f"   ❌ {result.get('error')}")
+        finally:
+            server.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+        report.setdefault('server', []).append(server.stats)
+    
+    for scenario, data in report['scenarios'].items():
+        data['summary'] = summarize_runs(data['runs'])
+    return report
+
+
+def _run_child(repo: Path, scenario: str, workdir: Path, host: str, args) -> Dict:
+    cmd = [
+        sys.executable, str(Path(__file__).resolve()), '_scenario', scenario,
+        '--repo', str(repo), '--workdir', str(workdir), '--host', host,
+        '--images', str(args.images), '--concurrency', str(args.concurrency),
+        '--manifest-scale', str(args.manifest_scale)
+    ]
+    if args.limit:
+        cmd += ['--limit', str(args.limit)]
+    if args.cache:
+        cmd.append('--cache')
+    
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=str(repo))
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    
+    tail = (proc.stderr or proc.stdout).strip().splitlines()[-1:] or ['sem saída']
+    return {'ok': False, 'error': f"subprocesso saiu com {proc.returncode}: {tail[0]}"}
+
+
+def summarize_runs(runs: List[Dict]) -> Dict:
+    """Mediana das repetições bem-sucedidas (throughput, memória e p50/p95 por estágio)"""
+    ok = [r for r in runs if r.get('ok')]
+    if not ok:
+        return {'ok': False, 'error': runs[-1].get('error') if runs else 'sem execuções'}
+    
+    def median(key: str):
+        values = [r[key] for r in ok if r.get(key) is not None]
+        return statistics.median(values) if values else None
+    
+    summary = {'ok': True, 'runs': len(ok)}
+    for key in ('images_per_sec', 'entries_per_sec', 'wall_seconds', 'errors', 'peak_rss_mb', 'image_p50'):
+        value = median(key)
+        if value is not None:
+            summary[key] = value
+    
+    stages = {}
+    for stage in dict.fromkeys(s for r in ok for s in r.get('stages', {})):
+        for q in ('p50', 'p95'):
+            values = [r['stages'][stage][q] for r in ok if q in r.get('stages', {}).get(stage, {})]
+            if values:
+                stages.setdefault(stage, {})[q] = statistics.median(values)
+    summary['stages'] = stages
+    return summary
+
+
+def print_report(report: Dict):
+    print("\n" + "="*80)
+    print(f"BENCHMARK: {report['label']}")
+    print("="*80)
+    for scenario, data in report['scenarios'].items():
+        s = data['summary']
+        if not s.get('ok'):
+            print(f"\n❌ {scenario}: {s.get('error')}")
+            continue
+        rate = (f"{s['images_per_sec']:.2f} imagens/s" if 'images_per_sec' in s
+                else f"{s.get('entries_per_sec', 0):.0f} entradas/s")
+        rss = f" | pico RSS {s['peak_rss_mb']:.0f} MB" if s.get('peak_rss_mb') else ""
+        print(f"\n📊 {scenario}: {rate} | {s['wall_seconds']:.2f}s | erros {s.get('errors', 0):g}{rss}")
+        for stage, q in s['stages'].items():
+            p95 = f" | p95 {q['p95'] * 1000:.0f}ms" if 'p95' in q else ""
+            print(f"   {stage}: p50 {q['p50'] * 1000:.0f}ms{p95}")
+
+
+# ============================================================================
+# Comparação entre revisões
+# ============================================================================
+
+def compare(rev_a: str, rev_b: Optional[str], args) -> Dict:
+    """
+    Mesma suíte em duas revisões (worktrees temporárias do git)
+    
+    rev_b=None usa a árvore de trabalho atual (com mudanças não commitadas).
+    """
+    worktrees = []
+    
+    def checkout(rev: str) -> Path:
+        path = Path(tempfile.mkdtemp(prefix="acquaplan_rev_"))
+        subprocess.run(
+            ['git', 'worktree', 'add', '--detach', str(path), rev],
+            cwd=REPO_ROOT, check=True, capture_output=True
+        )
+        worktrees.append(path)
+        return path
+    
+    try:
+        repo_a = checkout(rev_a)
+        repo_b = checkout(rev_b) if rev_b else REPO_ROOT
+        report_a = run_suite(repo_a, args, label=rev_a)
+        report_b = run_suite(repo_b, args, label=rev_b or 'árvore atual')
+    finally:
+        for path in worktrees:
+            subprocess.run(
+                ['git', 'worktree', 'remove', '--force', str(path)],
+                cwd=REPO_ROOT, capture_output=True
+            )
+    
+    return {'a': report_a, 'b': report_b, 'deltas': compare_reports(report_a, report_b)}
+
+
+def compare_reports(report_a: Dict, report_b: Dict) -> Dict:
+    """Variação relativa de B sobre A por cenário (throughput, memória e p50 por estágio)"""
+    deltas = {}
+    for scenario, data in report_b['scenarios'].items():
+        a = report_a['scenarios'].get(scenario, {}).get('summary', {})
+        b = data['summary']
+        if not (a.get('ok') and b.get('ok')):
+            continue
+        
+        entry = {}
+        for key in ('images_per_sec', 'entries_per_sec', 'peak_rss_mb'):
+            if a.get(key) and b.get(key) is not None:
+                entry[key] = {'a': a[key], 'b': b[key], 'change': b[key] / a[key] - 1}
+        for stage in b['stages']:
+            qa, qb = a['stages'].get(stage), b['stages'][stage]
+            if qa and qa.get('p50'):
+                entry[f"{stage}.p50"] = {'a': qa['p50'], 'b': qb['p50'], 'change': qb['p50'] / qa['p50'] - 1}
+        deltas[scenario] = entry
+    return deltas
+
+
+def print_comparison(result: Dict, threshold: float) -> bool:
+    """Imprime a tabela; True se o throughput de algum cenário caiu mais que threshold"""
+    print("\n" + "="*80)
+    print(f"COMPARAÇÃO: {result['a']['label']} → {result['b']['label']}")
+    print("="*80)
+    
+    regression = False
+    for scenario, entry in result['deltas'].items():
+        print(f"\n📊 {scenario}")
+        for key, d in entry.items():
+            # Throughput: subir é bom; memória e latência: descer é bom
+            higher_is_better = key.endswith('_per_sec')
+            worse = -d['change'] if higher_is_better else d['change']
+            flag = " ⚠️" if worse > threshold else ""
+            if higher_is_better and worse > threshold:
+                regression = True
+            print(f"   {key}: {d['a']:.3f} → {d['b']:.3f} ({d['change']:+.1%}){flag}")
+    
+    for side in ('a', 'b'):
+        for scenario, data in result[side]['scenarios'].items():
+            if not data['summary'].get('ok'):
+                print(f"\n❌ {result[side]['label']} / {scenario}: {data['summary'].get('error')}")
+    
+    return regression
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def _add_common(parser):
+    parser.add_argument('--images', type=Path, default=DEFAULT_IMAGES, help='Pasta com JPEGs (padrão: teste/)')
+    parser.add_argument('--limit', type=int, help='Usar apenas as N primeiras imagens')
+    parser.add_argument('--concurrency', type=int, default=2, help='Config.MAX_CONCURRENT_REQUESTS')
+    parser.add_argument('--cache', action='store_true', help='Liga o cache de inferência (padrão: desligado)')
+    parser.add_argument('--manifest-scale', type=int, default=200, help='Cópias do manifest no cenário manifest')
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="Suíte de benchmarks contra o Ollama de mentira"
+    )
+    subparsers = parser.add_subparsers(dest='command', help='Comando')
+    
+    def suite_parser(name: str, help_text: str):
+        sub = subparsers.add_parser(name, help=help_text)
+        _add_common(sub)
+        sub.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+        sub.add_argument('--repeat', type=int, default=1, help='Repetições (relatório usa a mediana)')
+        sub.add_argument('--output', type=Path, help='Salvar relatório completo em JSON')
+        sub.add_argument('--latency', type=float, default=0.05, help='Latência fixa por chamada (s)')
+        sub.add_argument('--tokens-per-sec', type=float, default=400.0, help='Velocidade de geração')
+        sub.add_argument('--prompt-tokens-per-sec', type=float, default=4000.0)
+        sub.add_argument('--load-time', type=float, default=0.2, help='Carga do modelo (s)')
+        sub.add_argument('--parallel', type=int, default=2, help='OLLAMA_NUM_PARALLEL simulado')
+        sub.add_argument('--error-rate', type=float, default=0.0, help='Fração de chamadas com HTTP 500')
+        sub.add_argument('--truncate-rate', type=float, default=0.0, help='Fração de respostas cortadas')
+        sub.add_argument('--seed', type=int, default=0)
+        return sub
+    
+    suite_parser('run', 'Roda a suíte na árvore atual')
+    compare_cmd = suite_parser('compare', 'Compara duas revisões do git')
+    compare_cmd.add_argument('rev_a', help='Revisão base (ex.: HEAD~1, main)')
+    compare_cmd.add_argument('rev_b', nargs='?', help='Revisão nova (padrão: árvore atual)')
+    compare_cmd.add_argument(
+        '--threshold',
+        type=float,
+        default=0.1,
+        help='Queda de imagens/s que conta como regressão (sai com código 1)'
+    )
+    
+    # Interno: um cenário num subprocesso
+    child = subparsers.add_parser('_scenario')
+    child.add_argument('scenario', choices=SCENARIOS)
+    child.add_argument('--repo', required=True)
+    child.add_argument('--workdir', required=True)
+    child.add_argument('--host', required=True)
+    _add_common(child)
+    
+    args = parser.parse_args()
+    
+    if args.command == '_scenario':
+        run_scenario_child(args)
+        return
+    
+    if not args.command:
+        parser.print_help()
+        return
+    
+    if not list_images(args.images, args.limit):
+        print(f"⚠️  Nenhum JPEG em {args.images}")
+        return
+    args.images = args.images.resolve()
+    
+    if args.command == 'run':
+        report = run_suite(REPO_ROOT, args, label='árvore atual')
+        print_report(report)
+        regression = False
+    else:
+        report = compare(args.rev_a, args.rev_b, args)
+        print_report(report['a'])
+        print_report(report['b'])
+        regression = print_comparison(report, args.threshold)
+    
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\n✅ Relatório salvo em {args.output}")
+    
+    if regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
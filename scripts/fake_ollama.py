@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Servidor Ollama de mentira para benchmarks e testes sem o modelo
+Responde /api/chat (com e sem streaming), /api/generate, /api/tags e /api/pull
+com respostas enlatadas, latência, taxa de tokens e erros configuráveis
+"""
+
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config, KEYWORD_CATEGORIES
+
+
+# Respostas enlatadas por campo (o formato vem do schema da requisição)
+CANNED_TEXT = {
+    'scene_summary': "Manguezal na maré baixa com garças forrageando entre as raízes. "
+                     "Luz lateral de fim de tarde e água calma refletindo o céu.",
+    'title': "Garças no manguezal da Babitonga",
+    'description_short': "Garças-brancas forrageiam no manguezal durante a maré baixa.",
+    'description_long': "Grupo de garças-brancas caminha entre as raízes do mangue na maré baixa. "
+                        "A luz do fim de tarde destaca a lama e os troncos. "
+                        "Cena típica do estuário da Baía da Babitonga.",
+    'habitat_evidence': "Raízes aéreas de Rhizophora e lama exposta",
+    'archaeology_evidence': "",
+    'evidence': "Plumagem branca e bico amarelo",
+    'name_pt': "garça-branca",
+    'name_scientific': "Ardea alba",
+}
+
+# Resposta completa quando a requisição não traz schema (revisões antigas)
+PASS1_PAYLOAD = {
+    'scene_summary': CANNED_TEXT['scene_summary'],
+    'habitat_guess': 'manguezal',
+    'habitat_confidence': 0.9,
+    'habitat_evidence': CANNED_TEXT['habitat_evidence'],
+    'species_candidates': [{
+        'name_pt': 'garça-branca', 'name_scientific': 'Ardea alba', 'confidence': 0.85,
+        'evidence': CANNED_TEXT['evidence'], 'taxonomy_level': 'species'
+    }],
+    'archaeology_flags': [],
+    'archaeology_evidence': '',
+    'activities': [],
+    'technical_quality': 'sharp',
+}
+PASS2_PAYLOAD = {
+    'title': CANNED_TEXT['title'],
+    'description_short': CANNED_TEXT['description_short'],
+    'description_long': CANNED_TEXT['description_long'],
+}
+
+KEYWORD_POOL = [f"{cat}:{val}" for cat, values in KEYWORD_CATEGORIES.items() for val in values]
+
+# Tokens de imagem no prompt (llama3.2-vision: até 4 tiles de 560px)
+IMAGE_PROMPT_TOKENS = 1601
+CHARS_PER_TOKEN = 4
+
+
+def synthesize(schema: Dict, name: str = '', rng: random.Random = None) -> object:
+    """Valor válido para um JSON Schema (enums, limites de lista e maxLength respeitados)"""
+    rng = rng or random.Random(0)
+    kind = schema.get('type')
+    
+    if 'enum' in schema:
+        return schema['enum'][rng.randrange(len(schema['enum']))]
+    
+    if kind == 'object':
+        properties = schema.get('properties', {})
+        return {key: synthesize(sub, key, rng) for key, sub in properties.items()}
+    
+    if kind == 'array':
+        item = schema.get('items', {'type': 'string'})
+        low = schema.get('minItems', 0)
+        high = schema.get('maxItems', max(low, 3))
+        if name.startswith('keywords'):
+            count = min(high, max(low, 45))
+            start = rng.randrange(len(KEYWORD_POOL))
+            return [KEYWORD_POOL[(start + i) % len(KEYWORD_POOL)] for i in range(count)]
+        count = min(high, max(low, 1 if item.get('type') == 'object' else 2))
+        return [synthesize(item, name, rng) for _ in range(count)]
+    
+    if kind == 'number':
+        return round(rng.uniform(0.6, 0.95), 2)
+    if kind == 'integer':
+        return rng.randint(1, 5)
+    if kind == 'boolean':
+        return False
+    
+    text = CANNED_TEXT.get(name, f"{name or 'texto'} de exemplo")
+    return text[:schema['maxLength']] if schema.get('maxLength') else text
+
+
+class _QuietServer(ThreadingHTTPServer):
+    """Cliente que fecha a conexão (fim do stream, keep-alive) não é erro aqui"""
+    
+    daemon_threads = True
+    
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class FakeOllama:
+    """
+    Servidor HTTP com a API do Ollama usada pelo pipeline
+    
+    Tempo de uma resposta: latency + carga do modelo (primeira chamada ou
+    após keep_alive=0) + tokens do prompt / prompt_tokens_per_sec + tokens
+    gerados / tokens_per_sec. `parallel` requisições por modelo ao mesmo
+    tempo (OLLAMA_NUM_PARALLEL); as demais esperam na fila.
+    
+    Exemplo:
+        server = FakeOllama(latency=0.05, tokens_per_sec=400).start()
+        os.environ['OLLAMA_HOST'] = server.url
+        ...
+        server.stop()
+    """
+    
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: float = 0.05,
+        tokens_per_sec: float = 400.0,
+        prompt_tokens_per_sec: float = 4000.0,
+        load_time: float = 0.5,
+        parallel: int = 2,
+        error_rate: float = 0.0,
+        truncate_rate: float = 0.0,
+        models: List[str] = None,
+        seed: int = 0
+    ):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.prompt_tokens_per_sec = prompt_tokens_per_sec
+        self.load_time = load_time
+        self.parallel = max(1, parallel)
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.models = models or list(dict.fromkeys(
+            m for m in (Config.VISION_MODEL, Config.FAST_VISION_MODEL, Config.TEXT_MODEL) if m
+        ))
+        self.rng = random.Random(seed)
+        
+        self.loaded = set()
+        self.stats = {'requests': 0, 'chat': 0, 'errors': 0, 'truncated': 0, 'loads': 0, 'by_model': {}}
+        self._slots: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+        
+        self.httpd = _QuietServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    # ------------------------------------------------------------------------
+    # Simulação
+    # ------------------------------------------------------------------------
+    
+    def _slot(self, model: str) -> threading.Semaphore:
+        with self._lock:
+            if model not in self._slots:
+                self._slots[model] = threading.Semaphore(self.parallel)
+            return self._slots[model]
+    
+    def _load(self, model: str) -> float:
+        """Segundos de carga (só se o modelo não estiver na memória)"""
+        with self._lock:
+            if model in self.loaded:
+                return 0.0
+            self.loaded.add(model)
+            self.stats['loads'] += 1
+        time.sleep(self.load_time)
+        return self.load_time
+    
+    def _roll(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self.rng.random() < rate
+    
+    def _count(self, key: str, model: str = None):
+        with self._lock:
+            self.stats[key] += 1
+            if model:
+                self.stats['by_model'][model] = self.stats['by_model'].get(model, 0) + 1
+    
+    def _answer(self, body: Dict) -> str:
+        """Conteúdo da resposta: schema da requisição, ou payload enlatado"""
+        messages = body.get('messages') or []
+        schema = body.get('format')
+        
+        with self._lock:
+            rng = random.Random(self.rng.random())
+        
+        if isinstance(schema, dict):
+            return json.dumps(synthesize(schema, rng=rng), ensure_ascii=False)
+        
+        has_image = any(m.get('images') for m in messages)
+        if has_image:
+            payload = dict(PASS1_PAYLOAD, keywords_raw=synthesize({'type': 'array'}, 'keywords_raw', rng))
+        else:
+            payload = dict(PASS2_PAYLOAD, keywords_normalized=synthesize({'type': 'array'}, 'keywords', rng))
+        return json.dumps(payload, ensure_ascii=False)
+    
+    @staticmethod
+    def _prompt_tokens(body: Dict) -> int:
+        messages = body.get('messages') or []
+        text = sum(len(m.get('content') or '') for m in messages)
+        images = sum(len(m.get('images') or []) for m in messages)
+        return text // CHARS_PER_TOKEN + images * IMAGE_PROMPT_TOKENS
+    
+    def _handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def _json(self, status: int, payload: Dict):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def _body(self) -> Dict:
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length) or b'{}')
+            
+            def do_GET(self):
+                server._count('requests')
+                if self.path == '/api/tags':
+                    self._json(200, {'models': [
+                        {'name': m, 'model': m, 'size': 0, 'digest': '', 'modified_at': _now()}
+                        for m in server.models
+                    ]})
+                elif self.path == '/api/version':
+                    self._json(200, {'version': 'fake'})
+                elif self.path == '/fake/stats':
+                    with server._lock:
+                        self._json(200, json.loads(json.dumps(server.stats)))
+                else:
+                    self._json(404, {'error': f'não encontrado: {self.path}'})
+            
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            
+            def do_POST(self):
+                server._count('requests')
+                body = self._body()
+                
+                if self.path == '/api/pull':
+                    self._json(200, {'status': 'success'})
+                elif self.path == '/api/generate':
+                    self._generate(body)
+                elif self.path == '/api/chat':
+                    self._chat(body)
+                else:
+                    self._json(404, {'error': f'não encontrado: {self.path}'})
+            
+            def _generate(self, body: Dict):
+                """Aquecimento (prompt vazio) e descarga (keep_alive=0)"""
+                model = body.get('model', '')
+                if body.get('keep_alive') in (0, '0', '0s'):
+                    with server._lock:
+                        server.loaded.discard(model)
+                    load = 0.0
+                else:
+                    load = server._load(model)
+                self._json(200, {
+                    'model': model, 'created_at': _now(), 'response': '', 'done': True,
+                    'done_reason': 'load' if not body.get('prompt') else 'stop',
+                    'load_duration': int(load * 1e9), 'total_duration': int(load * 1e9)
+                })
+            
+            def _chat(self, body: Dict):
+                model = body.get('model', '')
+                server._count('chat', model)
+                
+                if server._roll(server.error_rate):
+                    server._count('errors')
+                    self._json(500, {'error': 'fake: erro injetado'})
+                    return
+                
+                with server._slot(model):
+                    start = time.perf_counter()
+                    load = server._load(model)
+                    content = server._answer(body)
+                    done_reason = 'stop'
+                    if server._roll(server.truncate_rate):
+                        server._count('truncated')
+                        content = content[:max(1, int(len(content) * server.rng.uniform(0.3, 0.9)))]
+                        done_reason = 'length'
+                    
+                    prompt_tokens = server._prompt_tokens(body)
+                    prompt_seconds = prompt_tokens / server.prompt_tokens_per_sec
+                    time.sleep(server.latency + prompt_seconds)
+                    
+                    tokens = [
+                        content[i:i + CHARS_PER_TOKEN] for i in range(0, len(content), CHARS_PER_TOKEN)
+                    ]
+                    
+                    def final(eval_seconds: float) -> Dict:
+                        return {
+                            'model': model, 'created_at': _now(),
+                            'message': {'role': 'assistant', 'content': ''},
+                            'done': True, 'done_reason': done_reason,
+                            'total_duration': int((time.perf_counter() - start) * 1e9),
+                            'load_duration': int(load * 1e9),
+                            'prompt_eval_count': prompt_tokens,
+                            'prompt_eval_duration': int(prompt_seconds * 1e9),
+                            'eval_count': len(tokens),
+                            'eval_duration': int(eval_seconds * 1e9),
+                        }
+                    
+                    if not body.get('stream', True):
+                        eval_seconds = len(tokens) / server.tokens_per_sec
+                        time.sleep(eval_seconds)
+                        response = final(eval_seconds)
+                        response['message']['content'] = content
+                        self._json(200, response)
+                        return
+                    
+                    self._stream(model, tokens, final)
+            
+            def _stream(self, model: str, tokens: List[str], final):
+                """NDJSON em chunked encoding; o cliente pode fechar no meio (parada no '}')"""
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                
+                def send(payload: Dict):
+                    data = (json.dumps(payload, ensure_ascii=False) + '\n').encode('utf-8')
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                
+                step = 1.0 / server.tokens_per_sec
+                started = time.perf_counter()
+                try:
+                    for idx, token in enumerate(tokens):
+                        # Dorme em blocos de ~10ms: sleep por token seria impreciso
+                        lag = started + (idx + 1) * step - time.perf_counter()
+                        if lag > 0.01:
+                            time.sleep(lag)
+                        send({
+                            'model': model, 'created_at': _now(),
+                            'message': {'role': 'assistant', 'content': token}, 'done': False
+                        })
+                    send(final(time.perf_counter() - started))
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # Cliente encerrou o stream: o Ollama real também para a geração
+                    self.close_connection = True
+        
+        return Handler
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Servidor Ollama de mentira (benchmarks sem o modelo)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--latency', type=float, default=0.05, help='Latência fixa por chamada (s)')
+    parser.add_argument('--tokens-per-sec', type=float, default=400.0, help='Velocidade de geração')
+    parser.add_argument('--prompt-tokens-per-sec', type=float, default=4000.0, help='Velocidade do prompt')
+    parser.add_argument('--load-time', type=float, default=0.5, help='Carga do modelo (s)')
+    parser.add_argument('--parallel', type=int, default=2, help='Requisições simultâneas por modelo')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração de chamadas com HTTP 500')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='Fração de respostas cortadas')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    server = FakeOllama(
+        host=args.host, port=args.port, latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec, prompt_tokens_per_sec=args.prompt_tokens_per_sec,
+        load_time=args.load_time, parallel=args.parallel, error_rate=args.error_rate,
+        truncate_rate=args.truncate_rate, seed=args.seed
+    )
+    print(f"🧪 Ollama de mentira em {server.url} (modelos: {', '.join(server.models)})")
+    print(f"   export OLLAMA_HOST={server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
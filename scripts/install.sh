@@ -147,7 +147,7 @@ echo "Instalando dependências Python..."
 pip install --upgrade pip > /dev/null 2>&1
 
 # Dependências core
-pip install ollama pillow > /dev/null 2>&1
+pip install "ollama>=0.4" pillow > /dev/null 2>&1
 log_info "Instalado: ollama, pillow"
 
 # ExifTool (via Homebrew, não Python)
@@ -139,12 +139,20 @@ def main():
     
     try:
         import ollama
-        check_item("ollama (Python)", True)
+        from importlib.metadata import version
+        # Schema em format=, AsyncClient(...).chat(keep_alive=...) e .get nas respostas
+        installed = version('ollama')
+        major, minor = (int(p) for p in installed.split('.')[:2])
+        all_ok &= check_item(
+            f"ollama (Python) {installed}",
+            (major, minor) >= (0, 4),
+            'Atualize com: pip install -U "ollama>=0.4"'
+        )
     except ImportError:
         all_ok &= check_item(
             "ollama (Python)",
             False,
-            "Instale com: pip install ollama"
+            'Instale com: pip install "ollama>=0.4"'
         )
     
     try:
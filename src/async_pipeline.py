@@ -0,0 +1,518 @@
+"""
+Pipeline de visão assíncrono (asyncio) sobre ollama.AsyncClient
+Para embutir o tagger em event loops (downloads do Drive, front-end web)
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+import sys
+
+import ollama
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config, AcquaplanMetadata
+from src.vision_pipeline import VisionPipeline, MISSING_FIELDS_KEY, TELEMETRY_KEY
+from src.model_telemetry import call_record
+from src.pass_staging import backoff_delay, file_fingerprint
+from src.model_cascade import escalation_reason
+from src.json_stream import JsonObjectScanner
+
+
+class AsyncVisionPipeline(VisionPipeline):
+    """
+    Versão asyncio do VisionPipeline
+    
+    Mesmos prompts e mesmo schema; as chamadas ao modelo passam por um
+    semáforo (no máximo `concurrency` em voo) e cada chamada tem timeout.
+    Cancelar a task que aguarda um método cancela a requisição HTTP.
+    
+    Os métodos assíncronos têm prefixo `a` (aprocess_image, astream_batch...):
+    os herdados continuam síncronos e funcionando, então a instância ainda
+    serve onde um VisionPipeline é esperado (ex.: BatchEngine).
+    
+    Exemplo:
+        pipeline = AsyncVisionPipeline(concurrency=4)
+        await pipeline.start()
+        async for metadata in pipeline.astream_batch(paths):
+            ...
+    """
+    
+    def __init__(
+        self,
+        model: str = None,
+        concurrency: int = None,
+        timeout: float = None,
+        host: str = None,
+        preprocess: bool = None,
+        cache: bool = None,
+        mode: str = None,
+        normalizer: str = None,
+        vocabulary: str = None,
+        cascade: bool = None,
+        text_model: str = None,
+        prescreen: bool = None,
+        hopeless_policy: str = None,
+        staging: bool = None
+    ):
+        """
+        Args:
+            model: Modelo de visão (padrão: Config.VISION_MODEL)
+            concurrency: Chamadas simultâneas ao Ollama (padrão: Config.MAX_CONCURRENT_REQUESTS)
+            timeout: Timeout por chamada em segundos (padrão: Config.REQUEST_TIMEOUT)
+            host: URL do servidor Ollama (padrão: OLLAMA_HOST ou localhost)
+            preprocess: Reduzir imagens antes do Pass 1 (padrão: Config.PREPROCESS_IMAGES)
+            cache: Usar o cache de inferência (padrão: Config.USE_INFERENCE_CACHE)
+            mode: two_pass ou single_pass (padrão: Config.PROCESSING_MODE)
+            normalizer: llm, hybrid ou fast (padrão: Config.NORMALIZER_PROFILE)
+            vocabulary: full ou compact (padrão: Config.OUTPUT_VOCABULARY)
+            cascade: Pass 1 no modelo rápido antes do grande (padrão: Config.USE_CASCADE)
+            text_model: Modelo do Pass 2 (padrão: Config.TEXT_MODEL ou o de visão)
+            prescreen: Pré-triagem local da qualidade (padrão: Config.PRESCREEN_QUALITY)
+            hopeless_policy: skip, defer ou process (padrão: Config.PRESCREEN_HOPELESS_POLICY)
+            staging: Gravar a saída de cada passe por imagem (padrão: Config.USE_PASS_STAGING)
+        """
+        super().__init__(
+            model, preprocess=preprocess, cache=cache, mode=mode,
+            normalizer=normalizer, vocabulary=vocabulary, cascade=cascade,
+            text_model=text_model, prescreen=prescreen, hopeless_policy=hopeless_policy,
+            staging=staging, verify=False
+        )
+        self.client = ollama.AsyncClient(host=host)
+        self._started = False
+        self.concurrency = max(1, concurrency or Config.MAX_CONCURRENT_REQUESTS)
+        self.timeout = timeout or Config.REQUEST_TIMEOUT
+        self.text_concurrency = max(1, Config.TEXT_MAX_CONCURRENT_REQUESTS or self.concurrency)
+        
+        # Um semáforo por modelo: o Pass 2 no modelo de texto não espera na
+        # fila do modelo de visão (mesmo modelo = mesma fila)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._text_slots = (
+            self._slots if self.text_model == self.model
+            else asyncio.Semaphore(self.text_concurrency)
+        )
+    
+    async def start(self):
+        """
+        Verifica o Ollama e baixa os modelos que faltarem, sem travar o loop
+        
+        Chamado por aprocess_image/astream_batch na primeira vez; chame antes
+        para falhar cedo.
+        """
+        if self._started:
+            return
+        try:
+            for model in self._missing_models(await self.client.list()):
+                print(f"⚠️  Modelo {model} não encontrado.")
+                print(f"📥 Baixando modelo... (isso pode demorar alguns minutos)")
+                await self.client.pull(model)
+                print(f"✅ Modelo {model} instalado com sucesso!")
+        except Exception as e:
+            raise self._connection_error(e)
+        self._started = True
+    
+    async def awarm_up(self) -> float:
+        """Carrega os modelos na memória do Ollama (requisição vazia)"""
+        total = time.perf_counter()
+        for model in self._session_models():
+            start = time.perf_counter()
+            await self.client.generate(model=model, prompt='', keep_alive=self.keep_alive)
+            print(f"🔥 Modelo {model} carregado em {time.perf_counter() - start:.1f}s")
+        self.warmup_seconds = time.perf_counter() - total
+        return self.warmup_seconds
+    
+    async def aunload(self):
+        """Descarrega os modelos da memória do Ollama"""
+        for model in self._session_models():
+            await self.client.generate(model=model, prompt='', keep_alive=0)
+            print(f"💤 Modelo {model} descarregado")
+    
+    @asynccontextmanager
+    async def amodel_session(self, warm_up: bool = None, unload: bool = None):
+        """Versão assíncrona do VisionPipeline.model_session (`async with`)"""
+        if warm_up is None:
+            warm_up = Config.WARMUP_ON_START
+        if unload is None:
+            unload = Config.UNLOAD_AFTER_BATCH
+        
+        outermost = self._sessions == 0
+        self._sessions += 1
+        
+        try:
+            if outermost and warm_up:
+                try:
+                    await self.awarm_up()
+                except Exception as e:
+                    print(f"⚠️  Aquecimento do modelo falhou: {e}")
+            yield self
+        finally:
+            self._sessions -= 1
+            if outermost and unload:
+                try:
+                    await self.aunload()
+                except Exception as e:
+                    print(f"⚠️  Não foi possível descarregar o modelo: {e}")
+    
+    async def aprocess_image(self, image_path: str, file_id: str = None, source: str = "lightroom") -> AcquaplanMetadata:
+        """
+        Processa uma imagem completa (Pass 1 + Pass 2)
+        
+        Args:
+            image_path: Caminho para a imagem
+            file_id: ID único (path ou Drive ID)
+            source: Origem (lightroom/drive/colaborador)
+        
+        Returns:
+            AcquaplanMetadata completo
+        """
+        image_path = Path(image_path)
+        
+        if not image_path.exists():
+            raise FileNotFoundError(f"Imagem não encontrada: {image_path}")
+        
+        await self.start()
+        entry = self.stage_entry(
+            file_id or str(image_path), source, image_path.name,
+            str(image_path.parent), file_fingerprint(image_path)
+        )
+        raw_data = self.staged(entry, 'pass1')
+        
+        if raw_data is None:
+            quality, action = await asyncio.to_thread(self.screen, str(image_path), str(image_path.parent))
+            if action == 'skip':
+                # Sem fila de adiados aqui: defer segue direto para o modelo
+                return self.skipped_metadata(quality, file_id or str(image_path), source, image_path.name)
+            
+            async def run_pass1() -> Dict:
+                with self.metrics.timed('pass1'):
+                    return self.apply_prescreen(await self.apass1_extraction(str(image_path)), quality)
+            
+            raw_data = await self._arun_pass(entry, 'pass1', run_pass1)
+        
+        normalized = self.staged(entry, 'pass2', raw_data)
+        if normalized is None:
+            async def run_pass2() -> Dict:
+                with self.metrics.timed('pass2'):
+                    return await self.apass2_normalization(raw_data)
+            
+            normalized = await self._arun_pass(entry, 'pass2', run_pass2, raw_data)
+        
+        with self.metrics.timed('build_metadata'):
+            metadata = self._build_metadata(
+                raw_data=raw_data,
+                normalized=normalized,
+                file_id=file_id or str(image_path),
+                source=source,
+                filename=image_path.name
+            )
+        
+        self.complete_staged(entry)
+        return metadata
+    
+    async def _arun_pass(
+        self,
+        entry: Optional[Dict],
+        stage: str,
+        run: Callable[[], Awaitable[Dict]],
+        raw_data: Dict = None
+    ) -> Dict:
+        """run_pass assíncrono: o backoff espera com asyncio.sleep, sem travar o loop"""
+        attempts = max(1, Config.RETRY_ATTEMPTS)
+        for attempt in range(1, attempts + 1):
+            try:
+                data = await run()
+                break
+            except Exception as e:
+                if attempt == attempts or isinstance(e, FileNotFoundError):
+                    if entry is not None:
+                        self.staging.fail(entry['key'], stage, e, entry)
+                    raise
+                delay = backoff_delay(attempt)
+                with self._retry_lock:
+                    self.retries += 1
+                print(f"  🔁 {stage}: tentativa {attempt}/{attempts} falhou ({e}); nova tentativa em {delay:.1f}s")
+                await asyncio.sleep(delay)
+        
+        if entry is not None and MISSING_FIELDS_KEY not in data:
+            self.staging.put(entry['key'], stage, self._staging_signature(stage, raw_data), data, entry)
+        return data
+    
+    async def apass1_extraction(self, image_path: str) -> Dict:
+        """Pass 1 assíncrono: extração bruta de informações da imagem (com cascata)"""
+        if self.fast_model is None:
+            return await self._apass1_tier(image_path, self.model)
+        
+        start = time.perf_counter()
+        fast_calls = []
+        try:
+            json_data = await self._apass1_tier(image_path, self.fast_model, stage='pass1_fast')
+            fast_calls = json_data.get(TELEMETRY_KEY, [])
+            reason = escalation_reason(json_data, MISSING_FIELDS_KEY in json_data)
+        except Exception:
+            reason = escalation_reason(None)
+        self.cascade_stats.record('fast', time.perf_counter() - start, reason)
+        
+        if reason is None:
+            return json_data
+        
+        print(f"  ⬆️  Escalando para {self.model} ({reason})")
+        start = time.perf_counter()
+        json_data = await self._apass1_tier(image_path, self.model)
+        self.cascade_stats.record('large', time.perf_counter() - start)
+        if fast_calls:
+            json_data[TELEMETRY_KEY] = fast_calls + json_data.get(TELEMETRY_KEY, [])
+        return json_data
+    
+    async def _apass1_tier(self, image_path: str, model: str, stage: str = 'pass1') -> Dict:
+        """Versão assíncrona de VisionPipeline._pass1_tier"""
+        # Hash e decode/resize são I/O e CPU: fora do event loop
+        cache_key = await asyncio.to_thread(self._pass1_cache_key, image_path, model)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return self._expand(cached)
+        
+        model_input = await asyncio.to_thread(self._prepare_input, image_path)
+        request = dict(self._pass1_request(model_input), model=model)
+        
+        try:
+            json_data = await self._achat(
+                request, stage,
+                required=self._pass1_required_fields(),
+                continuation=model != self.fast_model
+            )
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Erro no Pass 1 (extração): timeout após {self.timeout}s")
+        except Exception as e:
+            raise RuntimeError(f"Erro no Pass 1 (extração): {e}")
+        
+        calls = json_data.pop(TELEMETRY_KEY, [])
+        if MISSING_FIELDS_KEY not in json_data:
+            self._cache_put(cache_key, 'pass1', json_data, model)
+        return self._with_telemetry(self._expand(json_data), calls)
+    
+    async def apass2_normalization(self, raw_data: Dict) -> Dict:
+        """Pass 2 assíncrono: normaliza e refina os dados brutos"""
+        local = self._local_normalization(raw_data)
+        if local is not None:
+            return local
+        
+        cache_key = self._pass2_cache_key(raw_data)
+        normalized = self._cache_get(cache_key)
+        calls = []
+        
+        if normalized is None:
+            request = self._pass2_request(raw_data)
+            
+            try:
+                normalized = await self._achat(request, 'pass2', required=self._pass2_required_fields())
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"Erro no Pass 2 (normalização): timeout após {self.timeout}s")
+            except Exception as e:
+                raise RuntimeError(f"Erro no Pass 2 (normalização): {e}")
+            
+            calls = normalized.pop(TELEMETRY_KEY, [])
+            if self._pass2_cacheable(normalized):
+                self._cache_put(cache_key, 'pass2', normalized, self.text_model)
+        
+        return self._with_telemetry(self._merge_normalization(raw_data, normalized), calls)
+    
+    async def _achat(
+        self,
+        request: Dict,
+        stage: str,
+        required: List[str] = None,
+        continuation: bool = True
+    ) -> Dict:
+        """Versão assíncrona de VisionPipeline._chat_json (reparo + continuação)"""
+        data, missing, calls = await self._achat_once(request, stage, required)
+        
+        if missing and continuation and Config.REPAIR_CONTINUATION:
+            print(f"  🩹 Resposta incompleta, pedindo só: {', '.join(missing)}")
+            try:
+                extra, _, more = await self._achat_once(
+                    self._continuation_request(request, data, missing), f"{stage}_cont"
+                )
+                calls += more
+            except Exception as e:
+                print(f"  ⚠️  Continuação falhou: {e}")
+                extra = {}
+            missing = self._apply_continuation(data, extra, missing)
+        
+        if missing:
+            data[MISSING_FIELDS_KEY] = missing
+        data[TELEMETRY_KEY] = calls
+        return data
+    
+    async def _achat_once(self, request: Dict, stage: str, required: List[str] = None):
+        """Chamada ao modelo limitada pelo semáforo e pelo timeout; devolve (JSON, faltando, [chamada])"""
+        slots = self._text_slots if request['model'] == self.text_model else self._slots
+        async with slots:
+            start = time.perf_counter()
+            text, early_stop, chunks, final, first_token = await asyncio.wait_for(
+                self._aread_response(request, start), timeout=self.timeout
+            )
+            elapsed = time.perf_counter() - start
+            tokens = final.get('eval_count') if final is not None else chunks
+            self.json_timings.record(stage, elapsed, early_stop, tokens)
+        
+        call = call_record(stage, request['model'], final, elapsed, first_token, chunks)
+        return self._parse_response(text, required) + ([call],)
+    
+    async def _aread_response(self, request: Dict, start: float):
+        """
+        (texto, geração interrompida, pedaços recebidos, resposta final, tempo até o 1º token)
+        
+        Com streaming, depois do fim do objeto JSON espera até
+        Config.STREAM_DONE_WAIT pelo último pedaço (done): só ele traz os
+        totais do Ollama; sem ele a resposta final fica None.
+        """
+        if not self.stream:
+            response = await self.client.chat(**request)
+            return response['message']['content'], False, response.get('eval_count'), response, None
+        
+        scanner = JsonObjectScanner()
+        chunks, first_token, final, closed_at, early_stop = 0, None, None, None, False
+        stream = await self.client.chat(**request, stream=True)
+        
+        try:
+            async for chunk in stream:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                chunks += 1
+                if scanner.feed(chunk['message']['content']) and closed_at is None:
+                    closed_at = time.perf_counter()
+                if chunk.get('done'):
+                    final = chunk
+                    break
+                if closed_at is not None and time.perf_counter() - closed_at > Config.STREAM_DONE_WAIT:
+                    early_stop = True
+                    break
+        finally:
+            await stream.aclose()
+        
+        return scanner.text, early_stop, chunks, final, first_token
+    
+    async def astream_batch(
+        self,
+        image_paths: Iterable[str],
+        source: str = "lightroom",
+        raise_errors: bool = False
+    ) -> AsyncIterator[AcquaplanMetadata]:
+        """
+        Processa várias imagens e entrega cada resultado assim que fica pronto
+        
+        Uso: `async for metadata in pipeline.astream_batch(paths): ...`
+        Sair do loop (break) ou cancelar o consumidor cancela o restante.
+        O modelo é aquecido antes e descarregado ao final (amodel_session).
+        
+        Como no BatchEngine, só uma janela de imagens fica em andamento
+        (2x as chamadas simultâneas): hash, redução e base64 das próximas
+        não se acumulam na memória à frente do modelo.
+        
+        Args:
+            image_paths: Caminhos de imagem (iterável consumido sob demanda)
+            source: Origem dos arquivos
+            raise_errors: Propagar a primeira falha (padrão: registra e segue)
+        
+        Yields:
+            AcquaplanMetadata na ordem de conclusão
+        """
+        await self.start()
+        
+        window = self.concurrency * 2
+        if self._text_slots is not self._slots:
+            window += self.text_concurrency
+        
+        paths = iter(image_paths)
+        pending = set()
+        
+        async with self.amodel_session():
+            try:
+                while True:
+                    for path in paths:
+                        pending.add(asyncio.create_task(self._aprocess_safe(str(path), source)))
+                        if len(pending) >= window:
+                            break
+                    
+                    if not pending:
+                        break
+                    
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        image_path, metadata, error = task.result()
+                        
+                        if error is not None:
+                            if raise_errors:
+                                raise error
+                            print(f"  ❌ {Path(image_path).name}: {error}")
+                            continue
+                        
+                        yield metadata
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+    
+    async def _aprocess_safe(self, image_path: str, source: str):
+        try:
+            return image_path, await self.aprocess_image(image_path, source=source), None
+        except Exception as e:
+            return image_path, None, e
+    
+    async def abatch_process(
+        self,
+        image_paths: list,
+        source: str = "lightroom",
+        progress_callback: callable = None
+    ) -> list:
+        """
+        Processa múltiplas imagens e devolve a lista completa
+        
+        Args:
+            image_paths: Lista de caminhos de imagem
+            source: Origem dos arquivos
+            progress_callback: Função chamada após cada imagem (opcional)
+        
+        Returns:
+            Lista de AcquaplanMetadata (ordem de conclusão)
+        """
+        image_paths = list(image_paths)
+        results = []
+        total = len(image_paths)
+        
+        async for metadata in self.astream_batch(image_paths, source=source):
+            results.append(metadata)
+            print(f"[{len(results)}/{total}] {metadata.original_filename}")
+            
+            if progress_callback:
+                progress_callback(len(results), total, metadata)
+        
+        return results
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+async def _main(image_paths: List[str], concurrency: int):
+    pipeline = AsyncVisionPipeline(concurrency=concurrency)
+    results = await pipeline.abatch_process(image_paths)
+    print(f"\n🎉 Concluído! {len(results)}/{len(image_paths)} imagens processadas.")
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Acquaplan - pipeline assíncrono")
+    parser.add_argument('images', nargs='+', help='Imagens para processar')
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=Config.MAX_CONCURRENT_REQUESTS,
+        help='Requisições simultâneas ao Ollama'
+    )
+    args = parser.parse_args()
+    
+    asyncio.run(_main(args.images, args.concurrency))
@@ -0,0 +1,133 @@
+"""
+Gravação em segundo plano (XMP, manifest, cache de processados)
+O consumidor do BatchEngine só enfileira: o modelo não espera disco nem exiftool
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config
+
+
+@dataclass
+class WriteOutcome:
+    """Resultado de uma gravação (error preenchido se falhou)"""
+    label: str
+    payload: Any = None
+    error: Optional[Exception] = None
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+_STOP = object()
+
+
+class BackgroundWriter:
+    """
+    Uma thread de gravação alimentada por uma fila limitada
+    
+    Exemplo:
+        with BackgroundWriter() as writer:
+            for result in engine.run(items):
+                writer.submit(photo.name, self._sink, photo, metadata, payload=metadata)
+                for outcome in writer.completed():
+                    ...
+        # saiu do with: fila esvaziada e thread encerrada
+    
+    - Backpressure: submit() bloqueia com `max_pending` gravações na fila;
+      o tempo bloqueado fica em `blocked_seconds`
+    - Erros não derrubam a thread: cada item vira um WriteOutcome, entregue
+      na ordem de gravação por completed() (na thread de quem consome)
+    - Um único escritor: manifest e cache de processados sem disputa
+    """
+    
+    def __init__(self, max_pending: int = None, name: str = "acquaplan-writer"):
+        self.max_pending = max(1, max_pending or Config.WRITER_QUEUE_SIZE)
+        self.written = 0
+        self.failed = 0
+        self.blocked_seconds = 0.0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.max_pending)
+        self._outcomes: "queue.Queue[WriteOutcome]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._closed = False
+        self._thread.start()
+    
+    def submit(self, label: str, fn: Callable, *args, payload: Any = None, **kwargs):
+        """
+        Enfileira fn(*args, **kwargs)
+        
+        Args:
+            label: Nome do item nas mensagens (ex.: arquivo)
+            payload: Devolvido no WriteOutcome (ex.: metadados gravados)
+        """
+        if self._closed:
+            raise RuntimeError("BackgroundWriter já foi fechado")
+        if not self._thread.is_alive():
+            raise RuntimeError("thread de gravação encerrada")
+        
+        job = (label, payload, fn, args, kwargs)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            start = time.perf_counter()
+            self._queue.put(job)
+            self.blocked_seconds += time.perf_counter() - start
+    
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            
+            label, payload, fn, args, kwargs = job
+            try:
+                fn(*args, **kwargs)
+                outcome = WriteOutcome(label, payload)
+                self.written += 1
+            except Exception as e:
+                outcome = WriteOutcome(label, payload, e)
+                self.failed += 1
+            self._outcomes.put(outcome)
+    
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+    
+    def completed(self) -> List[WriteOutcome]:
+        """Gravações concluídas desde a última chamada"""
+        outcomes = []
+        while True:
+            try:
+                outcomes.append(self._outcomes.get_nowait())
+            except queue.Empty:
+                return outcomes
+    
+    def close(self) -> List[WriteOutcome]:
+        """Espera a fila esvaziar e encerra a thread; devolve o que faltava entregar"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+        return self.completed()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def print_summary(self):
+        if not (self.written or self.failed):
+            return
+        line = f"💾 Gravação em segundo plano: {self.written} ok, {self.failed} erros"
+        if self.blocked_seconds >= 0.1:
+            line += f" | fila cheia por {self.blocked_seconds:.1f}s (disco/exiftool no limite)"
+        print(line)
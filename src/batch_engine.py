@@ -0,0 +1,407 @@
+"""
+Motor de batch em pipeline para o VisionPipeline
+Mantém N requisições em voo no Ollama enquanto carga e gravação seguem em paralelo
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config, AcquaplanMetadata
+from src.pass_staging import file_fingerprint
+
+
+@dataclass
+class BatchResult:
+    """Resultado de um item processado pelo motor"""
+    index: int
+    item: Any
+    image_path: Optional[str] = None
+    metadata: Optional[AcquaplanMetadata] = None
+    error: Optional[Exception] = None
+    quality: Any = None      # QualityReport da pré-triagem
+    deferred: bool = False   # Frame sem salvação adiado para o fim do batch
+    staging: Optional[Dict] = None  # stage_entry() da imagem: complete_staged() depois do sink
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _default_load(item: Any) -> str:
+    return str(item)
+
+
+def _default_identify(item: Any) -> Tuple[str, str]:
+    return str(item), Path(item).name
+
+
+def _default_folder(item: Any) -> str:
+    return str(Path(str(item)).parent)
+
+
+def _default_fingerprint(item: Any) -> str:
+    return file_fingerprint(str(item))
+
+
+def _default_quality(item: Any) -> Any:
+    return None
+
+
+class Pass2Batcher:
+    """
+    Junta as saídas do Pass 1 de várias imagens numa chamada do Pass 2
+    
+    Cada worker chama normalize() e espera; o lote sai quando junta
+    `batch_size` itens, quando não há mais itens a caminho ou quando
+    `max_wait` segundos passam desde o primeiro.
+    Imagens que faltarem na resposta do lote são refeitas individualmente.
+    """
+    
+    def __init__(self, pipeline, slots: threading.BoundedSemaphore, batch_size: int, max_wait: float = None):
+        self.pipeline = pipeline
+        self.batch_size = batch_size
+        self.max_wait = Config.PASS2_BATCH_MAX_WAIT if max_wait is None else max_wait
+        self.batches = 0
+        self.fallbacks = 0
+        self._slots = slots
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[Dict, Future]] = []
+        self._timer: Optional[threading.Timer] = None
+        
+        # Itens ainda no load/Pass 1: quando a entrada acaba e todos já estão
+        # na fila, o lote parcial sai sem esperar max_wait
+        self._upstream = 0
+        self._input_done = False
+    
+    def expect(self):
+        """Um item entrou no motor (vai chegar ao Pass 2 ou a skip())"""
+        with self._lock:
+            self._upstream += 1
+            self._input_done = False
+    
+    def skip(self):
+        """O item falhou antes do Pass 2"""
+        with self._lock:
+            self._upstream -= 1
+            batch = self._take_if_ready_locked()
+        if batch:
+            self._run(batch)
+    
+    def end_of_input(self):
+        """Não virão mais itens além dos já esperados"""
+        with self._lock:
+            self._input_done = True
+            batch = self._take_if_ready_locked()
+        if batch:
+            self._run(batch)
+    
+    def normalize(self, raw_data: Dict) -> Dict:
+        """Pass 2 de uma imagem, resolvido dentro de um lote"""
+        local = self.pipeline._local_normalization(raw_data)
+        if local is not None:
+            self.skip()
+            return local
+        
+        future = Future()
+        with self._lock:
+            self._upstream -= 1
+            self._queue.append((raw_data, future))
+            batch = self._take_if_ready_locked()
+            if batch is None and self._timer is None:
+                self._timer = threading.Timer(self.max_wait, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        
+        if batch:
+            self._run(batch)
+        
+        normalized = future.result()
+        if normalized is None:
+            # Faltou no lote: chamada individual
+            with self._lock:
+                self.fallbacks += 1
+            normalized = self.pipeline.with_retry('pass2', lambda: self._single(raw_data))
+        
+        return normalized
+    
+    def _single(self, raw_data: Dict) -> Dict:
+        with self._slots, self.pipeline.metrics.timed('pass2'):
+            return self.pipeline.pass2_normalization(raw_data)
+    
+    def _take_if_ready_locked(self) -> Optional[List[Tuple[Dict, Future]]]:
+        if not self._queue:
+            return None
+        if len(self._queue) >= self.batch_size or (self._input_done and self._upstream <= 0):
+            return self._take_locked()
+        return None
+    
+    def _take_locked(self) -> List[Tuple[Dict, Future]]:
+        batch, self._queue = self._queue, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+    
+    def _flush(self):
+        with self._lock:
+            batch = self._take_locked()
+        if batch:
+            self._run(batch)
+    
+    def _run(self, batch: List[Tuple[Dict, Future]]):
+        try:
+            with self._slots, self.pipeline.metrics.timed('pass2_batch'):
+                results = self.pipeline.pass2_normalization_batch([raw for raw, _ in batch])
+            with self._lock:
+                self.batches += 1
+            for (_, future), normalized in zip(batch, results):
+                future.set_result(normalized)
+        except Exception:
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+
+class BatchEngine:
+    """
+    Batch em pipeline com estágios explícitos:
+        
+        load → Pass 1 → Pass 2 → sink
+    
+    - load: roda no pool de workers (ex.: download do Drive, preview de RAW),
+      seguido da pré-triagem de qualidade (frames sem salvação são pulados
+      ou adiados para depois de todos os outros)
+    - Pass 1 / Pass 2: no máximo `concurrency` requisições simultâneas ao Ollama
+    - sink: fica com quem consome run(), na thread chamadora
+    
+    Cada passe tem retry com backoff e sua saída vai para o staging do
+    pipeline: imagem com Pass 1 gravado pula load, pré-triagem e Pass 1.
+    Quem consome run() chama pipeline.complete_staged(result.staging)
+    depois de gravar o resultado.
+    
+    Entre o Pass 1 e o Pass 2 o slot do modelo é liberado, então o Pass 2 de
+    uma imagem intercala com o Pass 1 da próxima. Com `pass2_batch_size` > 1
+    o Pass 2 de várias imagens vai numa única chamada (Pass2Batcher).
+    
+    Com um modelo de texto próprio (pipeline.text_model) cada modelo tem seus
+    slots: o Pass 2 não disputa vaga com o Pass 1 e os dois rodam em paralelo.
+    """
+    
+    def __init__(
+        self,
+        pipeline,
+        concurrency: int = None,
+        source: str = "lightroom",
+        load: Callable[[Any], str] = None,
+        identify: Callable[[Any], Tuple[str, str]] = None,
+        pass2_batch_size: int = None,
+        folder: Callable[[Any], str] = None,
+        fingerprint: Callable[[Any], str] = None,
+        quality: Callable[[Any], Any] = None
+    ):
+        """
+        Args:
+            pipeline: VisionPipeline usado nos passes
+            concurrency: Requisições simultâneas ao Ollama (padrão: Config.MAX_CONCURRENT_REQUESTS)
+            source: Origem gravada nos metadados (lightroom/drive/colaborador)
+            load: Recebe um item e retorna o caminho local da imagem
+            identify: Recebe um item e retorna (file_id, filename)
+            pass2_batch_size: Imagens por chamada do Pass 2 (padrão: Config.PASS2_BATCH_SIZE)
+            folder: Recebe um item e retorna a pasta (resumo da pré-triagem)
+            fingerprint: Recebe um item e retorna o que muda quando o arquivo
+                muda (padrão: tamanho + mtime do path local)
+            quality: Recebe um item e retorna o QualityReport já medido antes
+                do batch, ou None para a pré-triagem medir (padrão: None)
+        """
+        self.pipeline = pipeline
+        self.concurrency = max(1, concurrency or Config.MAX_CONCURRENT_REQUESTS)
+        self.source = source
+        self.load = load or _default_load
+        self.identify = identify or _default_identify
+        self.folder = folder or _default_folder
+        self.fingerprint = fingerprint or _default_fingerprint
+        self.quality = quality or _default_quality
+        self._model_slots = threading.BoundedSemaphore(self.concurrency)
+        
+        # Slots do Pass 2: fila própria quando roda em outro modelo
+        self.text_concurrency = self.concurrency
+        self._text_slots = self._model_slots
+        if getattr(pipeline, 'text_model', pipeline.model) != pipeline.model:
+            self.text_concurrency = max(1, Config.TEXT_MAX_CONCURRENT_REQUESTS or self.concurrency)
+            self._text_slots = threading.BoundedSemaphore(self.text_concurrency)
+        
+        self.pass2_batch_size = max(1, pass2_batch_size or Config.PASS2_BATCH_SIZE)
+        self.pass2_batcher = None
+        if self.pass2_batch_size > 1:
+            self.pass2_batcher = Pass2Batcher(pipeline, self._text_slots, self.pass2_batch_size)
+    
+    def run(self, items: Iterable, ordered: bool = True) -> Iterator[BatchResult]:
+        """
+        Processa os itens e entrega os resultados conforme ficam prontos
+        
+        Args:
+            items: Iterável de itens (paths, dicts do Drive, ...); consumido sob demanda
+            ordered: True entrega na ordem de entrada, False na ordem de conclusão
+        
+        Yields:
+            BatchResult por item (com metadata ou error preenchido); frames
+            adiados pela pré-triagem saem no fim, fora da ordem
+        """
+        # Janela de itens em andamento: evita carregar milhares de imagens à frente do modelo
+        # (com Pass 2 em lote, cabe um lote esperando + o Pass 1 dos próximos;
+        # com modelo de texto próprio, somam-se os Pass 2 em voo)
+        in_flight = self.concurrency * 2
+        if self._text_slots is not self._model_slots:
+            in_flight += self.text_concurrency
+        window = max(in_flight, self.pass2_batch_size + self.concurrency)
+        executor = ThreadPoolExecutor(max_workers=window, thread_name_prefix="acquaplan-batch")
+        items_iter = enumerate(items)
+        pending = {}
+        buffered = {}
+        next_index = 0
+        exhausted = False
+        deferred: List[BatchResult] = []
+        resumed = set()
+        
+        # Modelo aquecido no início e fixado com keep_alive até o fim do batch
+        with self.pipeline.model_session():
+            try:
+                while True:
+                    while not exhausted and len(pending) + len(buffered) < window:
+                        try:
+                            index, item = next(items_iter)
+                        except StopIteration:
+                            exhausted = True
+                            if self.pass2_batcher is not None:
+                                self.pass2_batcher.end_of_input()
+                            break
+                        if self.pass2_batcher is not None:
+                            self.pass2_batcher.expect()
+                        pending[executor.submit(self._process, index, item)] = index
+                    
+                    if not pending and deferred:
+                        # Entrada acabou: agora os frames adiados vão ao modelo
+                        for result in deferred:
+                            if self.pass2_batcher is not None:
+                                self.pass2_batcher.expect()
+                            resumed.add(result.index)
+                            pending[executor.submit(self._process, result.index, result.item, result)] = result.index
+                        deferred = []
+                        if self.pass2_batcher is not None:
+                            self.pass2_batcher.end_of_input()
+                    
+                    if not pending:
+                        break
+                    
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        del pending[future]
+                        result = future.result()
+                        
+                        if result.deferred:
+                            deferred.append(result)
+                            if ordered:
+                                buffered[result.index] = None
+                        elif ordered and result.index not in resumed:
+                            buffered[result.index] = result
+                        else:
+                            yield result
+                    
+                    while next_index in buffered:
+                        result = buffered.pop(next_index)
+                        if result is not None:
+                            yield result
+                        next_index += 1
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _process(self, index: int, item: Any, resumed: BatchResult = None) -> BatchResult:
+        """
+        Executa load → pré-triagem → Pass 1 → Pass 2 para um item (roda no pool)
+        
+        `resumed` é o resultado de um frame adiado: load e pré-triagem já feitos.
+        """
+        result = resumed or BatchResult(index=index, item=item)
+        result.deferred = False
+        
+        try:
+            try:
+                file_id, filename = self.identify(item)
+                if result.staging is None:
+                    result.staging = self.pipeline.stage_entry(
+                        file_id, self.source, filename, self.folder(item), self.fingerprint(item)
+                    )
+                
+                # Pass 1 gravado numa execução anterior: nada a carregar
+                raw_data = self.pipeline.staged(result.staging, 'pass1')
+                
+                if raw_data is None and resumed is None:
+                    # Estágio 1: load + pré-triagem
+                    with self.pipeline.metrics.timed('load'):
+                        result.image_path = self.load(item)
+                    result.quality, action = self.pipeline.screen(
+                        result.image_path, self.folder(item), self.quality(item)
+                    )
+                    
+                    if action == 'skip':
+                        result.metadata = self.pipeline.skipped_metadata(
+                            result.quality, file_id, self.source, filename
+                        )
+                    elif action == 'defer':
+                        result.deferred = True
+                    
+                    if action is not None:
+                        if self.pass2_batcher is not None:
+                            self.pass2_batcher.skip()
+                        return result
+                
+                if raw_data is None:
+                    # Estágio 2: Pass 1 (visão); o slot fica livre durante o backoff
+                    raw_data = self.pipeline.run_pass(result.staging, 'pass1', lambda: self._pass1(result))
+            except Exception:
+                if self.pass2_batcher is not None:
+                    self.pass2_batcher.skip()
+                raise
+            
+            # Estágio 3: Pass 2 (normalização)
+            normalized = self.pipeline.staged(result.staging, 'pass2', raw_data)
+            if normalized is not None:
+                if self.pass2_batcher is not None:
+                    self.pass2_batcher.skip()
+            elif self.pass2_batcher is not None:
+                # O lote refaz sozinho, com retry, as imagens que falharem
+                normalized = self.pipeline.run_pass(
+                    result.staging, 'pass2', lambda: self.pass2_batcher.normalize(raw_data),
+                    raw_data, retry=False
+                )
+            else:
+                normalized = self.pipeline.run_pass(
+                    result.staging, 'pass2', lambda: self._pass2(raw_data), raw_data
+                )
+            
+            with self.pipeline.metrics.timed('build_metadata'):
+                result.metadata = self.pipeline._build_metadata(
+                    raw_data=raw_data,
+                    normalized=normalized,
+                    file_id=file_id,
+                    source=self.source,
+                    filename=filename
+                )
+        except Exception as e:
+            result.error = e
+        
+        return result
+    
+    def _pass1(self, result: BatchResult) -> Dict:
+        with self._model_slots, self.pipeline.metrics.timed('pass1'):
+            raw_data = self.pipeline.pass1_extraction(result.image_path)
+        return self.pipeline.apply_prescreen(raw_data, result.quality)
+    
+    def _pass2(self, raw_data: Dict) -> Dict:
+        with self._text_slots, self.pipeline.metrics.timed('pass2'):
+            return self.pipeline.pass2_normalization(raw_data)
@@ -0,0 +1,204 @@
+"""
+Vocabulário compacto para a saída do Pass 1 / passe único
+O modelo emite códigos curtos para os vocabulários controlados e texto livre
+só onde precisa; o expansor local reconstrói os campos completos
+"""
+
+from pathlib import Path
+from typing import Dict, List, Tuple
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import (
+    Config,
+    Habitat,
+    ArchaeologyFlag,
+    ActivityType,
+    KEYWORD_CATEGORIES
+)
+from src.keyword_normalizer import KeywordNormalizer, CATEGORIES, fold
+
+
+TECHNICAL_QUALITIES = ['sharp', 'blurred', 'underexposed', 'overexposed']
+TAXONOMY_LEVELS = ['species', 'genus', 'family', 'order']
+
+# Chave compacta -> campo completo (o que não está aqui é montado no expand)
+TEXT_FIELDS = {
+    'sum': 'scene_summary',
+    'hc': 'habitat_confidence',
+    'he': 'habitat_evidence',
+    'ae': 'archaeology_evidence',
+    't': 'title',
+    'ds': 'description_short',
+    'dl': 'description_long',
+}
+
+# Chave compacta -> campo completo, para reportar campos faltando
+FIELD_NAMES = {
+    **TEXT_FIELDS,
+    'h': 'habitat_guess',
+    'sp': 'species_candidates',
+    'af': 'archaeology_flags',
+    'ac': 'activities',
+    'tq': 'technical_quality',
+    'kw': 'keywords_raw',
+    'kx': 'keywords_raw',
+}
+
+# Chaves essenciais (equivalentes a PASS1_REQUIRED_FIELDS / SINGLE_PASS_REQUIRED_FIELDS)
+PASS1_REQUIRED = ['sum', 'h', 'hc', 'sp', 'kw']
+SINGLE_PASS_REQUIRED = ['sum', 't', 'ds', 'dl', 'h', 'hc', 'sp', 'kw']
+
+
+def _codes(values: List) -> Dict[int, object]:
+    """Códigos a partir de 1, na ordem da definição"""
+    return {idx: value for idx, value in enumerate(values, 1)}
+
+
+class CompactVocabulary:
+    """
+    Tabelas de códigos, schema da resposta compacta e expansor
+    
+    Resposta compacta (exemplo):
+        {"sum": "...", "h": 1, "hc": 0.9, "he": "...",
+         "sp": [{"n": "garça-branca", "s": "Ardea alba", "c": 0.8, "t": 1, "e": "..."}],
+         "af": [], "ae": "", "ac": [4], "tq": 1,
+         "kw": [3, 12, 40], "kx": {"cores": ["azul_claro"], "elementos": [], ...}}
+    
+    As espécies numeradas em "sp" viram keywords fauna:* no expansor, então o
+    modelo não repete os nomes em "kw"/"kx".
+    """
+    
+    def __init__(self):
+        self.habitats = _codes([h.value for h in Habitat])
+        self.flags = _codes([f.value for f in ArchaeologyFlag])
+        self.activities = _codes([a.value for a in ActivityType])
+        self.qualities = _codes(TECHNICAL_QUALITIES)
+        self.levels = _codes(TAXONOMY_LEVELS)
+        self.terms: Dict[int, Tuple[str, str]] = _codes([
+            (fold(category), fold(value))
+            for category, values in KEYWORD_CATEGORIES.items()
+            for value in values
+        ])
+        self.free_categories = sorted(CATEGORIES)
+        self.normalizer = KeywordNormalizer()
+    
+    # ------------------------------------------------------------------------
+    # Prompt e schema
+    # ------------------------------------------------------------------------
+    
+    def prompt_table(self) -> str:
+        """Tabela de códigos para a mensagem de sistema (fixa: prefixo reaproveitado)"""
+        def listing(table: Dict) -> str:
+            return ' '.join(f"{code}={value}" for code, value in table.items())
+        
+        terms = ' '.join(f"{code}={cat}:{val}" for code, (cat, val) in self.terms.items())
+        
+        return f"""CODIGOS:
+h (habitat): {listing(self.habitats)}
+af (arqueologia): {listing(self.flags)}
+ac (atividades): {listing(self.activities)}
+tq (qualidade): {listing(self.qualities)}
+sp.t (nivel taxonomico): {listing(self.levels)}
+kw (keywords do vocabulario): {terms}
+
+CAMPOS:
+sum: cena em 2-3 frases | hc: confianca do habitat | he: evidencia curta
+sp: especies numeradas (n=nome PT, s=cientifico, c=confianca, t=nivel, e=evidencia curta)
+kw: codigos do vocabulario | kx: termos livres por categoria (so o que nao tem codigo)
+NAO repita em kw/kx o habitat, as especies, atividades ou arqueologia"""
+    
+    def schema(self, mode: str = 'two_pass') -> Dict:
+        """JSON Schema da resposta compacta (structured outputs)"""
+        def code(table: Dict) -> Dict:
+            return {'type': 'integer', 'enum': list(table)}
+        
+        def text(max_length: int = None) -> Dict:
+            return {'type': 'string', 'maxLength': max_length} if max_length else {'type': 'string'}
+        
+        species = {
+            'type': 'object',
+            'properties': {
+                'n': text(), 's': text(), 'c': {'type': 'number'},
+                't': code(self.levels), 'e': text(80)
+            },
+            'required': ['n', 's', 'c', 't', 'e']
+        }
+        free = {
+            'type': 'object',
+            'properties': {c: {'type': 'array', 'items': text(40)} for c in self.free_categories},
+            'required': self.free_categories
+        }
+        
+        properties = {'sum': text()}
+        if mode == 'single_pass':
+            properties.update({'t': text(), 'ds': text(), 'dl': text()})
+        properties.update({
+            'h': code(self.habitats),
+            'hc': {'type': 'number'},
+            'he': text(120),
+            'sp': {'type': 'array', 'items': species},
+            'af': {'type': 'array', 'items': code(self.flags)},
+            'ae': text(120),
+            'ac': {'type': 'array', 'items': code(self.activities)},
+            'tq': code(self.qualities),
+            'kw': {'type': 'array', 'items': code(self.terms), 'maxItems': Config.MAX_KEYWORDS},
+            'kx': free,
+        })
+        
+        return {'type': 'object', 'properties': properties, 'required': list(properties)}
+    
+    @staticmethod
+    def required(mode: str = 'two_pass') -> List[str]:
+        return SINGLE_PASS_REQUIRED if mode == 'single_pass' else PASS1_REQUIRED
+    
+    # ------------------------------------------------------------------------
+    # Expansor
+    # ------------------------------------------------------------------------
+    
+    @staticmethod
+    def is_compact(data: Dict) -> bool:
+        return 'scene_summary' not in data and ('sum' in data or 'h' in data)
+    
+    def expand(self, data: Dict, mode: str = 'two_pass') -> Dict:
+        """
+        Resposta compacta -> dict no formato completo do Pass 1 (ou do passe único)
+        
+        Códigos desconhecidos são ignorados; chaves internas (ex.: campos
+        faltando) passam adiante sem mudança.
+        """
+        if not self.is_compact(data):
+            return data
+        
+        expanded = {full: data[short] for short, full in TEXT_FIELDS.items() if short in data}
+        expanded.update({k: v for k, v in data.items() if k.startswith('_')})
+        if '_missing_fields' in data:
+            names = [FIELD_NAMES.get(k, k) for k in data['_missing_fields']]
+            expanded['_missing_fields'] = list(dict.fromkeys(names))
+        
+        expanded['habitat_guess'] = self.habitats.get(data.get('h'), '')
+        expanded['technical_quality'] = self.qualities.get(data.get('tq'), '')
+        expanded['archaeology_flags'] = [self.flags[c] for c in data.get('af', []) if c in self.flags]
+        expanded['activities'] = [self.activities[c] for c in data.get('ac', []) if c in self.activities]
+        expanded['species_candidates'] = [
+            {
+                'name_pt': sp.get('n', ''),
+                'name_scientific': sp.get('s', ''),
+                'confidence': sp.get('c', 0.0),
+                'evidence': sp.get('e', ''),
+                'taxonomy_level': self.levels.get(sp.get('t'), 'species'),
+            }
+            for sp in data.get('sp', []) or []
+            if isinstance(sp, dict)
+        ]
+        
+        terms = [f"{cat}:{val}" for cat, val in (self.terms[c] for c in data.get('kw', []) if c in self.terms)]
+        for category, values in (data.get('kx') or {}).items():
+            terms.extend(f"{category}:{value}" for value in values or [])
+        expanded['keywords_raw'] = terms
+        
+        if mode == 'single_pass':
+            # Habitat, espécies, atividades e arqueologia entram como keywords aqui
+            expanded['keywords_normalized'] = self.normalizer.keywords(expanded)
+        
+        return expanded
@@ -5,6 +5,7 @@ Atualiza descrições de arquivos no Google Drive
 
 import json
 import tempfile
+import threading
 from pathlib import Path
 from typing import List, Dict, Optional
 from datetime import datetime
@@ -22,6 +23,7 @@ except ImportError:
 sys.path.append(str(Path(__file__).parent.parent))
 from config.acquaplan_config import Config, AcquaplanMetadata
 from src.vision_pipeline import VisionPipeline
+from src.batch_engine import BatchEngine
 
 
 class DriveTagger:
@@ -33,18 +35,42 @@ class DriveTagger:
         self,
         credentials_path: Path,
         manifest_path: Optional[Path] = None,
-        dry_run: bool = False
+        dry_run: bool = False,
+        concurrency: int = None,
+        use_cache: bool = None,
+        mode: str = None,
+        normalizer: str = None,
+        pass2_batch: int = None,
+        vocabulary: str = None,
+        cascade: bool = None,
+        text_model: str = None,
+        prescreen: bool = None,
+        hopeless_policy: str = None,
+        metrics_path: Optional[Path] = None,
+        prometheus_path: Optional[Path] = None,
+        staging: bool = None
     ):
         if not GOOGLE_AVAILABLE:
             raise ImportError("Google API libraries não instaladas")
         
         self.credentials_path = Path(credentials_path)
         self.manifest_path = manifest_path or Path.home() / Config.MANIFEST_FILENAME
+        self.metrics_path = metrics_path or self.manifest_path.parent / Config.METRICS_FILENAME
+        self.prometheus_path = prometheus_path or Config.PROMETHEUS_TEXTFILE
         self.dry_run = dry_run
-        self.pipeline = VisionPipeline()
+        self.concurrency = concurrency or Config.MAX_CONCURRENT_REQUESTS
+        self.pass2_batch = pass2_batch or Config.PASS2_BATCH_SIZE
+        self.pipeline = VisionPipeline(
+            cache=use_cache, mode=mode, normalizer=normalizer,
+            vocabulary=vocabulary, cascade=cascade, text_model=text_model,
+            prescreen=prescreen, hopeless_policy=hopeless_policy,
+            staging=staging
+        )
         
         # Autenticar
         self.service = self._authenticate()
+        # O cliente do Drive não é thread-safe: um por worker de download
+        self._worker_local = threading.local()
         self.processed_cache = self._load_cache()
     
     def _authenticate(self):
@@ -56,12 +82,20 @@ class DriveTagger:
                 f"https://console.cloud.google.com/apis/credentials"
             )
         
-        creds = service_account.Credentials.from_service_account_file(
+        self._credentials = service_account.Credentials.from_service_account_file(
             str(self.credentials_path),
             scopes=Config.DRIVE_SCOPES
         )
         
-        return build('drive', 'v3', credentials=creds)
+        return build('drive', 'v3', credentials=self._credentials)
+    
+    def _worker_service(self):
+        """Cliente do Drive exclusivo da thread atual (workers do BatchEngine)"""
+        service = getattr(self._worker_local, 'service', None)
+        if service is None:
+            service = build('drive', 'v3', credentials=self._credentials)
+            self._worker_local.service = service
+        return service
     
     def _load_cache(self) -> set:
         """Carrega cache de arquivos já processados"""
@@ -88,7 +122,8 @@ class DriveTagger:
         self,
         folder_id: str,
         skip_processed: bool = True,
-        min_description_length: int = 100
+        min_description_length: int = 100,
+        resume: bool = False
     ) -> List[AcquaplanMetadata]:
         """
         Processa todos os arquivos de imagem de uma pasta do Drive
@@ -97,6 +132,7 @@ class DriveTagger:
             folder_id: ID da pasta no Google Drive
             skip_processed: Pular arquivos já processados
             min_description_length: Tamanho mínimo de descrição para pular
+            resume: Só as imagens pela metade no staging (rodam apenas os passes que faltam)
         
         Returns:
             Lista de metadados processados
@@ -104,7 +140,8 @@ class DriveTagger:
         print(f"📂 Listando arquivos da pasta {folder_id}...")
         
         # Listar arquivos de imagem
-        files = self._list_image_files(folder_id)
+        with self.pipeline.metrics.timed('drive_list'):
+            files = self._list_image_files(folder_id)
         
         if not files:
             print(f"⚠️  Nenhuma imagem encontrada na pasta")
@@ -112,6 +149,17 @@ class DriveTagger:
         
         print(f"📁 Encontrados {len(files)} arquivos de imagem")
         
+        if resume:
+            if self.pipeline.staging is None:
+                print("⚠️  --resume sem staging: nada a retomar")
+                return []
+            pending = {p['file_id'] for p in self.pipeline.staging.pending('drive')}
+            files = [f for f in files if f['id'] in pending]
+            if not files:
+                print("✅ Nenhuma imagem pela metade nesta pasta")
+                return []
+            print(f"🧩 Retomando {len(files)} imagens pela metade")
+        
         # Filtrar arquivos a processar
         to_process = []
         for file in files:
@@ -135,42 +183,59 @@ class DriveTagger:
         
         print(f"🚀 Processando {len(to_process)} arquivos...\n")
         
-        # Processar cada arquivo
+        # Processar (download → Pass 1 → Pass 2 em pipeline; sink aqui)
+        engine = BatchEngine(
+            self.pipeline,
+            concurrency=self.concurrency,
+            pass2_batch_size=self.pass2_batch,
+            source="drive",
+            load=self._download_to_temp,
+            identify=lambda file: (file['id'], file['name']),
+            folder=lambda file: folder_id,
+            fingerprint=lambda file: file.get('modifiedTime', '')
+        )
+        
         results = []
-        for idx, file in enumerate(to_process, 1):
+        for idx, result in enumerate(engine.run(to_process), 1):
+            file = result.item
             print(f"[{idx}/{len(to_process)}] {file['name']}")
             
             try:
-                # Baixar arquivo temporariamente
-                with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp_file:
-                    tmp_path = Path(tmp_file.name)
-                    self._download_file(file['id'], tmp_path)
-                    
-                    # Processar com IA
-                    metadata = self.pipeline.process_image(
-                        str(tmp_path),
-                        file_id=file['id'],
-                        source="drive"
-                    )
-                    
-                    # Atualizar descrição no Drive
-                    if not self.dry_run:
+                if not result.ok:
+                    raise result.error
+                
+                metadata = result.metadata
+                if metadata.status == 'partial':
+                    print(f"  🩹 Parcial: faltam {', '.join(metadata.missing_fields)}")
+                elif metadata.status == 'skipped':
+                    print(f"  ⏭️  Pré-triagem: {metadata.technical_quality} "
+                          f"({metadata.skip_reason}), sem chamada ao modelo")
+                
+                # Atualizar descrição no Drive
+                if not self.dry_run:
+                    # Pré-triagem: descrição do Drive fica como está (só o manifest registra)
+                    if metadata.status != 'skipped':
                         drive_description = self._format_for_drive(metadata)
                         self._update_file_description(file['id'], drive_description)
-                        self._append_to_manifest(file, metadata)
+                    self._append_to_manifest(file, metadata)
+                    # Parcial/pré-triagem: fica fora do cache para ser refeito na próxima execução
+                    if metadata.status == 'complete':
                         self.processed_cache.add(file['id'])
-                    else:
-                        print(f"  🔍 [DRY RUN] Não atualizando Drive")
-                    
-                    results.append(metadata)
-                    print(f"  ✅ Concluído\n")
-                    
-                    # Limpar arquivo temporário
-                    tmp_path.unlink()
-                    
+                    self.pipeline.complete_staged(result.staging)
+                else:
+                    print(f"  🔍 [DRY RUN] Não atualizando Drive")
+                
+                results.append(metadata)
+                print(f"  ✅ Concluído\n")
+                
             except Exception as e:
                 print(f"  ❌ Erro: {e}\n")
                 continue
+            
+            finally:
+                # Limpar arquivo temporário
+                if result.image_path:
+                    Path(result.image_path).unlink(missing_ok=True)
         
         # Salvar cache
         if not self.dry_run:
@@ -180,8 +245,33 @@ class DriveTagger:
         print(f"✅ Processamento concluído: {len(results)}/{len(to_process)} arquivos")
         print(f"📄 Manifest: {self.manifest_path}")
         
+        if self.pipeline.cache is not None:
+            cache = self.pipeline.cache
+            print(f"💾 Cache de inferência: {cache.hits} passes reaproveitados, {cache.misses} executados")
+        
+        if self.pipeline.retries:
+            print(f"🔁 Retentativas de passe: {self.pipeline.retries}")
+        if self.pipeline.staging is not None:
+            self.pipeline.staging.print_summary('drive')
+        
+        self.pipeline.json_timings.print_summary()
+        self.pipeline.cascade_stats.print_summary()
+        self.pipeline.prescreen_stats.print_summary()
+        self.pipeline.metrics.print_summary()
+        self._export_metrics()
+        
         return results
     
+    def _export_metrics(self):
+        """Histogramas do run em JSON (e no textfile do Prometheus, se configurado)"""
+        self.pipeline.metrics.export(
+            self.metrics_path,
+            self.prometheus_path,
+            project='drive',
+            model=self.pipeline.model,
+            mode=self.pipeline.mode
+        )
+    
     def _list_image_files(self, folder_id: str) -> List[Dict]:
         """Lista todos os arquivos de imagem de uma pasta"""
         query = f"'{folder_id}' in parents and (mimeType contains 'image/jpeg' or mimeType contains 'image/png' or mimeType contains 'image/tiff')"
@@ -192,7 +282,7 @@ class DriveTagger:
         while True:
             response = self.service.files().list(
                 q=query,
-                fields="nextPageToken, files(id, name, description, mimeType, createdTime)",
+                fields="nextPageToken, files(id, name, description, mimeType, createdTime, modifiedTime)",
                 pageSize=Config.DRIVE_BATCH_SIZE,
                 pageToken=page_token
             ).execute()
@@ -205,9 +295,25 @@ class DriveTagger:
         
         return files
     
-    def _download_file(self, file_id: str, output_path: Path):
+    def _download_to_temp(self, file_info: Dict) -> str:
+        """Estágio load do BatchEngine: baixa o arquivo para um temporário"""
+        suffix = Path(file_info['name']).suffix or '.jpg'
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp_file:
+            tmp_path = Path(tmp_file.name)
+        
+        try:
+            with self.pipeline.metrics.timed('drive_download'):
+                self._download_file(file_info['id'], tmp_path, service=self._worker_service())
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        
+        return str(tmp_path)
+    
+    def _download_file(self, file_id: str, output_path: Path, service=None):
         """Baixa arquivo do Drive"""
-        request = self.service.files().get_media(fileId=file_id)
+        service = service or self.service
+        request = service.files().get_media(fileId=file_id)
         
         with open(output_path, 'wb') as f:
             downloader = MediaIoBaseDownload(f, request)
@@ -218,10 +324,11 @@ class DriveTagger:
     
     def _update_file_description(self, file_id: str, description: str):
         """Atualiza descrição de um arquivo no Drive"""
-        self.service.files().update(
-            fileId=file_id,
-            body={'description': description}
-        ).execute()
+        with self.pipeline.metrics.timed('drive_update'):
+            self.service.files().update(
+                fileId=file_id,
+                body={'description': description}
+            ).execute()
         
         print(f"  📝 Descrição do Drive atualizada")
     
@@ -299,12 +406,14 @@ class DriveTagger:
             'file_id': file_info['id'],
             'file_name': file_info['name'],
             'metadata': metadata.to_dict(),
+            'telemetry': metadata.telemetry,
             'project': 'drive',
             'timestamp': datetime.now().isoformat()
         }
         
-        with open(self.manifest_path, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        with self.pipeline.metrics.timed('manifest_append'):
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
     
     def process_multiple_folders(
         self,
@@ -376,6 +485,87 @@ def main():
         default=100,
         help='Tamanho mínimo de descrição para pular arquivo'
     )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=Config.MAX_CONCURRENT_REQUESTS,
+        help='Requisições simultâneas ao Ollama'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Ignora o cache de inferência (sempre chama o modelo)'
+    )
+    parser.add_argument(
+        '--mode',
+        choices=Config.PROCESSING_MODES,
+        default=Config.PROCESSING_MODE,
+        help='two_pass (Pass 1 + Pass 2) ou single_pass (uma chamada por imagem)'
+    )
+    parser.add_argument(
+        '--normalizer',
+        choices=Config.NORMALIZER_PROFILES,
+        default=Config.NORMALIZER_PROFILE,
+        help='Pass 2: llm, hybrid (modelo só nas descrições) ou fast (sem modelo)'
+    )
+    parser.add_argument(
+        '--vocabulary',
+        choices=Config.OUTPUT_VOCABULARIES,
+        default=Config.OUTPUT_VOCABULARY,
+        help='Saída do modelo: full (por extenso) ou compact (códigos expandidos localmente)'
+    )
+    parser.add_argument(
+        '--cascade',
+        action='store_true',
+        default=None,
+        help=f'Pass 1 em {Config.FAST_VISION_MODEL}; escalona para {Config.VISION_MODEL} se incerto'
+    )
+    parser.add_argument(
+        '--text-model',
+        default=Config.TEXT_MODEL,
+        help='Modelo só de texto para o Pass 2 (ex.: llama3.2:3b; padrão: o modelo de visão)'
+    )
+    parser.add_argument(
+        '--no-prescreen',
+        action='store_true',
+        help='Desativa a pré-triagem local de qualidade técnica'
+    )
+    parser.add_argument(
+        '--hopeless',
+        choices=Config.PRESCREEN_POLICIES,
+        default=Config.PRESCREEN_HOPELESS_POLICY,
+        help='Frames sem salvação (preto, branco, tremido): skip, defer (fim do batch) ou process'
+    )
+    parser.add_argument(
+        '--pass2-batch',
+        type=int,
+        default=Config.PASS2_BATCH_SIZE,
+        help='Imagens por chamada do Pass 2 (1 = uma chamada por imagem)'
+    )
+    
+    parser.add_argument(
+        '--metrics-json',
+        type=Path,
+        default=None,
+        help=f'Durações por estágio em JSON (padrão: {Config.METRICS_FILENAME} ao lado do manifest)'
+    )
+    parser.add_argument(
+        '--prometheus-textfile',
+        type=Path,
+        default=Config.PROMETHEUS_TEXTFILE,
+        help='Arquivo .prom para o textfile collector do node exporter'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Só termina as imagens pela metade (passes já feitos vêm do staging)'
+    )
+    parser.add_argument(
+        '--no-staging',
+        action='store_true',
+        help='Não grava a saída de cada passe (falha no Pass 2 refaz o Pass 1)'
+    )
     
     args = parser.parse_args()
     
@@ -386,18 +576,33 @@ def main():
     print(f"🔑 Credentials: {args.credentials}")
     print(f"📄 Manifest: {args.manifest}")
     print(f"🔧 Modo: {'DRY RUN' if args.dry_run else 'PRODUÇÃO'}")
+    print(f"⚡ Concorrência: {args.concurrency}")
     print("="*80 + "\n")
     
     tagger = DriveTagger(
         credentials_path=args.credentials,
         manifest_path=args.manifest,
-        dry_run=args.dry_run
+        dry_run=args.dry_run,
+        concurrency=args.concurrency,
+        use_cache=False if args.no_cache else None,
+        mode=args.mode,
+        normalizer=args.normalizer,
+        pass2_batch=args.pass2_batch,
+        vocabulary=args.vocabulary,
+        cascade=args.cascade,
+        text_model=args.text_model,
+        prescreen=False if args.no_prescreen else None,
+        hopeless_policy=args.hopeless,
+        metrics_path=args.metrics_json,
+        prometheus_path=args.prometheus_textfile,
+        staging=False if args.no_staging else None
     )
     
     results = tagger.process_folder(
         args.folder_id,
         skip_processed=not args.reprocess,
-        min_description_length=args.min_description
+        min_description_length=args.min_description,
+        resume=args.resume
     )
     
     print(f"\n🎉 Concluído! {len(results)} arquivos processados.")
@@ -0,0 +1,270 @@
+"""
+Pool de processos exiftool persistentes (-stay_open)
+Cada comando vai pelo stdin de um exiftool já aberto: sem o custo de subir
+o Perl a cada foto (centenas de ms por arquivo)
+"""
+
+import atexit
+import itertools
+import queue
+import shutil
+import subprocess
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config
+
+
+class ExifToolError(RuntimeError):
+    """exiftool ausente, encerrado no meio de um comando ou sem resposta"""
+
+
+@dataclass
+class ExifToolResult:
+    """Saída de um comando (stdout/stderr separados pelo marcador {readyN})"""
+    stdout: str
+    stderr: str
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+    
+    @classmethod
+    def parse(cls, stdout: str, stderr: str) -> 'ExifToolResult':
+        lines = [line.strip() for line in stderr.splitlines() if line.strip()]
+        return cls(
+            stdout=stdout,
+            stderr=stderr,
+            errors=[line for line in lines if line.startswith('Error')],
+            warnings=[line for line in lines if line.startswith('Warning')],
+        )
+
+
+def _encode_arg(arg: str) -> str:
+    """
+    Uma linha do argfile por argumento
+    
+    O exiftool corta espaços nas pontas, não aceita quebra de linha e lê
+    linhas com '#' como comentário; nesses casos vai como #[CSTR], com
+    escapes de C.
+    """
+    if '\n' not in arg and '\r' not in arg and arg == arg.strip() and not arg.startswith('#'):
+        return arg
+    escaped = (
+        arg.replace('\\', '\\\\')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+        .replace('\t', '\\t')
+    )
+    return f"#[CSTR]{escaped}"
+
+
+class ExifToolProcess:
+    """Um `exiftool -stay_open True -@ -` com comandos delimitados por -executeN"""
+    
+    _ids = itertools.count(1)
+    
+    def __init__(self, executable: str = None, timeout: float = None):
+        self.executable = executable or Config.EXIFTOOL_PATH
+        self.timeout = Config.EXIFTOOL_TIMEOUT if timeout is None else timeout
+        self.commands = 0
+        self._timed_out = False
+        
+        if shutil.which(self.executable) is None:
+            raise ExifToolError(f"exiftool não encontrado ({self.executable}); instale com: brew install exiftool")
+        
+        self._proc = subprocess.Popen(
+            [self.executable, '-stay_open', 'True', '-@', '-'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        
+        # stderr drenado numa thread: avisos de uma pasta inteira não enchem o
+        # pipe enquanto o stdout ainda está sendo lido
+        self._stderr: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._pump = threading.Thread(target=self._pump_stderr, daemon=True)
+        self._pump.start()
+    
+    def _pump_stderr(self):
+        for line in iter(self._proc.stderr.readline, b''):
+            self._stderr.put(line)
+        self._stderr.put(None)
+    
+    @property
+    def alive(self) -> bool:
+        return self._proc.poll() is None
+    
+    def execute(self, args: List[str]) -> ExifToolResult:
+        """
+        Roda um comando e espera o marcador de fim em stdout e stderr
+        
+        Args:
+            args: Argumentos do exiftool (sem o nome do executável)
+        """
+        command_id = next(self._ids)
+        marker = f"{{ready{command_id}}}"
+        lines = [_encode_arg(str(a)) for a in args]
+        lines += ['-echo4', marker, f'-execute{command_id}']
+        payload = ('\n'.join(lines) + '\n').encode('utf-8')
+        
+        # Comando travado: o processo morre e a leitura abaixo termina em EOF
+        watchdog = threading.Timer(self.timeout, self._kill_stuck) if self.timeout else None
+        if watchdog is not None:
+            watchdog.daemon = True
+            watchdog.start()
+        
+        try:
+            self._proc.stdin.write(payload)
+            self._proc.stdin.flush()
+            stdout = self._read_until(self._proc.stdout.readline, marker)
+            stderr = self._read_until(self._stderr.get, marker)
+        except (BrokenPipeError, OSError) as e:
+            raise ExifToolError(f"exiftool encerrado: {e}")
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+        
+        self.commands += 1
+        return ExifToolResult.parse(stdout, stderr)
+    
+    def _kill_stuck(self):
+        self._timed_out = True
+        self._proc.kill()
+    
+    def _read_until(self, next_line, marker: str) -> str:
+        chunks = []
+        encoded = marker.encode('utf-8')
+        while True:
+            line = next_line()
+            if not line:
+                if self._timed_out:
+                    raise ExifToolError(f"exiftool sem resposta em {self.timeout:g}s")
+                raise ExifToolError(f"exiftool encerrado no meio do comando (código {self._proc.wait()})")
+            if line.rstrip(b'\r\n') == encoded:
+                return b''.join(chunks).decode('utf-8', errors='replace')
+            chunks.append(line)
+    
+    def close(self):
+        """Pede para o exiftool sair; mata se não responder"""
+        if not self.alive:
+            return
+        try:
+            self._proc.stdin.write(b'-stay_open\nFalse\n')
+            self._proc.stdin.flush()
+            self._proc.stdin.close()
+            self._proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self._proc.kill()
+            self._proc.wait()
+
+
+class ExifToolPool:
+    """
+    Até `size` processos exiftool persistentes, abertos sob demanda
+    
+    Exemplo:
+        pool = ExifToolPool(size=2)
+        result = pool.execute(['-XMP-dc:Title=Garça', 'foto.CR3'])
+        if not result.ok:
+            print(result.errors)
+    
+    Thread-safe: cada chamada pega um processo livre (ou abre um novo até o
+    limite). Processo que morreu no meio de um comando é descartado e o
+    comando é refeito uma vez num processo novo.
+    """
+    
+    def __init__(self, size: int = None, executable: str = None, timeout: float = None):
+        self.size = max(1, size or Config.EXIFTOOL_POOL_SIZE)
+        self.executable = executable or Config.EXIFTOOL_PATH
+        self.timeout = timeout
+        self.commands = 0
+        self.restarts = 0
+        self._idle: "queue.Queue[ExifToolProcess]" = queue.Queue()
+        self._all: List[ExifToolProcess] = []
+        self._lock = threading.Lock()
+        self._closed = False
+    
+    @property
+    def available(self) -> bool:
+        return shutil.which(self.executable) is not None
+    
+    def execute(self, args: List[str]) -> ExifToolResult:
+        """Roda um comando num processo do pool"""
+        for attempt in (1, 2):
+            process = self._acquire()
+            try:
+                result = process.execute(args)
+            except ExifToolError:
+                self._discard(process)
+                if attempt == 2:
+                    raise
+                with self._lock:
+                    self.restarts += 1
+                continue
+            
+            self._idle.put(process)
+            with self._lock:
+                self.commands += 1
+            return result
+    
+    def _acquire(self) -> ExifToolProcess:
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            
+            with self._lock:
+                if self._closed:
+                    raise ExifToolError("pool do exiftool já foi fechado")
+                if len(self._all) < self.size:
+                    process = ExifToolProcess(self.executable, self.timeout)
+                    self._all.append(process)
+                    return process
+            
+            # Todos ocupados; volta a checar o limite caso algum seja descartado
+            try:
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
+                continue
+    
+    def _discard(self, process: ExifToolProcess):
+        with self._lock:
+            if process in self._all:
+                self._all.remove(process)
+        process.close()
+    
+    def close(self):
+        """Encerra todos os processos (os ocupados terminam o comando atual antes)"""
+        with self._lock:
+            self._closed = True
+            processes, self._all = self._all, []
+        for process in processes:
+            process.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+_shared_pool: Optional[ExifToolPool] = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool() -> ExifToolPool:
+    """Pool único do processo (gravação de XMP, previews de RAW, leituras)"""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = ExifToolPool()
+            atexit.register(_shared_pool.close)
+        return _shared_pool
@@ -0,0 +1,205 @@
+"""
+Varredura de pastas em uma passada (os.scandir), recursiva e em streaming
+Os arquivos saem à medida que são encontrados: num volume de arquivo com
+dezenas de milhares de fotos o processamento começa sem esperar a listagem
+"""
+
+import os
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config
+
+
+@dataclass(frozen=True)
+class ScannedFile:
+    """Arquivo encontrado, com o stat feito uma única vez na varredura"""
+    path: Path
+    size: int
+    mtime_ns: int
+    
+    @property
+    def fingerprint(self) -> str:
+        """Mesmo formato de pass_staging.file_fingerprint (tamanho:mtime)"""
+        return f"{self.size}:{self.mtime_ns}"
+
+
+def _normalize_patterns(patterns: Optional[Iterable[str]]) -> List[str]:
+    return [p.lower().replace('\\', '/') for p in (patterns or []) if p]
+
+
+class FolderScanner:
+    """
+    Lista as fotos de uma pasta (e subpastas) numa passada só
+    
+    Exemplo:
+        scanner = FolderScanner(['.CR3', '.NEF'], exclude=['Rejeitadas'])
+        for found in scanner.scan(Path('/Volumes/Arquivo/Missao')):
+            print(found.path, found.size)
+    
+    - Extensões sem diferenciar maiúsculas (.CR3 e .cr3 numa listagem só)
+    - Cada arquivo sai uma vez: o mesmo inode (hardlink, symlink, sistema de
+      arquivos que ignora maiúsculas) não é repetido
+    - Padrões (fnmatch, sem diferenciar maiúsculas) valem para o nome ou
+      para o caminho relativo à raiz ('Dia1/*'); exclude também poda pastas,
+      include filtra só arquivos
+    - Ordem estável: nomes em ordem alfabética, arquivos da pasta antes das
+      subpastas
+    - Pasta sem permissão é contada em `errors` e pulada
+    """
+    
+    def __init__(
+        self,
+        extensions: Iterable[str] = None,
+        recursive: bool = None,
+        include: Iterable[str] = None,
+        exclude: Iterable[str] = None,
+        follow_symlinks: bool = False
+    ):
+        self.extensions = {
+            ('.' + e.lstrip('.')).upper()
+            for e in (extensions if extensions is not None else Config.RAW_EXTENSIONS)
+        }
+        self.recursive = Config.SCAN_RECURSIVE if recursive is None else recursive
+        self.include = _normalize_patterns(include)
+        self.exclude = _normalize_patterns(Config.SCAN_EXCLUDE if exclude is None else exclude)
+        self.follow_symlinks = follow_symlinks
+        
+        self.directories = 0
+        self.matched = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.done = False
+    
+    def _matches(self, patterns: List[str], name: str, relative: str) -> bool:
+        name, relative = name.lower(), relative.lower()
+        return any(fnmatchcase(name, p) or fnmatchcase(relative, p) for p in patterns)
+    
+    def scan(self, root: Path) -> Iterator[ScannedFile]:
+        """
+        Arquivos com as extensões pedidas, conforme são encontrados
+        
+        Args:
+            root: Pasta de partida
+        """
+        root = Path(root)
+        self.done = False
+        seen_files = set()
+        seen_dirs = set()
+        if self.follow_symlinks:
+            try:
+                stat = root.stat()
+                seen_dirs.add((stat.st_dev, stat.st_ino))
+            except OSError:
+                pass
+        stack = [(root, '')]
+        
+        while stack:
+            directory, relative = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda e: e.name.casefold())
+            except OSError as e:
+                self.errors += 1
+                print(f"⚠️  Sem acesso a {directory}: {e.strerror or e}")
+                continue
+            self.directories += 1
+            
+            subdirs = []
+            for entry in entries:
+                entry_relative = f"{relative}{entry.name}"
+                if self.exclude and self._matches(self.exclude, entry.name, entry_relative):
+                    continue
+                
+                try:
+                    if entry.is_dir(follow_symlinks=self.follow_symlinks):
+                        if self.recursive:
+                            subdirs.append((entry, entry_relative))
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                
+                if os.path.splitext(entry.name)[1].upper() not in self.extensions:
+                    continue
+                if self.include and not self._matches(self.include, entry.name, entry_relative):
+                    continue
+                
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                
+                key = (stat.st_dev, stat.st_ino) if stat.st_ino else os.path.normcase(entry.path)
+                if key in seen_files:
+                    self.duplicates += 1
+                    continue
+                seen_files.add(key)
+                
+                self.matched += 1
+                yield ScannedFile(Path(entry.path), stat.st_size, stat.st_mtime_ns)
+            
+            # Pilha: a primeira subpasta em ordem alfabética sai primeiro
+            for entry, entry_relative in reversed(subdirs):
+                if self.follow_symlinks:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if (stat.st_dev, stat.st_ino) in seen_dirs:
+                        continue
+                    seen_dirs.add((stat.st_dev, stat.st_ino))
+                stack.append((Path(entry.path), entry_relative + '/'))
+        
+        self.done = True
+    
+    def print_summary(self):
+        line = f"📁 Varredura: {self.matched} arquivos em {self.directories} pastas"
+        if self.duplicates:
+            line += f" | {self.duplicates} repetidos ignorados"
+        if self.errors:
+            line += f" | {self.errors} pastas sem acesso"
+        print(line)
+
+
+def scan_folder(root: Path, extensions: Iterable[str] = None, **kwargs) -> Iterator[ScannedFile]:
+    """Atalho para FolderScanner(extensions, ...).scan(root)"""
+    return FolderScanner(extensions, **kwargs).scan(root)
+
+
+def main():
+    import argparse
+    import time
+    
+    parser = argparse.ArgumentParser(description="Acquaplan - lista as fotos de uma pasta")
+    parser.add_argument('folder', type=Path)
+    parser.add_argument('--extensions', nargs='+', default=Config.RAW_EXTENSIONS)
+    parser.add_argument('--no-recursive', action='store_true', help='Só a pasta, sem subpastas')
+    parser.add_argument('--include', nargs='+', default=None, help='Padrões de arquivo (ex.: "IMG_*")')
+    parser.add_argument('--exclude', nargs='+', default=None, help='Padrões de arquivo ou pasta a ignorar')
+    args = parser.parse_args()
+    
+    exclude = None if args.exclude is None else Config.SCAN_EXCLUDE + args.exclude
+    scanner = FolderScanner(
+        args.extensions, recursive=not args.no_recursive,
+        include=args.include, exclude=exclude
+    )
+    start = time.perf_counter()
+    first = None
+    for found in scanner.scan(args.folder):
+        if first is None:
+            first = time.perf_counter() - start
+        print(found.path)
+    
+    scanner.print_summary()
+    if first is not None:
+        print(f"⏱️  Primeiro arquivo em {first * 1000:.0f}ms, varredura em {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
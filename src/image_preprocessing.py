@@ -0,0 +1,185 @@
+"""
+Pré-processamento de imagens antes do Pass 1
+Reduz ao tamanho nativo do modelo e guarda em cache de miniaturas por hash de conteúdo
+"""
+
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, Tuple
+import sys
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    print("⚠️  Pillow não instalado. Pré-processamento desativado. Instale com: pip install Pillow")
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config
+
+
+def compute_content_hash(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Hash do conteúdo do arquivo (independe de nome e localização)"""
+    digest = hashlib.blake2b(digest_size=20)
+    
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    
+    return digest.hexdigest()
+
+
+class ImagePreprocessor:
+    """
+    Gera a entrada do modelo a partir do arquivo original
+    
+    - JPEG: decodifica já reduzido via draft (escala DCT 1/2, 1/4, 1/8)
+    - TIFF/PNG: decodifica, converte para RGB 8 bits
+    - Aplica orientação EXIF e descarta metadados
+    - Resultado em JPEG no cache, chave = hash do conteúdo + tamanho
+    """
+    
+    def __init__(self, cache_dir: Path = None, max_size: int = None, quality: int = None):
+        self.cache_dir = Path(cache_dir or Config.THUMBNAIL_CACHE_DIR)
+        self.max_size = max_size or Config.MODEL_INPUT_SIZE
+        self.quality = quality or Config.THUMBNAIL_QUALITY
+        
+        # (path, mtime, tamanho) -> hash, evita reler o arquivo na mesma execução
+        self._hash_memo: Dict[Tuple[str, int, int], str] = {}
+    
+    def content_hash(self, image_path: Path) -> str:
+        """Hash de conteúdo com memo por path+mtime+tamanho"""
+        stat = os.stat(image_path)
+        memo_key = (str(image_path), stat.st_mtime_ns, stat.st_size)
+        
+        content_hash = self._hash_memo.get(memo_key)
+        if content_hash is None:
+            content_hash = compute_content_hash(image_path)
+            self._hash_memo[memo_key] = content_hash
+        
+        return content_hash
+    
+    def cache_path_for(self, content_hash: str) -> Path:
+        return self.cache_dir / content_hash[:2] / f"{content_hash}_{self.max_size}.jpg"
+    
+    def prepare(self, image_path: str) -> str:
+        """
+        Retorna o caminho da imagem reduzida para enviar ao modelo
+        
+        Args:
+            image_path: Arquivo original
+        
+        Returns:
+            Caminho da miniatura no cache (ou o original se Pillow não estiver disponível)
+        """
+        if not PIL_AVAILABLE:
+            return str(image_path)
+        
+        cached = self.cache_path_for(self.content_hash(Path(image_path)))
+        
+        if not cached.exists():
+            self._render(Path(image_path), cached)
+        
+        return str(cached)
+    
+    def _render(self, source: Path, target: Path):
+        """Decodifica, reduz e grava a miniatura de forma atômica"""
+        with Image.open(source) as img:
+            if img.format == 'JPEG':
+                # Decodifica direto em escala reduzida (muito mais rápido que full + resize)
+                img.draft('RGB', (self.max_size, self.max_size))
+            
+            img = ImageOps.exif_transpose(img)
+            img = self._to_rgb(img)
+            img.thumbnail((self.max_size, self.max_size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+            
+            try:
+                # Sem exif/icc: metadados do original ficam de fora
+                img.save(tmp_path, 'JPEG', quality=self.quality)
+                os.replace(tmp_path, target)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+    
+    @staticmethod
+    def _to_rgb(img: "Image.Image") -> "Image.Image":
+        """Normaliza modos de TIFF/PNG (16 bits, alfa, paleta) para RGB 8 bits"""
+        if img.mode in ('I;16', 'I;16B', 'I;16L', 'I'):
+            img = img.convert('I').point(lambda v: v * (1 / 256)).convert('L')
+        
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            return background
+        
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        return img
+    
+    def clear(self):
+        """Remove todo o cache de miniaturas"""
+        if self.cache_dir.exists():
+            shutil.rmtree(self.cache_dir)
+        self._hash_memo.clear()
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="Cache de miniaturas para o modelo de visão"
+    )
+    parser.add_argument(
+        '--cache-dir',
+        type=Path,
+        default=Config.THUMBNAIL_CACHE_DIR,
+        help='Pasta do cache de miniaturas'
+    )
+    
+    subparsers = parser.add_subparsers(dest='command', help='Comando')
+    
+    warm = subparsers.add_parser('warm', help='Pré-gerar miniaturas de uma pasta')
+    warm.add_argument('folder', type=Path)
+    
+    subparsers.add_parser('clear', help='Apagar o cache de miniaturas')
+    
+    args = parser.parse_args()
+    
+    if not args.command:
+        parser.print_help()
+        return
+    
+    preprocessor = ImagePreprocessor(cache_dir=args.cache_dir)
+    
+    if args.command == 'warm':
+        images = [
+            p for p in sorted(args.folder.iterdir())
+            if p.suffix.lower() in Config.PREPROCESS_EXTENSIONS
+        ]
+        for idx, image_path in enumerate(images, 1):
+            print(f"[{idx}/{len(images)}] {image_path.name}")
+            try:
+                preprocessor.prepare(str(image_path))
+            except Exception as e:
+                print(f"  ❌ Erro: {e}")
+        print(f"✅ Cache: {preprocessor.cache_dir}")
+    
+    elif args.command == 'clear':
+        preprocessor.clear()
+        print(f"🗑️  Cache removido: {preprocessor.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
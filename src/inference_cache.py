@@ -0,0 +1,265 @@
+"""
+Cache persistente de inferência (Pass 1 e Pass 2)
+Chave = hash do conteúdo + modelo + versão do prompt + opções de geração
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config
+
+
+class InferenceCache:
+    """
+    Saídas do modelo endereçadas por conteúdo, em SQLite
+    
+    Mover, renomear ou reexportar a foto não invalida nada: a chave vem dos
+    bytes da imagem (Pass 1) ou do JSON de entrada (Pass 2). Quando o banco
+    passa de `max_bytes`, as entradas menos usadas recentemente saem primeiro.
+    """
+    
+    def __init__(self, db_path: Path = None, max_bytes: int = None):
+        self.db_path = Path(db_path or Config.INFERENCE_CACHE_PATH)
+        self.max_bytes = max_bytes or Config.INFERENCE_CACHE_MAX_MB * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS inference_cache (
+                key TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_inference_cache_access ON inference_cache(last_access)"
+        )
+        self._conn.commit()
+        
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM inference_cache"
+        ).fetchone()[0]
+    
+    @staticmethod
+    def make_key(stage: str, content_hash: str, request: Dict, **extra) -> str:
+        """
+        Chave determinística de uma requisição ao modelo
+        
+        Args:
+            stage: 'pass1' ou 'pass2'
+            content_hash: Hash da imagem (Pass 1) ou dos dados de entrada (Pass 2)
+            request: Requisição montada pelo pipeline (imagens são ignoradas)
+            **extra: Outros parâmetros que mudam a saída (ex.: tamanho de entrada)
+        """
+        messages = [
+            {k: v for k, v in m.items() if k != 'images'}
+            for m in request.get('messages', [])
+        ]
+        material = {
+            'stage': stage,
+            'content': content_hash,
+            'model': request.get('model'),
+            'prompt_version': Config.PROMPT_VERSION,
+            'options': request.get('options', {}),
+            'format': request.get('format'),
+            'messages': messages,
+            **extra
+        }
+        encoded = json.dumps(material, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """Retorna a saída em cache (e marca o acesso) ou None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM inference_cache WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            self._conn.execute(
+                "UPDATE inference_cache SET last_access = ? WHERE key = ?",
+                (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        
+        return json.loads(row[0])
+    
+    def put(self, key: str, stage: str, model: str, payload: Dict):
+        """Grava uma saída do modelo e aplica a política de tamanho"""
+        encoded = json.dumps(payload, ensure_ascii=False)
+        size = len(encoded.encode('utf-8'))
+        
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM inference_cache WHERE key = ?", (key,)
+            ).fetchone()
+            
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO inference_cache
+                    (key, stage, model, prompt_version, payload, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, stage, model, Config.PROMPT_VERSION, encoded, size,
+                 datetime.now().isoformat(), time.time())
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            
+            if self._total_bytes > self.max_bytes:
+                self._evict_locked()
+            
+            self._conn.commit()
+    
+    def _evict_locked(self):
+        """Remove as entradas menos usadas até voltar a 90% do limite"""
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT key, size FROM inference_cache ORDER BY last_access ASC"
+        )
+        
+        to_delete = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            to_delete.append((key,))
+            self._total_bytes -= size
+        
+        self._conn.executemany("DELETE FROM inference_cache WHERE key = ?", to_delete)
+    
+    def invalidate(
+        self,
+        model: str = None,
+        stage: str = None,
+        prompt_version: str = None
+    ) -> int:
+        """
+        Remove entradas por filtro (sem filtros = tudo)
+        
+        Returns:
+            Número de entradas removidas
+        """
+        clauses, params = [], []
+        for column, value in (('model', model), ('stage', stage), ('prompt_version', prompt_version)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        
+        with self._lock:
+            removed = self._conn.execute(f"DELETE FROM inference_cache {where}", params).rowcount
+            self._conn.commit()
+            self._total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM inference_cache"
+            ).fetchone()[0]
+        
+        return removed
+    
+    def stats(self) -> Dict:
+        """Resumo do cache por estágio e modelo"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT stage, model, prompt_version, COUNT(*), SUM(size)
+                FROM inference_cache
+                GROUP BY stage, model, prompt_version
+                ORDER BY stage, model
+            """).fetchall()
+        
+        return {
+            'path': str(self.db_path),
+            'total_bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+            'groups': [
+                {'stage': r[0], 'model': r[1], 'prompt_version': r[2], 'entries': r[3], 'bytes': r[4]}
+                for r in rows
+            ]
+        }
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="Cache de inferência do Acquaplan Tagger"
+    )
+    parser.add_argument(
+        '--cache',
+        type=Path,
+        default=Config.INFERENCE_CACHE_PATH,
+        help='Caminho do banco do cache'
+    )
+    
+    subparsers = parser.add_subparsers(dest='command', help='Comando')
+    
+    subparsers.add_parser('stats', help='Mostrar uso do cache')
+    
+    invalidate = subparsers.add_parser('invalidate', help='Remover entradas do cache')
+    invalidate.add_argument('--model', help='Apenas deste modelo')
+    invalidate.add_argument('--stage', choices=['pass1', 'pass2'], help='Apenas deste estágio')
+    invalidate.add_argument('--prompt-version', help='Apenas desta versão de prompt')
+    invalidate.add_argument('--all', action='store_true', help='Confirma limpar tudo (sem filtros)')
+    
+    args = parser.parse_args()
+    
+    if not args.command:
+        parser.print_help()
+        return
+    
+    cache = InferenceCache(args.cache)
+    
+    if args.command == 'stats':
+        stats = cache.stats()
+        print(f"💾 Cache: {stats['path']}")
+        print(f"   {stats['total_bytes'] / 1024 / 1024:.1f} MB de {stats['max_bytes'] / 1024 / 1024:.0f} MB")
+        for group in stats['groups']:
+            print(
+                f"   {group['stage']} | {group['model']} | prompt {group['prompt_version']}: "
+                f"{group['entries']} entradas ({group['bytes'] / 1024:.0f} KB)"
+            )
+    
+    elif args.command == 'invalidate':
+        if not (args.model or args.stage or args.prompt_version or args.all):
+            print("⚠️  Informe --model/--stage/--prompt-version ou --all")
+            return
+        
+        removed = cache.invalidate(
+            model=args.model,
+            stage=args.stage,
+            prompt_version=args.prompt_version
+        )
+        print(f"🗑️  {removed} entradas removidas")
+    
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Instrumentação por estágio (leitura, Pass 1, Pass 2, parse, exiftool, manifest, Drive)
+Histogramas de latência em buckets logarítmicos: memória fixa por estágio,
+p50/p95/p99 estimados sem guardar as amostras
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# Bordas dos buckets: 0,1 ms a ~1 h, razão 2^(1/8) (~9%: erro de quantil < 5%)
+_BUCKET_RATIO = 2 ** 0.125
+BUCKET_BOUNDS: List[float] = [1e-4 * _BUCKET_RATIO ** i for i in range(202)]
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Ordem de exibição dos estágios conhecidos (os demais vêm depois, em ordem alfabética)
+STAGE_ORDER = [
+    'raw_preview', 'drive_list', 'load', 'drive_download', 'prescreen', 'preprocess',
+    'pass1', 'pass2', 'pass2_batch', 'json_parse', 'build_metadata',
+    'xmp_write', 'exiftool', 'manifest_append', 'drive_update'
+]
+
+
+class LatencyHistogram:
+    """Histograma de durações (segundos) com contagem, soma, mínimo e máximo"""
+    
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+    
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def quantile(self, q: float) -> float:
+        """Quantil estimado (interpolação geométrica dentro do bucket)"""
+        if not self.count:
+            return 0.0
+        
+        rank = q * self.count
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            if not n or seen + n < rank:
+                seen += n
+                continue
+            
+            upper = BUCKET_BOUNDS[idx] if idx < len(BUCKET_BOUNDS) else self.max
+            lower = BUCKET_BOUNDS[idx - 1] if idx > 0 else min(self.min, upper)
+            fraction = (rank - seen) / n
+            value = lower * (upper / lower) ** fraction if lower > 0 else upper * fraction
+            return min(max(value, self.min), self.max)
+        
+        return self.max
+    
+    def summary(self) -> Dict:
+        result = {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'min': self.min if self.count else 0.0,
+            'max': self.max,
+        }
+        for q in QUANTILES:
+            result[f"p{q * 100:g}"] = self.quantile(q)
+        return result
+
+
+class StageMetrics:
+    """
+    Durações por estágio de um run (thread-safe)
+    
+    Exemplo:
+        metrics = StageMetrics()
+        with metrics.timed('exiftool'):
+            subprocess.run(cmd)
+        metrics.dump_json(path)
+    
+    Exceções dentro de `timed` contam em errors e a duração é registrada
+    mesmo assim (o tempo gasto numa chamada que falhou também é custo do run).
+    """
+    
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.errors: Dict[str, int] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+    
+    def observe(self, stage: str, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.observe(seconds)
+            if error:
+                self.errors[stage] = self.errors.get(stage, 0) + 1
+    
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start, error)
+    
+    def _ordered_stages(self) -> List[str]:
+        known = [s for s in STAGE_ORDER if s in self.histograms]
+        return known + sorted(s for s in self.histograms if s not in STAGE_ORDER)
+    
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                stage: dict(self.histograms[stage].summary(), errors=self.errors.get(stage, 0))
+                for stage in self._ordered_stages()
+            }
+    
+    def to_dict(self, **context) -> Dict:
+        return {
+            'started': datetime.fromtimestamp(self.started).isoformat(),
+            'finished': datetime.now().isoformat(),
+            'wall_seconds': time.time() - self.started,
+            **context,
+            'stages': self.summary()
+        }
+    
+    def dump_json(self, path: Path, **context):
+        """Grava o resumo do run (context: projeto, modelo, modo...)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(**context), f, indent=2, ensure_ascii=False)
+    
+    def write_prometheus(self, path: Path, labels: Dict[str, str] = None):
+        """
+        Arquivo .prom para o textfile collector do node exporter
+        
+        Cada estágio vira um summary (quantis 0.5/0.95/0.99, _sum e _count).
+        Gravado num temporário e renomeado: o exporter nunca lê pela metade.
+        """
+        path = Path(path)
+        base = dict(labels or {})
+        
+        def fmt(extra: Dict[str, str]) -> str:
+            merged = {**base, **extra}
+            return ','.join(f'{k}="{_escape_label(v)}"' for k, v in merged.items())
+        
+        lines = [
+            '# HELP acquaplan_stage_duration_seconds Duração por estágio do último run',
+            '# TYPE acquaplan_stage_duration_seconds summary',
+        ]
+        stages = self.summary()
+        for stage, s in stages.items():
+            for q in QUANTILES:
+                labels_q = fmt({'stage': stage, 'quantile': f"{q:g}"})
+                lines.append(f"acquaplan_stage_duration_seconds{{{labels_q}}} {s[f'p{q * 100:g}']:.6f}")
+            lines.append(f"acquaplan_stage_duration_seconds_sum{{{fmt({'stage': stage})}}} {s['sum']:.6f}")
+            lines.append(f"acquaplan_stage_duration_seconds_count{{{fmt({'stage': stage})}}} {s['count']}")
+        
+        lines += [
+            '# HELP acquaplan_stage_errors_total Erros por estágio do último run',
+            '# TYPE acquaplan_stage_errors_total counter',
+        ]
+        lines += [
+            f"acquaplan_stage_errors_total{{{fmt({'stage': stage})}}} {s['errors']}"
+            for stage, s in stages.items()
+        ]
+        
+        lines += [
+            '# HELP acquaplan_last_run_timestamp_seconds Fim do último run (epoch)',
+            '# TYPE acquaplan_last_run_timestamp_seconds gauge',
+            f"acquaplan_last_run_timestamp_seconds{{{fmt({})}}} {time.time():.0f}",
+        ]
+        
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+    
+    def export(self, json_path: Optional[Path] = None, prometheus_path: Optional[Path] = None, **context):
+        """Fim do run: JSON (e .prom, se pedido); falha aqui não derruba o batch"""
+        for target, write in (
+            (json_path, lambda p: self.dump_json(p, **context)),
+            (prometheus_path, lambda p: self.write_prometheus(p, {k: str(v) for k, v in context.items()})),
+        ):
+            if not target:
+                continue
+            try:
+                write(target)
+                print(f"📈 Métricas: {target}")
+            except OSError as e:
+                print(f"⚠️  Não foi possível gravar métricas em {target}: {e}")
+    
+    def print_summary(self):
+        stages = self.summary()
+        if not stages:
+            return
+        
+        print("📈 Estágios (p50 / p95 / p99):")
+        for stage, s in stages.items():
+            errors = f" | {s['errors']} erros" if s['errors'] else ""
+            print(
+                f"   {stage}: {_fmt_seconds(s['p50'])} / {_fmt_seconds(s['p95'])} / "
+                f"{_fmt_seconds(s['p99'])} | total {s['sum']:.1f}s ({s['count']}){errors}"
+            )
+
+
+def _fmt_seconds(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.1f}s"
+
+
+def _escape_label(value) -> str:
+    """Valor de label no formato de exposição do Prometheus"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,218 @@
+"""
+Leitura incremental de JSON em respostas com streaming
+Detecta quando o objeto raiz fecha para encerrar a geração sem esperar o fim
+"""
+
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class JsonObjectScanner:
+    """
+    Acompanha o texto chegando em pedaços e avisa quando o objeto `{...}`
+    de nível mais alto fecha (chaves dentro de strings são ignoradas)
+    
+    Exemplo:
+        scanner = JsonObjectScanner()
+        for chunk in stream:
+            if scanner.feed(chunk):
+                break
+        data = json.loads(scanner.text)
+    """
+    
+    def __init__(self):
+        self.complete = False
+        self._parts: List[str] = []
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+    
+    def feed(self, chunk: str) -> bool:
+        """
+        Consome um pedaço da resposta
+        
+        Returns:
+            True quando o objeto raiz terminou (o resto do pedaço é descartado)
+        """
+        if self.complete:
+            return True
+        
+        for idx, ch in enumerate(chunk):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            
+            if ch == '{':
+                self._started = True
+                self._depth += 1
+            elif not self._started:
+                continue
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[:idx + 1])
+                    self.complete = True
+                    return True
+        
+        self._parts.append(chunk)
+        return False
+    
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+
+class JsonTimings:
+    """
+    Tempo até o JSON completo, por estágio
+    
+    Conta também quantas respostas tiveram a geração interrompida (o modelo
+    seguia emitindo espaços ou texto depois do `}`; com schema a geração
+    costuma acabar no próprio `}` e nada é interrompido) e os tokens gerados
+    (eval_count do Ollama; pedaços recebidos quando o pedaço final não veio).
+    """
+    
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.early_stops: Dict[str, int] = {}
+        self.tokens: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, stage: str, seconds: float, early_stop: bool, tokens: int = None):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+            if tokens is not None:
+                self.tokens.setdefault(stage, []).append(tokens)
+            if early_stop:
+                self.early_stops[stage] = self.early_stops.get(stage, 0) + 1
+    
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+            tokens = {stage: list(values) for stage, values in self.tokens.items()}
+        
+        result = {}
+        for stage, values in samples.items():
+            ordered = sorted(values)
+            result[stage] = {
+                'count': len(ordered),
+                'mean': sum(ordered) / len(ordered),
+                'p50': ordered[len(ordered) // 2],
+                'p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+                'early_stops': self.early_stops.get(stage, 0),
+                'tokens_mean': (
+                    sum(tokens[stage]) / len(tokens[stage]) if tokens.get(stage) else None
+                ),
+            }
+        return result
+    
+    def print_summary(self):
+        for stage, s in self.summary().items():
+            tokens = f" | ~{s['tokens_mean']:.0f} tokens" if s['tokens_mean'] is not None else ""
+            print(
+                f"⏱️  JSON completo ({stage}): média {s['mean']:.1f}s | p50 {s['p50']:.1f}s | "
+                f"p95 {s['p95']:.1f}s | {s['early_stops']}/{s['count']} interrompidos após o '}}'{tokens}"
+            )
+
+
+def repair_truncated_json(text: str) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Recupera um objeto JSON cortado no meio (ex.: limite de num_predict)
+    
+    Corta no último elemento completo e fecha strings, listas e objetos
+    abertos. Campos que ficaram pela metade somem (ou ficam com os itens
+    completos, no caso de listas).
+    
+    Returns:
+        (dados recuperados ou None, chave de nível mais alto que estava
+        sendo escrita quando o texto acabou, se houver)
+    """
+    start = text.find('{')
+    if start < 0:
+        return None, None
+    
+    # Pilha de contêineres: [tipo, esperando_chave]
+    stack: List[list] = []
+    # Pontos de corte seguros: (posição, fechamentos necessários)
+    boundaries: List[Tuple[int, str]] = []
+    in_string = escape = string_is_key = False
+    string_start = 0
+    open_key, open_key_done = None, True
+    
+    def closers() -> str:
+        return ''.join('}' if kind == '{' else ']' for kind, _ in reversed(stack))
+    
+    def value_done(pos: int):
+        nonlocal open_key_done
+        boundaries.append((pos, closers()))
+        if len(stack) == 1:
+            open_key_done = True
+    
+    for idx in range(start, len(text)):
+        ch = text[idx]
+        
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if not string_is_key:
+                    value_done(idx + 1)
+                elif len(stack) == 1:
+                    try:
+                        open_key = json.loads(text[string_start:idx + 1])
+                    except json.JSONDecodeError:
+                        open_key = None
+                    open_key_done = False
+            continue
+        
+        if ch == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1][0] == '{' and stack[-1][1]
+            string_start = idx
+        elif ch in '{[':
+            stack.append([ch, ch == '{'])
+            boundaries.append((idx + 1, closers()))
+        elif ch in '}]':
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                # Objeto completo: nada a reparar
+                try:
+                    return json.loads(text[start:idx + 1]), None
+                except json.JSONDecodeError:
+                    break
+            value_done(idx + 1)
+        elif ch == ':' and stack:
+            stack[-1][1] = False
+        elif ch == ',' and stack:
+            # Antes da vírgula o elemento anterior está completo (inclui números)
+            boundaries.append((idx, closers()))
+            if stack[-1][0] == '{':
+                stack[-1][1] = True
+            if len(stack) == 1:
+                open_key_done = True
+    
+    truncated_key = None if open_key_done else open_key
+    
+    for pos, closing in reversed(boundaries[-8:]):
+        try:
+            data = json.loads(text[start:pos] + closing)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data, truncated_key
+    
+    return None, truncated_key
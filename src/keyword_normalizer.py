@@ -0,0 +1,243 @@
+"""
+Normalizador local (regras + dicionários) para a saída do Pass 1
+Gera título, descrições e keywords categoria:valor sem chamar o modelo
+"""
+
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import (
+    Config,
+    Habitat,
+    ActivityType,
+    ArchaeologyFlag,
+    HABITAT_KEYWORDS_MAP,
+    KEYWORD_CATEGORIES
+)
+
+
+# Nome de exibição dos habitats (títulos)
+HABITAT_LABELS = {
+    Habitat.MANGUEZAL: "Manguezal",
+    Habitat.RESTINGA: "Restinga",
+    Habitat.MATA_ATLANTICA: "Mata Atlântica",
+    Habitat.DUNAS: "Dunas",
+    Habitat.PRAIA: "Praia",
+    Habitat.COSTAO_ROCHOSO: "Costão rochoso",
+    Habitat.ESTUARIO: "Estuário",
+    Habitat.LAGUNA: "Laguna",
+    Habitat.AREA_URBANA: "Área urbana",
+    Habitat.RIO: "Rio",
+    Habitat.SERRA: "Serra",
+    Habitat.ILHAS: "Ilhas",
+    Habitat.BAIA: "Baía",
+    Habitat.AMBIENTE_MARINHO: "Ambiente marinho",
+}
+
+# Variações de categoria que o modelo costuma usar -> categoria canônica
+CATEGORY_ALIASES = {
+    'cor': 'cores',
+    'elemento': 'elementos',
+    'tecnica': 'tecnica',
+    'tecnicas': 'tecnica',
+    'habitat': 'bioma',
+    'ecossistema': 'bioma',
+    'especie': 'fauna',
+    'animal': 'fauna',
+    'planta': 'flora',
+    'vegetacao': 'flora',
+    'atividades': 'atividade',
+    'tempo': 'clima',
+    'geologia': 'geomorfologia',
+}
+
+# Categorias aceitas (vocabulário + categorias pedidas no prompt do Pass 2)
+CATEGORIES = {
+    'bioma', 'geomorfologia', 'fauna', 'flora', 'atividade', 'clima',
+    'tecnica', 'conservacao', 'cores', 'elementos', 'arqueologia', 'impacto'
+}
+
+# Categoria usada para termos soltos que não estão em nenhum dicionário
+DEFAULT_CATEGORY = 'elementos'
+
+_NON_WORD = re.compile(r'[^a-z0-9_]+')
+
+
+def fold(text: str) -> str:
+    """Minúsculas, sem acento, separadores como '_' (ex.: 'Maré Baixa' -> 'mare_baixa')"""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    text = _NON_WORD.sub('_', text.strip().lower())
+    return text.strip('_')
+
+
+def _build_index() -> Dict[str, Tuple[str, str]]:
+    """termo dobrado -> (categoria, valor)"""
+    index = {}
+    
+    for category, values in KEYWORD_CATEGORIES.items():
+        for value in values:
+            index[fold(value)] = (fold(category), fold(value))
+    
+    for habitat, synonyms in HABITAT_KEYWORDS_MAP.items():
+        for synonym in synonyms:
+            index.setdefault(fold(synonym), ('bioma', habitat.value))
+    
+    for habitat in Habitat:
+        index[habitat.value] = ('bioma', habitat.value)
+    
+    for activity in ActivityType:
+        index[activity.value] = ('atividade', activity.value)
+    
+    for flag in ArchaeologyFlag:
+        index[flag.value] = ('arqueologia', flag.value)
+    
+    return index
+
+
+class KeywordNormalizer:
+    """
+    Substitui o Pass 2 por regras determinísticas
+    
+    Entrada: o dict do Pass 1 (o mesmo que vai para `_build_metadata`)
+    Saída: dict no formato do Pass 2 (title, description_short,
+    description_long, keywords_normalized)
+    """
+    
+    def __init__(self, max_keywords: int = None):
+        self.max_keywords = max_keywords or Config.MAX_KEYWORDS
+        self._index = _build_index()
+    
+    def normalize(self, raw_data: Dict) -> Dict:
+        return {
+            'title': self.title(raw_data),
+            'description_short': self.description_short(raw_data),
+            'description_long': self.description_long(raw_data),
+            'keywords_normalized': self.keywords(raw_data),
+        }
+    
+    # ------------------------------------------------------------------------
+    # Keywords
+    # ------------------------------------------------------------------------
+    
+    def keyword(self, term: str) -> Optional[str]:
+        """Um termo bruto -> 'categoria:valor' (None se vazio)"""
+        if ':' in str(term):
+            category, value = str(term).split(':', 1)
+            category = fold(category)
+            category = CATEGORY_ALIASES.get(category, category)
+            value = fold(value)
+            
+            if not value:
+                return None
+            if category not in CATEGORIES:
+                # Categoria desconhecida: tenta o dicionário pelo valor
+                category = self._index.get(value, (DEFAULT_CATEGORY, value))[0]
+            return f"{category}:{value}"
+        
+        value = fold(term)
+        if not value:
+            return None
+        
+        category, value = self._index.get(value, (DEFAULT_CATEGORY, value))
+        return f"{category}:{value}"
+    
+    def keywords(self, raw_data: Dict) -> List[str]:
+        """
+        Keywords normalizadas, ordenadas por relevância
+        
+        Campos estruturados (habitat, espécies, atividades, arqueologia,
+        qualidade técnica) vêm primeiro; depois keywords_raw na ordem do modelo.
+        """
+        candidates = []
+        
+        habitat = fold(raw_data.get('habitat_guess', ''))
+        if habitat:
+            candidates.append(f"bioma:{habitat}")
+        
+        for sp in raw_data.get('species_candidates', []) or []:
+            if not isinstance(sp, dict):
+                continue
+            if float(sp.get('confidence', 0.0) or 0.0) < Config.MIN_SPECIES_CONFIDENCE:
+                continue
+            for name in (sp.get('name_scientific', ''), sp.get('name_pt', '')):
+                if fold(name):
+                    candidates.append(f"fauna:{fold(name)}")
+        
+        for activity in raw_data.get('activities', []) or []:
+            candidates.append(f"atividade:{fold(activity)}")
+        
+        for flag in raw_data.get('archaeology_flags', []) or []:
+            candidates.append(f"arqueologia:{fold(flag)}")
+        
+        quality = fold(raw_data.get('technical_quality', ''))
+        if quality and '|' not in str(raw_data.get('technical_quality', '')):
+            candidates.append(f"tecnica:{quality}")
+        
+        for term in raw_data.get('keywords_raw', []) or []:
+            # "cores: azul_claro, verde_escuro" -> um termo por valor
+            if ':' in str(term):
+                category, values = str(term).split(':', 1)
+                candidates.extend(f"{category}:{v}" for v in values.split(','))
+            else:
+                candidates.extend(str(term).split(','))
+        
+        result, seen = [], set()
+        for term in candidates:
+            keyword = self.keyword(term)
+            if keyword and not keyword.endswith(':') and keyword not in seen:
+                seen.add(keyword)
+                result.append(keyword)
+        
+        return result[:self.max_keywords]
+    
+    # ------------------------------------------------------------------------
+    # Textos
+    # ------------------------------------------------------------------------
+    
+    def title(self, raw_data: Dict) -> str:
+        """Habitat + espécie principal (ex.: 'Manguezal com Caranguejo-uçá')"""
+        habitat = fold(raw_data.get('habitat_guess', ''))
+        try:
+            label = HABITAT_LABELS[Habitat(habitat)]
+        except ValueError:
+            label = habitat.replace('_', ' ').capitalize() if habitat else "Paisagem costeira"
+        
+        species = self._top_species(raw_data)
+        if species:
+            return f"{label} com {species}"
+        return label
+    
+    def description_short(self, raw_data: Dict) -> str:
+        """Primeira frase do scene_summary"""
+        summary = str(raw_data.get('scene_summary', '')).strip()
+        match = re.match(r'(.+?[.!?])(\s|$)', summary)
+        return match.group(1) if match else summary
+    
+    def description_long(self, raw_data: Dict) -> str:
+        """scene_summary + evidência do habitat"""
+        summary = str(raw_data.get('scene_summary', '')).strip()
+        if summary and summary[-1] not in '.!?':
+            summary += '.'
+        parts = [summary]
+        
+        evidence = str(raw_data.get('habitat_evidence', '')).strip()
+        if evidence:
+            parts.append(f"Evidências do habitat: {evidence.rstrip('.')}.")
+        
+        return ' '.join(p for p in parts if p)
+    
+    @staticmethod
+    def _top_species(raw_data: Dict) -> str:
+        best = None
+        for sp in raw_data.get('species_candidates', []) or []:
+            if not isinstance(sp, dict) or not sp.get('name_pt'):
+                continue
+            confidence = float(sp.get('confidence', 0.0) or 0.0)
+            if confidence >= Config.MIN_SPECIES_CONFIDENCE and (best is None or confidence > best[0]):
+                best = (confidence, str(sp['name_pt']).strip())
+        
+        return best[1][:1].upper() + best[1][1:] if best else ""
@@ -3,17 +3,32 @@ PROJETO A - Lightroom Tagger
 Tagueia arquivos RAW via XMP sidecars
 """
 
-import subprocess
+import itertools
 import json
 import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Set, Tuple
 from datetime import datetime
 import sys
 
 sys.path.append(str(Path(__file__).parent.parent))
 from config.acquaplan_config import Config, AcquaplanMetadata
 from src.vision_pipeline import VisionPipeline
+from src.batch_engine import BatchEngine
+from src.raw_preview import RawPreviewExtractor
+from src.exiftool_pool import shared_pool
+from src.xmp_writer import XmpUpdate, write_sidecar
+from src.background_writer import BackgroundWriter, WriteOutcome
+from src.folder_scanner import FolderScanner
+from src.near_duplicates import (
+    PIL_AVAILABLE,
+    cluster_near_duplicates,
+    hash_images,
+    propagate_metadata
+)
+from src.quality_prescreen import QualityReport
 
 
 class LightroomTagger:
@@ -25,13 +40,41 @@ class LightroomTagger:
         self,
         catalog_path: Optional[Path] = None,
         manifest_path: Optional[Path] = None,
-        dry_run: bool = False
+        dry_run: bool = False,
+        concurrency: int = None,
+        use_cache: bool = None,
+        deduplicate: bool = None,
+        mode: str = None,
+        normalizer: str = None,
+        pass2_batch: int = None,
+        vocabulary: str = None,
+        cascade: bool = None,
+        text_model: str = None,
+        prescreen: bool = None,
+        hopeless_policy: str = None,
+        metrics_path: Optional[Path] = None,
+        prometheus_path: Optional[Path] = None,
+        staging: bool = None
     ):
         self.catalog_path = catalog_path
         self.manifest_path = manifest_path or Path.home() / Config.MANIFEST_FILENAME
+        self.metrics_path = metrics_path or self.manifest_path.parent / Config.METRICS_FILENAME
+        self.prometheus_path = prometheus_path or Config.PROMETHEUS_TEXTFILE
         self.dry_run = dry_run
-        self.pipeline = VisionPipeline()
+        self.concurrency = concurrency or Config.MAX_CONCURRENT_REQUESTS
+        self.pass2_batch = pass2_batch or Config.PASS2_BATCH_SIZE
+        self.deduplicate = Config.REUSE_NEAR_DUPLICATES if deduplicate is None else deduplicate
+        self.pipeline = VisionPipeline(
+            cache=use_cache, mode=mode, normalizer=normalizer,
+            vocabulary=vocabulary, cascade=cascade, text_model=text_model,
+            prescreen=prescreen, hopeless_policy=hopeless_policy,
+            staging=staging
+        )
+        self.exiftool = shared_pool()
+        self.preview_extractor = RawPreviewExtractor(exiftool=self.exiftool)
+        # Escrito pela thread de gravação (_sink), lido pela varredura
         self.processed_cache = self._load_cache()
+        self._cache_lock = threading.Lock()
     
     def _load_cache(self) -> set:
         """Carrega cache de arquivos já processados"""
@@ -47,10 +90,12 @@ class LightroomTagger:
     def _save_cache(self):
         """Salva cache de arquivos processados"""
         cache_path = self.manifest_path.parent / Config.PROCESSED_CACHE
+        with self._cache_lock:
+            processed = list(self.processed_cache)
         
         with open(cache_path, 'w') as f:
             json.dump({
-                'processed_files': list(self.processed_cache),
+                'processed_files': processed,
                 'last_updated': datetime.now().isoformat()
             }, f, indent=2)
     
@@ -58,102 +103,397 @@ class LightroomTagger:
         self,
         folder_path: Path,
         extensions: List[str] = None,
-        skip_processed: bool = True
+        skip_processed: bool = True,
+        individual: Optional[List[str]] = None,
+        resume: bool = False,
+        recursive: bool = None,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None
     ) -> List[AcquaplanMetadata]:
         """
-        Processa todos os RAWs de uma pasta
+        Processa todos os RAWs de uma pasta (e subpastas)
+        
+        A varredura é feita em streaming: o modelo começa na primeira pasta
+        enquanto as subpastas seguintes são listadas.
         
         Args:
             folder_path: Pasta contendo RAWs
-            extensions: Extensões para processar (padrão: CR3, CR2, NEF, ARW)
+            extensions: Extensões para processar (padrão: Config.RAW_EXTENSIONS)
             skip_processed: Pular arquivos já processados
+            individual: Nomes/paths que nunca reaproveitam resultado de quase-duplicata
+            resume: Só as imagens pela metade no staging (rodam apenas os passes que faltam)
+            recursive: Entrar nas subpastas (padrão: Config.SCAN_RECURSIVE)
+            include: Padrões de nome/caminho relativo a processar (fnmatch)
+            exclude: Padrões a ignorar, somados a Config.SCAN_EXCLUDE
         
         Returns:
             Lista de metadados processados
         """
         if extensions is None:
-            extensions = ['.CR3', '.CR2', '.NEF', '.ARW', '.DNG', '.RAF']
+            extensions = Config.RAW_EXTENSIONS
         
         folder_path = Path(folder_path)
-        
-        # Buscar arquivos
-        photo_files = []
-        for ext in extensions:
-            photo_files.extend(folder_path.glob(f"*{ext}"))
-            photo_files.extend(folder_path.glob(f"*{ext.lower()}"))
-        
-        if not photo_files:
-            print(f"⚠️  Nenhum arquivo RAW encontrado em {folder_path}")
+        scanner = FolderScanner(
+            extensions,
+            recursive=recursive,
+            include=include,
+            exclude=Config.SCAN_EXCLUDE + list(exclude or [])
+        )
+        
+        pending = None
+        if resume:
+            if self.pipeline.staging is None:
+                print("⚠️  --resume sem staging: nada a retomar")
+                return []
+            pending = {p['file_id'] for p in self.pipeline.staging.pending('lightroom')}
+            if not pending:
+                print("✅ Nenhuma imagem pela metade")
+                return []
+        
+        print(f"📁 Varrendo {folder_path}{' e subpastas' if scanner.recursive else ''}")
+        
+        previews: Dict[Path, Path] = {}
+        members_of: Dict[Path, List[Path]] = {}
+        reports: Dict[Path, QualityReport] = {}
+        fingerprints: Dict[Path, str] = {}
+        progress = {'queued': 0, 'work_items': 0, 'skipped': 0}
+        
+        work_items = self._stream_work_items(
+            scanner.scan(folder_path), pending, skip_processed,
+            set(individual or []), previews, members_of, reports, fingerprints, progress
+        )
+        
+        # Primeiro item antes de aquecer o modelo: pasta vazia não chama o Ollama
+        first = next(work_items, None)
+        if first is None:
+            if not scanner.matched:
+                print(f"⚠️  Nenhum arquivo RAW encontrado em {folder_path}")
+            elif resume:
+                print("✅ Nenhuma imagem pela metade nesta pasta")
+            else:
+                print("✅ Todos os arquivos já foram processados!")
             return []
         
-        print(f"📁 Encontrados {len(photo_files)} arquivos RAW")
-        
-        # Filtrar já processados
-        if skip_processed:
-            to_process = [
-                f for f in photo_files
-                if str(f) not in self.processed_cache
-            ]
-            
-            if len(to_process) < len(photo_files):
-                skipped = len(photo_files) - len(to_process)
-                print(f"⏭️  Pulando {skipped} arquivos já processados")
+        if resume:
+            print("🧩 Retomando imagens pela metade")
+        if scanner.done:
+            print(f"🚀 Processando {progress['queued']} arquivos...\n")
         else:
-            to_process = photo_files
-        
-        if not to_process:
-            print("✅ Todos os arquivos já foram processados!")
-            return []
-        
-        print(f"🚀 Processando {len(to_process)} arquivos...\n")
-        
-        # Processar
+            print(f"🚀 Processando enquanto a varredura continua...\n")
+        
+        # Processar (load → Pass 1 → Pass 2 em pipeline; sink na thread de gravação)
+        engine = BatchEngine(
+            self.pipeline,
+            concurrency=self.concurrency,
+            pass2_batch_size=self.pass2_batch,
+            source="lightroom",
+            load=lambda photo: self._model_input(photo, previews),
+            fingerprint=lambda photo: fingerprints[photo],
+            # Pré-triagem já medida no agrupamento de quase-duplicatas
+            quality=lambda photo: reports.pop(photo, None)
+        )
         results = []
-        for idx, photo_path in enumerate(to_process, 1):
-            print(f"[{idx}/{len(to_process)}] {photo_path.name}")
-            
-            try:
-                metadata = self.pipeline.process_image(
-                    str(photo_path),
-                    file_id=str(photo_path),
-                    source="lightroom"
-                )
+        writer = BackgroundWriter()
+        try:
+            for idx, result in enumerate(engine.run(itertools.chain([first], work_items)), 1):
+                photo_path = result.item
+                total = f"{progress['work_items']}{'' if scanner.done else '+'}"
+                print(f"[{idx}/{total}] {photo_path.name}")
+                members = members_of.pop(photo_path, [])
+                propagated = 0
                 
-                # Gravar XMP sidecar
-                if not self.dry_run:
-                    self._write_xmp_sidecar(photo_path, metadata)
-                    self._append_to_manifest(photo_path, metadata)
-                    self.processed_cache.add(str(photo_path))
-                else:
-                    print(f"  🔍 [DRY RUN] Não gravando arquivos")
+                try:
+                    if not result.ok:
+                        raise result.error
+                    
+                    metadata = result.metadata
+                    if metadata.status == 'partial':
+                        print(f"  🩹 Parcial: faltam {', '.join(metadata.missing_fields)}")
+                    elif metadata.status == 'skipped':
+                        print(f"  ⏭️  Pré-triagem: {metadata.technical_quality} "
+                              f"({metadata.skip_reason}), sem chamada ao modelo")
+                    
+                    # Gravar XMP sidecar (em segundo plano; bloqueia só com a fila cheia)
+                    if not self.dry_run:
+                        writer.submit(photo_path.name, self._sink, photo_path, metadata,
+                                      staging=result.staging, payload=metadata)
+                    else:
+                        print(f"  🔍 [DRY RUN] Não gravando arquivos")
+                        results.append(metadata)
+                    
+                    for member in members:
+                        report = reports.pop(member, None)
+                        member_metadata = propagate_metadata(
+                            metadata, str(member), member.name, report.quality if report else ''
+                        )
+                        if not self.dry_run:
+                            writer.submit(member.name, self._sink, member, member_metadata,
+                                          payload=member_metadata)
+                        else:
+                            results.append(member_metadata)
+                        propagated += 1
+                        print(f"  🔗 {member.name} (quase-duplicata)")
+                    
+                    print(f"  ✅ Concluído\n")
                 
-                results.append(metadata)
-                print(f"  ✅ Concluído\n")
+                except Exception as e:
+                    print(f"  ❌ Erro: {e}")
+                    # Sem resultado do representante os membros também falham
+                    # (ficam fora do cache e são refeitos na próxima execução)
+                    for member in members[propagated:]:
+                        reports.pop(member, None)
+                        print(f"  ❌ {member.name} (quase-duplicata): sem o resultado do representante")
+                    print()
                 
-            except Exception as e:
-                print(f"  ❌ Erro: {e}\n")
-                continue
-        
-        # Salvar cache
-        if not self.dry_run:
-            self._save_cache()
+                self._collect_writes(writer.completed(), results)
+        finally:
+            # Interrompido ou não: o que já está na fila é gravado antes do cache
+            self._collect_writes(writer.close(), results)
+            if not self.dry_run:
+                self._save_cache()
         
         print("\n" + "="*80)
-        print(f"✅ Processamento concluído: {len(results)}/{len(to_process)} arquivos")
+        print(f"✅ Processamento concluído: {len(results)}/{progress['queued']} arquivos")
+        scanner.print_summary()
+        if progress['skipped']:
+            print(f"⏭️  {progress['skipped']} arquivos já processados pulados")
         print(f"📄 Manifest: {self.manifest_path}")
         
+        if self.pipeline.cache is not None:
+            cache = self.pipeline.cache
+            print(f"💾 Cache de inferência: {cache.hits} passes reaproveitados, {cache.misses} executados")
+        
+        writer.print_summary()
+        if self.pipeline.retries:
+            print(f"🔁 Retentativas de passe: {self.pipeline.retries}")
+        if self.pipeline.staging is not None:
+            self.pipeline.staging.print_summary('lightroom')
+        
+        self.pipeline.json_timings.print_summary()
+        self.pipeline.cascade_stats.print_summary()
+        self.pipeline.prescreen_stats.print_summary()
+        self.pipeline.metrics.print_summary()
+        self._export_metrics()
+        
         if not self.dry_run:
             print(f"\n💡 Próximo passo no Lightroom:")
             print(f"   Library → Metadata → Read Metadata from Files")
         
         return results
     
-    def _write_xmp_sidecar(self, photo_path: Path, metadata: AcquaplanMetadata):
+    def _export_metrics(self):
+        """Histogramas do run em JSON (e no textfile do Prometheus, se configurado)"""
+        self.pipeline.metrics.export(
+            self.metrics_path,
+            self.prometheus_path,
+            project='lightroom',
+            model=self.pipeline.model,
+            mode=self.pipeline.mode
+        )
+    
+    def _stream_work_items(
+        self,
+        scanned: Iterator,
+        pending: Optional[Set[str]],
+        skip_processed: bool,
+        individual: Set[str],
+        previews: Dict[Path, Path],
+        members_of: Dict[Path, List[Path]],
+        reports: Dict[Path, QualityReport],
+        fingerprints: Dict[Path, str],
+        progress: Dict[str, int]
+    ) -> Iterator[Path]:
+        """
+        Itens para o BatchEngine, pasta a pasta conforme a varredura avança
+        
+        Por pasta: filtro de --resume e de já processados (aqui), previews dos
+        RAWs e agrupamento de quase-duplicatas (_prepare_folder, numa thread
+        própria, uma pasta à frente: o BatchEngine não para de receber itens
+        enquanto o exiftool extrai a pasta seguinte). A pasta é a unidade
+        porque grupos de quase-duplicatas não cruzam pastas nem se partem ao
+        meio, e os previews saem numa chamada do exiftool por pasta. Os dicts
+        recebidos são preenchidos aqui e lidos pelo load e pelo sink.
+        """
+        # A varredura entrega os arquivos de cada pasta em sequência
+        folders = itertools.groupby(scanned, key=lambda f: f.path.parent)
+        
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="acquaplan-prepare") as executor:
+            ahead: Optional[Future] = None
+            while True:
+                files = self._next_folder(folders, pending, skip_processed, progress)
+                if files:
+                    fingerprints.update((f.path, f.fingerprint) for f in files)
+                    progress['queued'] += len(files)
+                
+                job = executor.submit(self._prepare_folder, [f.path for f in files], individual) if files else None
+                
+                if ahead is not None:
+                    items, folder_previews, groups, folder_reports = ahead.result()
+                    previews.update(folder_previews)
+                    members_of.update(groups)
+                    reports.update(folder_reports)
+                    progress['work_items'] += len(items)
+                    yield from items
+                
+                if job is None:
+                    return
+                ahead = job
+    
+    def _next_folder(
+        self,
+        folders: Iterator,
+        pending: Optional[Set[str]],
+        skip_processed: bool,
+        progress: Dict[str, int]
+    ) -> list:
+        """Arquivos da próxima pasta da varredura com algo a processar ([] no fim)"""
+        for _, group in folders:
+            files = list(group)
+            if pending is not None:
+                files = [f for f in files if str(f.path) in pending]
+            if skip_processed:
+                with self._cache_lock:
+                    fresh = [f for f in files if str(f.path) not in self.processed_cache]
+                progress['skipped'] += len(files) - len(fresh)
+                files = fresh
+            if files:
+                return files
+        return []
+    
+    def _prepare_folder(self, photos: List[Path], individual: Set[str]):
+        """
+        Previews e quase-duplicatas de uma pasta (roda na thread de preparo)
+        
+        Returns:
+            (itens para o modelo, previews, representante -> membros,
+            pré-triagem já medida de cada frame)
+        """
+        # RAWs: o modelo recebe o preview embutido (um exiftool por pasta)
+        previews, groups, reports = {}, {}, {}
+        raw_files = [f for f in photos if self._is_raw(f)]
+        if raw_files:
+            with self.pipeline.metrics.timed('raw_preview'):
+                previews = self.preview_extractor.extract(raw_files)
+        
+        # Quase-duplicatas: modelo uma vez por grupo, resultado copiado aos membros
+        items = photos
+        if self.deduplicate and PIL_AVAILABLE and len(photos) > 1:
+            items, groups = self._group_near_duplicates(photos, previews, individual, reports)
+        
+        return items, previews, groups, reports
+    
+    def _sink(self, photo_path: Path, metadata: AcquaplanMetadata, staging: Optional[Dict] = None):
         """
-        Grava XMP sidecar usando ExifTool
+        Grava XMP, manifest e marca como processado
         
-        Cria arquivo .xmp ao lado do RAW com todos os metadados
+        Roda na thread do BackgroundWriter (único escritor do manifest e do
+        cache de processados); sem prints, os erros voltam pelo WriteOutcome.
         """
+        self._write_xmp_sidecar(photo_path, metadata)
+        self._append_to_manifest(photo_path, metadata)
+        # Parcial/pré-triagem: fica fora do cache para ser refeito na próxima execução
+        if metadata.status == 'complete':
+            with self._cache_lock:
+                self.processed_cache.add(str(photo_path))
+        # Gravado: as saídas intermediárias saem do staging
+        self.pipeline.complete_staged(staging)
+    
+    @staticmethod
+    def _collect_writes(outcomes: List[WriteOutcome], results: List[AcquaplanMetadata]):
+        """Gravações terminadas: sucesso entra no resultado, erro é reportado por arquivo"""
+        for outcome in outcomes:
+            if outcome.ok:
+                results.append(outcome.payload)
+            else:
+                print(f"  ❌ Erro ao gravar {outcome.label}: {outcome.error}\n")
+    
+    def _group_near_duplicates(
+        self,
+        photos: List[Path],
+        previews: Dict[Path, Path],
+        individual: Set[str],
+        reports: Dict[Path, QualityReport]
+    ) -> Tuple[List[Path], Dict[Path, List[Path]]]:
+        """
+        Agrupa frames quase idênticos pelo dHash da imagem que vai ao modelo
+        
+        Com pré-triagem, cada frame é medido aqui e o relatório vai para
+        `reports`: os sem salvação ficam fora dos grupos (nunca viram
+        representante), os membros levam a própria qualidade técnica e os
+        demais frames não são medidos de novo no BatchEngine.
+        
+        Returns:
+            (itens para o modelo, representante -> membros que herdam o resultado)
+        """
+        prescreen = self.pipeline.prescreen
+        candidates = {}
+        for photo in photos:
+            if photo.name in individual or str(photo) in individual:
+                continue
+            try:
+                model_input = self._model_input(photo, previews)
+                if prescreen is not None:
+                    with self.pipeline.metrics.timed('prescreen'):
+                        reports[photo] = prescreen.assess(model_input)
+                    if reports[photo].hopeless:
+                        continue
+            except Exception:
+                continue
+            candidates[photo] = model_input
+        
+        hashes = {
+            photo: value
+            for photo, value in hash_images(candidates).items()
+            if value is not None
+        }
+        clusters = cluster_near_duplicates(hashes)
+        
+        members_of = {c.representative: c.members for c in clusters if c.members}
+        grouped = {member for members in members_of.values() for member in members}
+        
+        # Membros não passam pelo BatchEngine: a pré-triagem deles conta aqui
+        for member in grouped:
+            if member in reports:
+                self.pipeline.prescreen_stats.record(str(member.parent), reports[member], None)
+        
+        if grouped:
+            print(
+                f"🔗 Quase-duplicatas: {len(grouped)} frames reaproveitam "
+                f"o resultado de {len(members_of)} representantes"
+            )
+        
+        return [p for p in photos if p not in grouped], members_of
+    
+    @staticmethod
+    def _is_raw(photo_path: Path) -> bool:
+        return photo_path.suffix.upper() in Config.RAW_EXTENSIONS
+    
+    def _model_input(self, photo_path: Path, previews: Dict[Path, Path]) -> str:
+        """Estágio load: RAW vira o preview embutido; demais formatos seguem direto"""
+        if not self._is_raw(photo_path):
+            return str(photo_path)
+        
+        preview = previews.get(photo_path)
+        if preview is None:
+            raise RuntimeError("RAW sem preview embutido (PreviewImage/JpgFromRaw)")
+        
+        return str(preview)
+    
+    def _write_xmp_sidecar(self, photo_path: Path, metadata: AcquaplanMetadata) -> Path:
+        """
+        Grava os metadados em XMP
+        
+        RAWs proprietários (Config.XMP_SIDECAR_EXTENSIONS): sidecar .xmp ao
+        lado do RAW, gravado em Python e mesclado com o que o Lightroom já
+        tiver lá. Demais formatos (DNG, JPEG, TIFF): gravação no próprio
+        arquivo por um exiftool já aberto do pool.
+        
+        Returns:
+            Arquivo gravado (sidecar ou a própria foto)
+        """
+        if metadata.status == 'skipped':
+            return self._write_technical_quality(photo_path, metadata)
+        
         # Construir descrição completa para XMP
         description_parts = [metadata.description_long, ""]
         
@@ -181,8 +521,26 @@ class LightroomTagger:
         
         description_full = "\n".join(description_parts)
         
-        # Construir comando ExifTool
-        cmd = ['exiftool'] + Config.EXIFTOOL_COMMON_ARGS + [
+        if photo_path.suffix.upper() in Config.XMP_SIDECAR_EXTENSIONS:
+            with self.pipeline.metrics.timed('xmp_write'):
+                # Legenda padrão (dc:description, a Caption-Abstract do IPTC, que o
+                # Lightroom mostra): a descrição curta; a completa vai junto em campo próprio
+                xmp_path = write_sidecar(photo_path, XmpUpdate(
+                    title=metadata.title,
+                    description=metadata.description_short,
+                    headline=metadata.title,
+                    keywords=metadata.keywords,
+                    custom={
+                        'DescriptionLong': description_full,
+                        'Habitat': metadata.habitat_guess,
+                        'HabitatConfidence': metadata.habitat_confidence,
+                        'ProcessingTimestamp': metadata.processing_timestamp,
+                    }
+                ))
+            return xmp_path
+        
+        # Construir comando ExifTool (gravação no próprio arquivo)
+        cmd = Config.EXIFTOOL_COMMON_ARGS + [
             f'-XMP-dc:Title={metadata.title}',
             f'-XMP-dc:Description={description_full}',
             f'-IPTC:Caption-Abstract={metadata.description_short}',
@@ -204,35 +562,57 @@ class LightroomTagger:
         # Arquivo alvo
         cmd.append(str(photo_path))
         
-        try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            # Verificar se XMP foi criado
-            xmp_path = photo_path.with_suffix(photo_path.suffix + '.xmp')
-            if xmp_path.exists():
-                print(f"  📝 XMP sidecar criado: {xmp_path.name}")
-            else:
-                print(f"  ⚠️  XMP não encontrado (metadados podem estar no RAW)")
-            
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Erro ao gravar XMP: {e.stderr}")
+        with self.pipeline.metrics.timed('exiftool'):
+            result = self.exiftool.execute(cmd)
+        
+        if not result.ok:
+            raise RuntimeError(f"Erro ao gravar XMP: {'; '.join(result.errors)}")
+        
+        return photo_path
+    
+    def _write_technical_quality(self, photo_path: Path, metadata: AcquaplanMetadata) -> Path:
+        """
+        Frame descartado na pré-triagem: só a keyword tecnica:* e a qualidade
+        
+        Título, descrição e headline já existentes ficam como estão.
+        """
+        custom = {
+            'TechnicalQuality': metadata.technical_quality,
+            'SkipReason': metadata.skip_reason,
+        }
+        
+        if photo_path.suffix.upper() in Config.XMP_SIDECAR_EXTENSIONS:
+            with self.pipeline.metrics.timed('xmp_write'):
+                return write_sidecar(photo_path, XmpUpdate(keywords=metadata.keywords, custom=custom))
+        
+        cmd = list(Config.EXIFTOOL_COMMON_ARGS)
+        for kw in metadata.keywords:
+            cmd.append(f'-XMP-dc:Subject+={kw}')
+            cmd.append(f'-IPTC:Keywords+={kw}')
+        cmd.extend(f'-XMP-acquaplan:{name}={value}' for name, value in custom.items())
+        cmd.append(str(photo_path))
+        
+        with self.pipeline.metrics.timed('exiftool'):
+            result = self.exiftool.execute(cmd)
+        
+        if not result.ok:
+            raise RuntimeError(f"Erro ao gravar XMP: {'; '.join(result.errors)}")
+        
+        return photo_path
     
     def _append_to_manifest(self, photo_path: Path, metadata: AcquaplanMetadata):
         """Adiciona entrada ao manifest JSONL"""
         entry = {
             'file_path': str(photo_path),
             'metadata': metadata.to_dict(),
+            'telemetry': metadata.telemetry,
             'project': 'lightroom',
             'timestamp': datetime.now().isoformat()
         }
         
-        with open(self.manifest_path, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        with self.pipeline.metrics.timed('manifest_append'):
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
     
     def read_lightroom_catalog(self, collection_name: str = None) -> List[Path]:
         """
@@ -279,7 +659,7 @@ class LightroomTagger:
             
             paths = [Path(row[0]) for row in cursor.fetchall()]
             return paths
-            
+        
         finally:
             conn.close()
 
@@ -318,8 +698,117 @@ def main():
     parser.add_argument(
         '--extensions',
         nargs='+',
-        default=['.CR3', '.CR2', '.NEF', '.ARW'],
-        help='Extensões de arquivo para processar'
+        default=Config.RAW_EXTENSIONS,
+        help=f"Extensões de arquivo para processar (padrão: {' '.join(Config.RAW_EXTENSIONS)})"
+    )
+    parser.add_argument(
+        '--no-recursive',
+        action='store_true',
+        help='Só a pasta indicada, sem entrar nas subpastas'
+    )
+    parser.add_argument(
+        '--include',
+        nargs='+',
+        default=None,
+        help='Só arquivos que batem com estes padrões (ex.: "IMG_*" "Dia1/*")'
+    )
+    parser.add_argument(
+        '--exclude',
+        nargs='+',
+        default=[],
+        help='Arquivos ou subpastas a ignorar (ex.: "Rejeitadas" "*_edit*")'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=Config.MAX_CONCURRENT_REQUESTS,
+        help='Requisições simultâneas ao Ollama'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Ignora o cache de inferência (sempre chama o modelo)'
+    )
+    parser.add_argument(
+        '--mode',
+        choices=Config.PROCESSING_MODES,
+        default=Config.PROCESSING_MODE,
+        help='two_pass (Pass 1 + Pass 2) ou single_pass (uma chamada por imagem)'
+    )
+    parser.add_argument(
+        '--normalizer',
+        choices=Config.NORMALIZER_PROFILES,
+        default=Config.NORMALIZER_PROFILE,
+        help='Pass 2: llm, hybrid (modelo só nas descrições) ou fast (sem modelo)'
+    )
+    parser.add_argument(
+        '--vocabulary',
+        choices=Config.OUTPUT_VOCABULARIES,
+        default=Config.OUTPUT_VOCABULARY,
+        help='Saída do modelo: full (por extenso) ou compact (códigos expandidos localmente)'
+    )
+    parser.add_argument(
+        '--cascade',
+        action='store_true',
+        default=None,
+        help=f'Pass 1 em {Config.FAST_VISION_MODEL}; escalona para {Config.VISION_MODEL} se incerto'
+    )
+    parser.add_argument(
+        '--text-model',
+        default=Config.TEXT_MODEL,
+        help='Modelo só de texto para o Pass 2 (ex.: llama3.2:3b; padrão: o modelo de visão)'
+    )
+    parser.add_argument(
+        '--no-prescreen',
+        action='store_true',
+        help='Desativa a pré-triagem local de qualidade técnica'
+    )
+    parser.add_argument(
+        '--hopeless',
+        choices=Config.PRESCREEN_POLICIES,
+        default=Config.PRESCREEN_HOPELESS_POLICY,
+        help='Frames sem salvação (preto, branco, tremido): skip, defer (fim do batch) ou process'
+    )
+    parser.add_argument(
+        '--pass2-batch',
+        type=int,
+        default=Config.PASS2_BATCH_SIZE,
+        help='Imagens por chamada do Pass 2 (1 = uma chamada por imagem)'
+    )
+    parser.add_argument(
+        '--no-dedup',
+        action='store_true',
+        help='Processa cada frame individualmente (sem agrupar quase-duplicatas)'
+    )
+    parser.add_argument(
+        '--individual',
+        nargs='+',
+        default=[],
+        help='Arquivos que sempre passam pelo modelo, mesmo se quase-duplicatas'
+    )
+    
+    parser.add_argument(
+        '--metrics-json',
+        type=Path,
+        default=None,
+        help=f'Durações por estágio em JSON (padrão: {Config.METRICS_FILENAME} ao lado do manifest)'
+    )
+    parser.add_argument(
+        '--prometheus-textfile',
+        type=Path,
+        default=Config.PROMETHEUS_TEXTFILE,
+        help='Arquivo .prom para o textfile collector do node exporter'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Só termina as imagens pela metade (passes já feitos vêm do staging)'
+    )
+    parser.add_argument(
+        '--no-staging',
+        action='store_true',
+        help='Não grava a saída de cada passe (falha no Pass 2 refaz o Pass 1)'
     )
     
     args = parser.parse_args()
@@ -330,17 +819,37 @@ def main():
     print(f"📁 Pasta: {args.folder}")
     print(f"📄 Manifest: {args.manifest}")
     print(f"🔧 Modo: {'DRY RUN' if args.dry_run else 'PRODUÇÃO'}")
+    print(f"⚡ Concorrência: {args.concurrency}")
     print("="*80 + "\n")
     
     tagger = LightroomTagger(
         manifest_path=args.manifest,
-        dry_run=args.dry_run
+        dry_run=args.dry_run,
+        concurrency=args.concurrency,
+        use_cache=False if args.no_cache else None,
+        deduplicate=False if args.no_dedup else None,
+        mode=args.mode,
+        normalizer=args.normalizer,
+        pass2_batch=args.pass2_batch,
+        vocabulary=args.vocabulary,
+        cascade=args.cascade,
+        text_model=args.text_model,
+        prescreen=False if args.no_prescreen else None,
+        hopeless_policy=args.hopeless,
+        metrics_path=args.metrics_json,
+        prometheus_path=args.prometheus_textfile,
+        staging=False if args.no_staging else None
     )
     
     results = tagger.process_folder(
         args.folder,
         extensions=args.extensions,
-        skip_processed=not args.reprocess
+        skip_processed=not args.reprocess,
+        individual=args.individual,
+        resume=args.resume,
+        recursive=False if args.no_recursive else None,
+        include=args.include,
+        exclude=args.exclude
     )
     
     print(f"\n🎉 Concluído! {len(results)} arquivos processados.")
@@ -13,6 +13,7 @@ import sys
 
 sys.path.append(str(Path(__file__).parent.parent))
 from config.acquaplan_config import Config
+from src.model_telemetry import aggregate
 
 
 class ManifestTools:
@@ -120,6 +121,52 @@ class ManifestTools:
         
         print("\n" + "="*80)
     
+    def telemetry(self, by: str = 'model') -> Dict[tuple, Dict]:
+        """
+        Tokens e tempos das chamadas ao modelo, agregados
+        
+        Args:
+            by: model, day ou model_day
+        
+        Returns:
+            Grupo -> calls, tokens, tokens/s de prompt e geração, fração do
+            tempo em prompt vs. geração e carga do modelo
+        """
+        return aggregate(self.entries, by)
+    
+    def print_telemetry(self, by: str = 'model'):
+        """Imprime a telemetria agregada"""
+        groups = self.telemetry(by)
+        
+        print("="*80)
+        print("TELEMETRIA DO MODELO")
+        print("="*80)
+        
+        if not groups:
+            print("\n⚠️  Nenhuma entrada com telemetria (manifest anterior à coleta?)")
+            return
+        
+        def rate(value):
+            return f"{value:.1f}/s" if value is not None else "n/d"
+        
+        def share(value):
+            return f"{value:.0%}" if value is not None else "n/d"
+        
+        for key, g in groups.items():
+            print(f"\n🤖 {' | '.join(key)}")
+            estimated = f" ({g['estimated_calls']:g} estimadas)" if g['estimated_calls'] else ""
+            print(f"   Chamadas: {g['calls']:g}{estimated} | tempo total: {g['total_seconds']:.1f}s")
+            prompt_tokens = g['prompt_tokens'] if g['prompt_tokens'] is not None else "n/d"
+            print(f"   Tokens: prompt {prompt_tokens} ({rate(g['prompt_tokens_per_s'])}) | "
+                  f"geração {g['eval_tokens']} ({rate(g['eval_tokens_per_s'])})")
+            print(f"   Tempo de cálculo: prompt {share(g['prompt_share'])} | geração {share(g['eval_share'])}")
+            if g['load_seconds'] is not None:
+                print(f"   Carga do modelo: {g['load_seconds']:.1f}s ({share(g['load_share'])} do total)")
+        
+        print("\n💡 Chamadas estimadas: stream encerrado antes do pedaço final (sem os totais do Ollama);")
+        print("   o tempo de prompt inclui a carga do modelo e os tokens do prompt ficam de fora.")
+        print("\n" + "="*80)
+    
     def to_csv_exiftool(self, output_path: Path, project: str = None):
         """
         Exporta para CSV compatível com ExifTool em batch
@@ -293,6 +340,16 @@ def main():
     # Stats
     subparsers.add_parser('stats', help='Mostrar estatísticas')
     
+    # Telemetria do modelo
+    telemetry_cmd = subparsers.add_parser('telemetry', help='Tokens/s e tempo de prompt vs. geração')
+    telemetry_cmd.add_argument(
+        '--by',
+        choices=['model', 'day', 'model_day'],
+        default='model_day',
+        help='Agrupamento (padrão: modelo e dia)'
+    )
+    telemetry_cmd.add_argument('--output', type=Path, help='Salvar agregado em JSON')
+    
     # Export ExifTool CSV
     export_exif = subparsers.add_parser('export-exiftool', help='Exportar CSV para ExifTool')
     export_exif.add_argument('--output', type=Path, required=True)
@@ -321,6 +378,17 @@ def main():
     if args.command == 'stats':
         tools.print_stats()
     
+    elif args.command == 'telemetry':
+        tools.print_telemetry(args.by)
+        if args.output:
+            groups = tools.telemetry(args.by)
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(
+                    [dict(zip(args.by.split('_'), key), **values) for key, values in groups.items()],
+                    f, indent=2, ensure_ascii=False
+                )
+            print(f"✅ Telemetria exportada: {args.output}")
+    
     elif args.command == 'export-exiftool':
         tools.to_csv_exiftool(args.output, args.project)
     
@@ -0,0 +1,113 @@
+"""
+Cascata de modelos de visão no Pass 1
+O modelo rápido responde primeiro; o grande só entra quando a resposta é incerta
+"""
+
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config, Habitat
+
+
+# Motivos de escalonamento (chaves do relatório)
+ESCALATION_REASONS = [
+    'malformed', 'incomplete', 'invalid_habitat',
+    'low_habitat_confidence', 'low_species_confidence', 'archaeology'
+]
+
+_HABITATS = {h.value for h in Habitat}
+
+
+def escalation_reason(data: Optional[Dict], incomplete: bool = False) -> Optional[str]:
+    """
+    Motivo para refazer o Pass 1 no modelo grande (None = resposta aceita)
+    
+    Args:
+        data: Pass 1 do modelo rápido, já expandido (None se veio inválido)
+        incomplete: Resposta cortada ou com campos essenciais faltando
+    """
+    if data is None:
+        return 'malformed'
+    if incomplete:
+        return 'incomplete'
+    
+    if data.get('habitat_guess') not in _HABITATS:
+        return 'invalid_habitat'
+    
+    try:
+        habitat_confidence = float(data.get('habitat_confidence', 0.0) or 0.0)
+    except (TypeError, ValueError):
+        return 'malformed'
+    if habitat_confidence < Config.CASCADE_HABITAT_CONFIDENCE:
+        return 'low_habitat_confidence'
+    
+    for sp in data.get('species_candidates', []) or []:
+        try:
+            confidence = float(sp.get('confidence', 0.0) or 0.0)
+        except (AttributeError, TypeError, ValueError):
+            return 'malformed'
+        if confidence < Config.CASCADE_SPECIES_CONFIDENCE:
+            return 'low_species_confidence'
+    
+    # Sambaquis e afins: sempre confirmados pelo modelo grande
+    if Config.CASCADE_ESCALATE_ARCHAEOLOGY and data.get('archaeology_flags'):
+        return 'archaeology'
+    
+    return None
+
+
+class CascadeStats:
+    """
+    Latência por camada e taxa de escalonamento (thread-safe)
+    
+    Camadas: 'fast' (modelo rápido, toda imagem) e 'large' (só as escalonadas).
+    """
+    
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {'fast': [], 'large': []}
+        self.reasons: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, tier: str, seconds: float, reason: str = None):
+        with self._lock:
+            self.latencies.setdefault(tier, []).append(seconds)
+            if reason:
+                self.reasons[reason] = self.reasons.get(reason, 0) + 1
+    
+    def summary(self) -> Dict:
+        with self._lock:
+            latencies = {tier: list(values) for tier, values in self.latencies.items()}
+            reasons = dict(self.reasons)
+        
+        images = len(latencies.get('fast', []))
+        escalated = sum(reasons.values())
+        
+        return {
+            'images': images,
+            'escalated': escalated,
+            'escalation_rate': escalated / images if images else 0.0,
+            'reasons': reasons,
+            'tiers': {
+                tier: {
+                    'count': len(values),
+                    'mean': sum(values) / len(values),
+                    'p50': sorted(values)[len(values) // 2],
+                    'p95': sorted(values)[min(len(values) - 1, int(0.95 * len(values)))],
+                }
+                for tier, values in latencies.items() if values
+            }
+        }
+    
+    def print_summary(self):
+        s = self.summary()
+        if not s['images']:
+            return
+        
+        reasons = ', '.join(f"{r}: {n}" for r, n in sorted(s['reasons'].items(), key=lambda x: -x[1]))
+        print(f"🪜 Cascata: {s['escalated']}/{s['images']} escalonadas ({s['escalation_rate']:.0%})"
+              + (f" | {reasons}" if reasons else ""))
+        for tier, t in s['tiers'].items():
+            print(f"   {tier}: média {t['mean']:.1f}s | p50 {t['p50']:.1f}s | p95 {t['p95']:.1f}s ({t['count']})")
@@ -0,0 +1,147 @@
+"""
+Telemetria das chamadas ao Ollama (tokens e tempos de cada resposta)
+Registrada por passe em cada entrada do manifest e agregada por modelo/dia
+em manifest_tools.py telemetry
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Campos de duração do Ollama (nanossegundos na resposta, segundos no registro)
+DURATION_FIELDS = ['load_duration', 'prompt_eval_duration', 'eval_duration', 'total_duration']
+COUNT_FIELDS = ['prompt_eval_count', 'eval_count']
+
+
+def call_record(
+    stage: str,
+    model: str,
+    final: Optional[Dict],
+    wall_seconds: float,
+    first_token_seconds: float = None,
+    chunks: int = None
+) -> Dict:
+    """
+    Registro de uma chamada ao modelo
+    
+    Args:
+        stage: pass1, pass1_fast, pass2, pass2_batch, *_cont...
+        model: Modelo da requisição
+        final: Resposta (sem streaming) ou último pedaço com done=True; None
+            quando o stream foi encerrado antes dele (Config.STREAM_DONE_WAIT)
+        wall_seconds: Tempo medido no cliente
+        first_token_seconds: Tempo até o primeiro pedaço (streaming)
+        chunks: Pedaços recebidos (um token por pedaço)
+    
+    Sem os totais do Ollama o registro é estimado: prompt_eval_duration vira o
+    tempo até o primeiro token (inclui carga do modelo) e eval_count os pedaços.
+    """
+    record = {'stage': stage, 'model': model}
+    
+    if final is not None and final.get('eval_count') is not None:
+        for name in COUNT_FIELDS:
+            record[name] = final.get(name)
+        for name in DURATION_FIELDS:
+            value = final.get(name)
+            record[name] = round(value / 1e9, 4) if value is not None else None
+        record['estimated'] = False
+        return record
+    
+    first = first_token_seconds if first_token_seconds is not None else wall_seconds
+    record.update({
+        'prompt_eval_count': None,
+        'eval_count': chunks,
+        'load_duration': None,
+        'prompt_eval_duration': round(first, 4),
+        'eval_duration': round(max(wall_seconds - first, 0.0), 4),
+        'total_duration': round(wall_seconds, 4),
+        'estimated': True,
+    })
+    return record
+
+
+def share_calls(calls: List[Dict], images: int) -> List[Dict]:
+    """Fração de uma chamada em lote atribuída a cada imagem (totais batem no agregado)"""
+    if images <= 1:
+        return [dict(c) for c in calls]
+    
+    shared = []
+    for call in calls:
+        part = dict(call, shared=images)
+        for name in COUNT_FIELDS + DURATION_FIELDS:
+            if part.get(name) is not None:
+                part[name] = part[name] / images
+        shared.append(part)
+    return shared
+
+
+class TelemetryAggregate:
+    """
+    Soma de chamadas por grupo (modelo, dia, modelo+dia...)
+    
+    Taxas e frações saem das somas, não da média por chamada. Carga do modelo
+    e tokens do prompt só existem nas chamadas com os totais do Ollama.
+    """
+    
+    def __init__(self):
+        self.groups: Dict[Tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    
+    def add(self, key: Tuple, call: Dict):
+        g = self.groups[key]
+        weight = 1 / call.get('shared', 1)  # fração de uma chamada em lote
+        g['calls'] += weight
+        g['eval_count'] += call.get('eval_count') or 0
+        g['eval_duration'] += call.get('eval_duration') or 0.0
+        g['prefill_duration'] += call.get('prompt_eval_duration') or 0.0
+        g['total_duration'] += call.get('total_duration') or 0.0
+        
+        if call.get('estimated'):
+            g['estimated'] += weight
+            return
+        
+        g['exact_prompt_count'] += call.get('prompt_eval_count') or 0
+        g['exact_prompt_duration'] += call.get('prompt_eval_duration') or 0.0
+        g['exact_load_duration'] += call.get('load_duration') or 0.0
+        g['exact_total_duration'] += call.get('total_duration') or 0.0
+    
+    def summary(self) -> Dict[Tuple, Dict]:
+        result = {}
+        for key, g in sorted(self.groups.items()):
+            compute = g['prefill_duration'] + g['eval_duration']
+            exact = g['calls'] - g['estimated']
+            result[key] = {
+                'calls': round(g['calls'], 2),
+                'estimated_calls': round(g['estimated'], 2),
+                'prompt_tokens': round(g['exact_prompt_count']) if exact else None,
+                'eval_tokens': round(g['eval_count']),
+                'prompt_tokens_per_s': _rate(g['exact_prompt_count'], g['exact_prompt_duration']),
+                'eval_tokens_per_s': _rate(g['eval_count'], g['eval_duration']),
+                'prompt_share': g['prefill_duration'] / compute if compute else None,
+                'eval_share': g['eval_duration'] / compute if compute else None,
+                'load_seconds': g['exact_load_duration'] if exact else None,
+                'load_share': _rate(g['exact_load_duration'], g['exact_total_duration']),
+                'total_seconds': g['total_duration'],
+            }
+        return result
+
+
+def aggregate(entries: Iterable[Dict], by: str = 'model') -> Dict[Tuple, Dict]:
+    """
+    Agrega a telemetria das entradas do manifest
+    
+    Args:
+        entries: Entradas do manifest (chave 'telemetry' = lista de chamadas)
+        by: model, day ou model_day
+    """
+    totals = TelemetryAggregate()
+    for entry in entries:
+        day = (entry.get('timestamp') or '')[:10] or 'sem data'
+        for call in entry.get('telemetry') or []:
+            model = call.get('model') or 'desconhecido'
+            key = {'model': (model,), 'day': (day,)}.get(by, (model, day))
+            totals.add(key, call)
+    return totals.summary()
+
+
+def _rate(numerator: float, denominator: float) -> Optional[float]:
+    return numerator / denominator if denominator else None
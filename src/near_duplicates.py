@@ -0,0 +1,216 @@
+"""
+Detecção de quase-duplicatas (rajadas, bracketing HDR, variantes -Edit)
+Agrupa frames quase idênticos para rodar o modelo uma vez por grupo
+"""
+
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import sys
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config, AcquaplanMetadata
+
+
+def dhash(image_path: str, hash_size: int = 8) -> int:
+    """
+    Hash perceptual por diferença (dHash) de 64 bits
+    
+    Robusto a reexportação, ajuste leve de exposição e redimensionamento;
+    frames de uma rajada ficam a poucos bits de distância.
+    """
+    with Image.open(image_path) as img:
+        # JPEG: decodifica já reduzido, só precisamos de 9x8 pixels
+        img.draft('L', (hash_size * 16, hash_size * 16))
+        small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    
+    pixels = small.tobytes()
+    width = hash_size + 1
+    bits = 0
+    
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * width + col]
+            right = pixels[row * width + col + 1]
+            bits = (bits << 1) | (left > right)
+    
+    return bits
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """Árvore BK sobre distância de Hamming (busca por raio sem varrer tudo)"""
+    
+    def __init__(self):
+        # Nó: [hash, itens com esse hash, {distância: filho}]
+        self._root = None
+    
+    def add(self, value: int, item: Any):
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            
+            if distance == 0:
+                node[1].append(item)
+                return
+            
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            
+            node = child
+    
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """Retorna (distância, item) de todos os itens a até max_distance bits"""
+        if self._root is None:
+            return []
+        
+        found = []
+        stack = [self._root]
+        
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+            
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        
+        return found
+
+
+@dataclass
+class DuplicateCluster:
+    """Grupo de frames quase idênticos: o representante vai ao modelo"""
+    representative: Any
+    members: List[Any] = field(default_factory=list)
+
+
+def cluster_near_duplicates(
+    hashes: Dict[Any, int],
+    max_distance: int = None
+) -> List[DuplicateCluster]:
+    """
+    Agrupa itens por hash perceptual
+    
+    Cada item ainda livre vira representante e absorve os vizinhos livres
+    dentro do raio (sem encadear: A~B e B~C não junta A com C se A≁C).
+    
+    Args:
+        hashes: Item -> dHash, na ordem de preferência para representante
+        max_distance: Raio em bits (padrão: Config.NEAR_DUPLICATE_MAX_DISTANCE)
+    
+    Returns:
+        Lista de clusters (itens isolados viram clusters sem membros)
+    """
+    if max_distance is None:
+        max_distance = Config.NEAR_DUPLICATE_MAX_DISTANCE
+    
+    order = {item: idx for idx, item in enumerate(hashes)}
+    tree = BKTree()
+    for item, value in hashes.items():
+        tree.add(value, item)
+    
+    assigned = set()
+    clusters = []
+    
+    for item, value in hashes.items():
+        if item in assigned:
+            continue
+        
+        assigned.add(item)
+        members = sorted(
+            (other for _, other in tree.search(value, max_distance) if other not in assigned),
+            key=order.get
+        )
+        assigned.update(members)
+        clusters.append(DuplicateCluster(representative=item, members=members))
+    
+    return clusters
+
+
+def propagate_metadata(
+    source: AcquaplanMetadata,
+    file_id: str,
+    filename: str,
+    technical_quality: str = ''
+) -> AcquaplanMetadata:
+    """
+    Copia cena/habitat/espécies/keywords do representante para um membro
+    
+    Só os campos da cena: technical_quality é do próprio membro (pré-triagem
+    dele; vazio se não medida). Campos que faltaram no representante faltam
+    também no membro ('partial'); representante pulado na pré-triagem não
+    tem cena para copiar (ValueError). O membro guarda a origem em
+    `derived_from` para auditoria e reprocessamento.
+    """
+    if source.status == 'skipped':
+        raise ValueError(f"{source.original_filename} foi pulado na pré-triagem: nada a copiar")
+    
+    scene = copy.deepcopy(source)
+    return AcquaplanMetadata(
+        file_id=file_id,
+        source=source.source,
+        original_filename=filename,
+        title=scene.title,
+        description_short=scene.description_short,
+        description_long=scene.description_long,
+        habitat_guess=scene.habitat_guess,
+        habitat_confidence=scene.habitat_confidence,
+        habitat_evidence=scene.habitat_evidence,
+        species_candidates=scene.species_candidates,
+        archaeology_flags=scene.archaeology_flags,
+        archaeology_evidence=scene.archaeology_evidence,
+        keywords=scene.keywords,
+        location_guess=scene.location_guess,
+        activities=scene.activities,
+        technical_quality=technical_quality,
+        processing_timestamp=datetime.now().isoformat(),
+        processing_mode=source.processing_mode,
+        status='partial' if source.status == 'partial' else 'complete',
+        missing_fields=scene.missing_fields,
+        derived_from=source.file_id
+    )
+
+
+def hash_images(image_paths: Dict[Any, str], workers: int = None) -> Dict[Any, Optional[int]]:
+    """
+    Calcula dHash em paralelo (decode JPEG libera o GIL)
+    
+    Args:
+        image_paths: Item -> caminho da imagem que vai ao modelo
+    
+    Returns:
+        Item -> hash (None se a imagem não pôde ser lida)
+    """
+    def safe_hash(path: str) -> Optional[int]:
+        try:
+            return dhash(path)
+        except Exception:
+            return None
+    
+    items = list(image_paths)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        values = list(executor.map(safe_hash, [image_paths[i] for i in items]))
+    
+    return dict(zip(items, values))
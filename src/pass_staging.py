@@ -0,0 +1,252 @@
+"""
+Staging durável das saídas de cada passe (Pass 1, Pass 2) por imagem
+Se o Pass 2 falhar (timeout, JSON ruim, Ollama reiniciado), o Pass 1 já pago
+fica gravado e a próxima execução roda só o que falta (--resume)
+"""
+
+import json
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Espera antes da tentativa seguinte a `attempt` (1, 2, ...)
+    
+    Exponencial a partir de Config.RETRY_BACKOFF_SECONDS, limitada a
+    Config.RETRY_MAX_BACKOFF_SECONDS; o jitter (50-100%) evita que os workers
+    voltem todos juntos depois de um restart do Ollama.
+    """
+    delay = min(
+        Config.RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1),
+        Config.RETRY_MAX_BACKOFF_SECONDS
+    )
+    return delay * (0.5 + random.random() / 2)
+
+
+def file_fingerprint(path) -> str:
+    """Tamanho + mtime do arquivo local ('' se não existir): muda quando a foto muda"""
+    try:
+        stat = Path(path).stat()
+    except (OSError, ValueError):
+        return ''
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class PassStaging:
+    """
+    Saídas intermediárias por imagem, em SQLite, até o sink confirmar
+    
+    Uma linha por (imagem, passe). A saída só é reaproveitada se a assinatura
+    (modelo, modo, versão do prompt...) e a impressão digital do arquivo
+    baterem. Falhas ficam registradas (tentativas + último erro) na mesma
+    linha, sem saída. complete() apaga a imagem depois de gravada.
+    """
+    
+    def __init__(self, db_path: Path = None, max_age_days: float = None):
+        self.db_path = Path(db_path or Config.STAGING_PATH)
+        self.max_age_days = Config.STAGING_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        self.reused = 0
+        self.stored = 0
+        self.failures = 0
+        
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pass_staging (
+                image_key TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                source TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                signature TEXT,
+                payload TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (image_key, stage)
+            )
+        """)
+        self._conn.commit()
+        
+        if self.max_age_days:
+            self.purge(self.max_age_days)
+    
+    @staticmethod
+    def make_key(source: str, file_id: str) -> str:
+        return f"{source}:{file_id}"
+    
+    def get(self, key: str, stage: str, signature: str, fingerprint: str = '') -> Optional[Dict]:
+        """Saída gravada do passe, ou None (ausente, falhou, ou de outra config/versão do arquivo)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, signature, fingerprint FROM pass_staging WHERE image_key = ? AND stage = ?",
+                (key, stage)
+            ).fetchone()
+        
+        if row is None or row[0] is None or row[1] != signature or row[2] != fingerprint:
+            return None
+        
+        with self._lock:
+            self.reused += 1
+        return json.loads(row[0])
+    
+    def put(self, key: str, stage: str, signature: str, payload: Dict, meta: Dict):
+        """
+        Grava a saída de um passe
+        
+        Args:
+            meta: source, file_id, filename, folder, fingerprint da imagem
+        """
+        encoded = json.dumps(payload, ensure_ascii=False, default=str)
+        
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO pass_staging
+                    (image_key, stage, source, file_id, filename, folder, fingerprint,
+                     signature, payload, attempts, last_error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, NULL, ?)
+                """,
+                (key, stage, meta['source'], meta['file_id'], meta['filename'],
+                 meta['folder'], meta['fingerprint'], signature, encoded, time.time())
+            )
+            self._conn.commit()
+            self.stored += 1
+    
+    def fail(self, key: str, stage: str, error: Exception, meta: Dict):
+        """Registra a falha de um passe (o que já estava gravado nos outros passes fica)"""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO pass_staging
+                    (image_key, stage, source, file_id, filename, folder, fingerprint,
+                     attempts, last_error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+                ON CONFLICT (image_key, stage) DO UPDATE SET
+                    payload = NULL,
+                    attempts = attempts + 1,
+                    last_error = excluded.last_error,
+                    updated_at = excluded.updated_at
+                """,
+                (key, stage, meta['source'], meta['file_id'], meta['filename'],
+                 meta['folder'], meta['fingerprint'], str(error)[:500], time.time())
+            )
+            self._conn.commit()
+            self.failures += 1
+    
+    def complete(self, key: Optional[str]):
+        """Imagem gravada no destino: as saídas intermediárias saem do staging"""
+        if key is None:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM pass_staging WHERE image_key = ?", (key,))
+            self._conn.commit()
+    
+    def pending(self, source: str = None) -> List[Dict]:
+        """
+        Imagens pela metade: algum passe gravado ou falho, sink não confirmado
+        
+        Returns:
+            Lista de dicts (key, source, file_id, filename, folder, done, failed,
+            attempts, last_error), mais antigas primeiro
+        """
+        query = "SELECT * FROM pass_staging"
+        params = ()
+        if source is not None:
+            query += " WHERE source = ?"
+            params = (source,)
+        
+        with self._lock:
+            cursor = self._conn.execute(query + " ORDER BY updated_at", params)
+            columns = [c[0] for c in cursor.description]
+            rows = [dict(zip(columns, r)) for r in cursor.fetchall()]
+        
+        images: Dict[str, Dict] = {}
+        for row in rows:
+            image = images.setdefault(row['image_key'], {
+                'key': row['image_key'],
+                'source': row['source'],
+                'file_id': row['file_id'],
+                'filename': row['filename'],
+                'folder': row['folder'],
+                'done': [],
+                'failed': [],
+                'attempts': 0,
+                'last_error': None,
+            })
+            if row['payload'] is not None:
+                image['done'].append(row['stage'])
+            else:
+                image['failed'].append(row['stage'])
+                image['attempts'] += row['attempts']
+                image['last_error'] = row['last_error']
+        
+        return list(images.values())
+    
+    def purge(self, max_age_days: float) -> int:
+        """Descarta entradas paradas há mais de `max_age_days` dias"""
+        cutoff = time.time() - max_age_days * 86400
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM pass_staging WHERE updated_at < ?", (cutoff,)
+            ).rowcount
+            self._conn.commit()
+        return removed
+    
+    def print_summary(self, source: str = None):
+        pending = self.pending(source)
+        if not (self.reused or self.failures or pending):
+            return
+        
+        print(f"🧩 Staging: {self.reused} passes retomados, {self.stored} gravados, {self.failures} falhas")
+        if pending:
+            print(f"   {len(pending)} imagens pela metade (rode de novo com --resume)")
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Acquaplan - imagens com passes pendentes")
+    parser.add_argument('--source', default=None, help='lightroom ou drive (padrão: todas)')
+    parser.add_argument('--clear', action='store_true', help='Descarta todo o staging')
+    args = parser.parse_args()
+    
+    staging = PassStaging(max_age_days=0)
+    if args.clear:
+        removed = staging.purge(0)
+        print(f"🧹 {removed} entradas removidas de {staging.db_path}")
+        return
+    
+    pending = staging.pending(args.source)
+    if not pending:
+        print("✅ Nenhuma imagem pela metade")
+        return
+    
+    for image in pending:
+        done = ', '.join(image['done']) or '-'
+        line = f"{image['source']}: {image['filename']} | feito: {done}"
+        if image['failed']:
+            line += f" | falhou: {', '.join(image['failed'])} ({image['attempts']}x): {image['last_error']}"
+        print(line)
+    print(f"\n{len(pending)} imagens pela metade")
+
+
+if __name__ == "__main__":
+    main()
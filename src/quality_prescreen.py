@@ -0,0 +1,138 @@
+"""
+Pré-triagem local da qualidade técnica (antes do modelo)
+Nitidez pela variância do Laplaciano e exposição pelo histograma, em NumPy
+sobre a imagem reduzida: milissegundos por imagem
+"""
+
+import threading
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict
+import sys
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config
+
+
+@dataclass
+class QualityReport:
+    """Resultado da pré-triagem de uma imagem"""
+    quality: str            # sharp, blurred, underexposed, overexposed
+    sharpness: float        # variância do Laplaciano (luminância 0-255)
+    mean: float             # luminância média
+    clipped_dark: float     # fração de pixels quase pretos
+    clipped_bright: float   # fração de pixels quase brancos
+    hopeless: bool = False  # não vale uma chamada ao modelo
+    reason: str = ""        # black_frame, white_frame, motion_blur
+    
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class QualityPrescreen:
+    """
+    Classifica a qualidade técnica sem o modelo
+    
+    Ordem: quadro quase todo preto/branco (tampa da lente, céu estourado) →
+    clipping → nitidez. Frames "hopeless" podem ser pulados ou deixados para
+    o fim do batch (Config.PRESCREEN_HOPELESS_POLICY).
+    """
+    
+    # Limiares do histograma (luminância 8 bits)
+    DARK_LEVEL = 8
+    BRIGHT_LEVEL = 247
+    
+    def __init__(self, size: int = None):
+        if not NUMPY_AVAILABLE or not PIL_AVAILABLE:
+            raise ImportError("Pré-triagem requer numpy e Pillow: pip install numpy Pillow")
+        self.size = size or Config.PRESCREEN_SIZE
+    
+    def load(self, image_path: str) -> "np.ndarray":
+        """Luminância reduzida (lado maior = self.size) como float32"""
+        with Image.open(image_path) as img:
+            # JPEG: decodifica já reduzido
+            img.draft('L', (self.size, self.size))
+            gray = img.convert('L')
+            gray.thumbnail((self.size, self.size), Image.Resampling.BILINEAR)
+            return np.asarray(gray, dtype=np.float32)
+    
+    @staticmethod
+    def laplacian_variance(gray: "np.ndarray") -> float:
+        """Variância do Laplaciano 4-vizinhos (bordas ignoradas)"""
+        if gray.shape[0] < 3 or gray.shape[1] < 3:
+            return 0.0
+        lap = (
+            gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+            - 4.0 * gray[1:-1, 1:-1]
+        )
+        return float(lap.var())
+    
+    def classify(self, gray: "np.ndarray") -> QualityReport:
+        pixels = gray.size or 1
+        mean = float(gray.mean()) if gray.size else 0.0
+        dark = float(np.count_nonzero(gray <= self.DARK_LEVEL)) / pixels
+        bright = float(np.count_nonzero(gray >= self.BRIGHT_LEVEL)) / pixels
+        sharpness = self.laplacian_variance(gray)
+        
+        report = QualityReport(
+            quality='sharp', sharpness=sharpness, mean=mean,
+            clipped_dark=dark, clipped_bright=bright
+        )
+        
+        if dark >= Config.PRESCREEN_HOPELESS_CLIP:
+            report.quality, report.hopeless, report.reason = 'underexposed', True, 'black_frame'
+        elif bright >= Config.PRESCREEN_HOPELESS_CLIP:
+            report.quality, report.hopeless, report.reason = 'overexposed', True, 'white_frame'
+        elif dark >= Config.PRESCREEN_CLIP_FRACTION:
+            report.quality = 'underexposed'
+        elif bright >= Config.PRESCREEN_CLIP_FRACTION:
+            report.quality = 'overexposed'
+        elif sharpness < Config.PRESCREEN_HOPELESS_BLUR:
+            report.quality, report.hopeless, report.reason = 'blurred', True, 'motion_blur'
+        elif sharpness < Config.PRESCREEN_BLUR_THRESHOLD:
+            report.quality = 'blurred'
+        
+        return report
+    
+    def assess(self, image_path: str) -> QualityReport:
+        return self.classify(self.load(image_path))
+
+
+class PrescreenStats:
+    """Contagem por pasta: qualidade técnica e frames descartados/adiados"""
+    
+    def __init__(self):
+        self.folders: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, folder: str, report: QualityReport, action: str = None):
+        with self._lock:
+            counts = self.folders.setdefault(folder, {})
+            counts[report.quality] = counts.get(report.quality, 0) + 1
+            if report.hopeless:
+                key = f"{action or 'hopeless'}:{report.reason}"
+                counts[key] = counts.get(key, 0) + 1
+    
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {folder: dict(counts) for folder, counts in self.folders.items()}
+    
+    def print_summary(self):
+        for folder, counts in self.summary().items():
+            qualities = ', '.join(
+                f"{q}: {counts[q]}" for q in ('sharp', 'blurred', 'underexposed', 'overexposed') if q in counts
+            )
+            hopeless = ', '.join(f"{k}: {v}" for k, v in sorted(counts.items()) if ':' in k)
+            print(f"🔬 Pré-triagem {folder}: {qualities}" + (f" | {hopeless}" if hopeless else ""))
@@ -0,0 +1,192 @@
+"""
+Previews embutidos de arquivos RAW
+Extrai o JPEG da câmera (JpgFromRaw/PreviewImage) em lote, sem revelar o RAW
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+import sys
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config
+from src.exiftool_pool import ExifToolPool, shared_pool
+
+
+# Orientation EXIF do RAW -> rotação do preview (que vem sem orientação)
+_ORIENTATION_TRANSPOSE = {
+    3: 'ROTATE_180',
+    6: 'ROTATE_270',
+    8: 'ROTATE_90',
+}
+
+
+class RawPreviewExtractor:
+    """
+    Adaptador de entrada para RAWs
+    
+    Dois comandos do exiftool por pasta (previews e orientação), num processo
+    já aberto do pool; o resultado fica em cache por path + mtime + tamanho do RAW.
+    """
+    
+    def __init__(self, cache_dir: Path = None, exiftool: ExifToolPool = None):
+        self.cache_dir = Path(cache_dir or Config.RAW_PREVIEW_CACHE_DIR)
+        self.exiftool = exiftool or shared_pool()
+    
+    def cache_path_for(self, raw_path: Path) -> Path:
+        """Caminho do preview em cache (muda se o RAW ou o tamanho de entrada mudar)"""
+        stat = raw_path.stat()
+        key = hashlib.sha1(
+            f"{raw_path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}|"
+            f"{Config.MODEL_INPUT_SIZE}|{Config.THUMBNAIL_QUALITY}".encode('utf-8')
+        ).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.jpg"
+    
+    def extract(self, raw_paths: List[Path]) -> Dict[Path, Path]:
+        """
+        Garante o preview de cada RAW
+        
+        Args:
+            raw_paths: Arquivos RAW (podem estar em pastas diferentes)
+        
+        Returns:
+            Dict RAW -> preview JPEG (RAWs sem preview embutido ficam de fora)
+        """
+        previews = {}
+        missing_by_folder = defaultdict(list)
+        
+        for raw_path in raw_paths:
+            raw_path = Path(raw_path)
+            cached = self.cache_path_for(raw_path)
+            
+            if cached.exists():
+                previews[raw_path] = cached
+            else:
+                missing_by_folder[raw_path.parent].append(raw_path)
+        
+        for folder, folder_raws in missing_by_folder.items():
+            print(f"🖼️  Extraindo previews embutidos: {len(folder_raws)} RAWs em {folder}")
+            previews.update(self._extract_folder(folder_raws))
+        
+        return previews
+    
+    def _extract_folder(self, raw_paths: List[Path]) -> Dict[Path, Path]:
+        """Extração e leitura da orientação de todos os RAWs da pasta"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        previews = {}
+        
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as tmp:
+            tmp_dir = Path(tmp)
+            files = [str(p) for p in raw_paths]
+            
+            tag_args = [f'-{tag}' for tag in Config.RAW_PREVIEW_TAGS]
+            # Um -q só: some o "N image files read", ficam avisos e erros por arquivo
+            common = ['-charset', 'filename=utf8', '-q']
+            
+            # Comando 1: grava cada preview como <nome>.<ext>_<tag>.<jpg>
+            extracted = self.exiftool.execute(common + [
+                '-a', '-b', '-W', str(tmp_dir / '%f.%e_%t%-c.%s'), *tag_args, *files
+            ])
+            # Comando 2 (mesmo pool): orientação de cada RAW
+            read = self.exiftool.execute(common + [
+                '-j', '-n', '-Orientation', *files
+            ])
+            orientations = self._parse_orientations(read.stdout)
+            written = sorted(tmp_dir.iterdir())
+            
+            for raw_path in raw_paths:
+                candidate = self._pick_preview(written, raw_path)
+                
+                if candidate is None:
+                    continue
+                
+                target = self.cache_path_for(raw_path)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                self._store(candidate, target, orientations.get(str(raw_path), 1))
+                previews[raw_path] = target
+            
+            if len(previews) < len(raw_paths):
+                failed = len(raw_paths) - len(previews)
+                print(f"  ⚠️  {failed} RAWs sem preview embutido")
+                for line in (extracted.errors + extracted.warnings)[:5]:
+                    print(f"     {line[:200]}")
+        
+        return previews
+    
+    @staticmethod
+    def _parse_orientations(stdout: str) -> Dict[str, int]:
+        start = stdout.find('[')
+        if start < 0:
+            return {}
+        
+        try:
+            entries = json.loads(stdout[start:])
+        except json.JSONDecodeError:
+            return {}
+        
+        return {
+            e.get('SourceFile', ''): int(e.get('Orientation') or 1)
+            for e in entries
+            if isinstance(e, dict)
+        }
+    
+    def _pick_preview(self, written: List[Path], raw_path: Path) -> Optional[Path]:
+        """
+        Escolhe o menor preview que ainda cobre MODEL_INPUT_SIZE
+        (decodificar um JpgFromRaw de 24 MP à toa custa caro)
+        
+        Args:
+            written: Arquivos gravados pelo -W (comparação por prefixo do nome:
+                '[', ']', '*' e '?' no nome do RAW não são padrão de glob)
+        """
+        prefix = f"{raw_path.stem}.{raw_path.suffix.lstrip('.')}_"
+        candidates = [
+            p for tag in Config.RAW_PREVIEW_TAGS
+            for p in written
+            if p.name.startswith(prefix + tag) and p.stat().st_size > 0
+        ]
+        
+        if not candidates or not PIL_AVAILABLE:
+            return candidates[0] if candidates else None
+        
+        sized = []
+        for path in candidates:
+            try:
+                with Image.open(path) as img:
+                    sized.append((max(img.size), path))
+            except Exception:
+                continue
+        
+        if not sized:
+            return None
+        
+        large_enough = [s for s in sized if s[0] >= Config.MODEL_INPUT_SIZE]
+        if large_enough:
+            return min(large_enough, key=lambda s: s[0])[1]
+        return max(sized, key=lambda s: s[0])[1]
+    
+    @staticmethod
+    def _store(preview: Path, target: Path, orientation: int):
+        """
+        Grava o preview no cache já reduzido (draft) para MODEL_INPUT_SIZE,
+        girando se o RAW estiver em retrato; sem PIL, move o arquivo como veio
+        """
+        if not PIL_AVAILABLE:
+            os.replace(preview, target)
+            return
+        
+        transpose = _ORIENTATION_TRANSPOSE.get(orientation)
+        with Image.open(preview) as img:
+            img.draft('RGB', (Config.MODEL_INPUT_SIZE, Config.MODEL_INPUT_SIZE))
+            stored = img.transpose(getattr(Image.Transpose, transpose)) if transpose else img
+            stored.save(target, 'JPEG', quality=Config.THUMBNAIL_QUALITY)
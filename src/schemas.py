@@ -0,0 +1,172 @@
+"""
+JSON Schema das respostas do modelo (structured outputs do Ollama)
+Derivado dos dataclasses de config/acquaplan_config.py: o decodificador só
+gera JSON no formato que _build_metadata consome
+"""
+
+import copy
+import dataclasses
+from enum import Enum
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Sequence, Union, get_args, get_origin, get_type_hints
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import (
+    Config,
+    Habitat,
+    ArchaeologyFlag,
+    AcquaplanMetadata
+)
+
+
+# Mude ao alterar a forma das respostas (campos, limites, enums): entra na
+# chave do cache de inferência e na assinatura do staging
+SCHEMA_VERSION = "1"
+
+# Campos com vocabulário fechado (o decodificador só aceita esses valores)
+FIELD_ENUMS = {
+    'habitat_guess': Habitat,
+    'archaeology_flags': ArchaeologyFlag,
+    'technical_quality': ['sharp', 'blurred', 'underexposed', 'overexposed'],
+    'taxonomy_level': ['species', 'genus', 'family', 'order'],
+}
+
+# Campos das respostas que não existem no AcquaplanMetadata
+RESPONSE_ONLY_FIELDS = {
+    'scene_summary': str,
+    'keywords_raw': List[str],
+    'keywords_normalized': List[str],
+}
+
+# Limites de tamanho das listas de keywords (substituem o "MINIMO 40" do prompt)
+LIST_LIMITS = {
+    'keywords_raw': (40, Config.MAX_KEYWORDS),
+    'keywords_normalized': (Config.MIN_KEYWORDS, Config.MAX_KEYWORDS),
+}
+
+PASS1_FIELDS = [
+    'scene_summary', 'habitat_guess', 'habitat_confidence', 'habitat_evidence',
+    'species_candidates', 'archaeology_flags', 'archaeology_evidence',
+    'activities', 'technical_quality', 'keywords_raw'
+]
+
+SINGLE_PASS_FIELDS = [
+    'scene_summary', 'title', 'description_short', 'description_long',
+    'habitat_guess', 'habitat_confidence', 'habitat_evidence',
+    'species_candidates', 'archaeology_flags', 'archaeology_evidence',
+    'activities', 'technical_quality', 'keywords_normalized'
+]
+
+PASS2_FIELDS = ['title', 'description_short', 'description_long', 'keywords_normalized']
+
+
+def short_lists(data: Dict, fields: Sequence[str] = None) -> List[str]:
+    """
+    Listas abaixo do mínimo de LIST_LIMITS (ex.: keywords cortadas no meio)
+    
+    Args:
+        fields: Só estes campos (padrão: todos os de LIST_LIMITS presentes)
+    """
+    names = [f for f in (fields or LIST_LIMITS) if f in LIST_LIMITS and f in data]
+    return [
+        name for name in names
+        if not isinstance(data[name], list) or len(data[name]) < LIST_LIMITS[name][0]
+    ]
+
+
+def _enum_values(choices) -> List[str]:
+    if isinstance(choices, type) and issubclass(choices, Enum):
+        return [c.value for c in choices]
+    return list(choices)
+
+
+def type_schema(annotation, name: str = None) -> Dict:
+    """Anotação de tipo (str, float, List[...], dataclass...) -> JSON Schema"""
+    origin = get_origin(annotation)
+    
+    if origin is Union:
+        # Optional[X]: o modelo sempre preenche, o None fica para o Python
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        return type_schema(args[0], name)
+    
+    if origin in (list, List):
+        (item,) = get_args(annotation) or (str,)
+        schema = {'type': 'array', 'items': type_schema(item, name)}
+        if name in LIST_LIMITS:
+            schema['minItems'], schema['maxItems'] = LIST_LIMITS[name]
+        return schema
+    
+    if dataclasses.is_dataclass(annotation):
+        return object_schema(annotation)
+    
+    if name in FIELD_ENUMS:
+        return {'type': 'string', 'enum': _enum_values(FIELD_ENUMS[name])}
+    
+    if annotation is float:
+        return {'type': 'number'}
+    if annotation is int:
+        return {'type': 'integer'}
+    if annotation is bool:
+        return {'type': 'boolean'}
+    return {'type': 'string'}
+
+
+def object_schema(cls, fields: Sequence[str] = None) -> Dict:
+    """
+    Objeto JSON a partir de um dataclass
+    
+    Args:
+        cls: Dataclass de origem dos tipos
+        fields: Campos, na ordem de geração (padrão: todos os do dataclass).
+            Nomes fora do dataclass são procurados em RESPONSE_ONLY_FIELDS.
+    """
+    hints = get_type_hints(cls)
+    if fields is None:
+        fields = [f.name for f in dataclasses.fields(cls)]
+    
+    properties = {}
+    for name in fields:
+        annotation = hints.get(name, RESPONSE_ONLY_FIELDS.get(name, str))
+        properties[name] = type_schema(annotation, name)
+    
+    return {'type': 'object', 'properties': properties, 'required': list(fields)}
+
+
+def subset_schema(schema: Dict, fields: Sequence[str]) -> Dict:
+    """Mesmo objeto restrito a alguns campos (continuação de resposta cortada)"""
+    properties = {k: v for k, v in schema['properties'].items() if k in fields}
+    return {'type': 'object', 'properties': properties, 'required': list(properties)}
+
+
+@lru_cache(maxsize=None)
+def _cached_schema(fields: tuple) -> Dict:
+    return object_schema(AcquaplanMetadata, fields)
+
+
+def response_schema(fields: tuple) -> Dict:
+    """
+    Schema de uma resposta com os campos dados (Pass 1, passe único ou Pass 2)
+    
+    Cópia do schema em cache: quem alterar o dict não altera os próximos.
+    """
+    return copy.deepcopy(_cached_schema(tuple(fields)))
+
+
+def pass1_schema(mode: str = 'two_pass') -> Dict:
+    return response_schema(tuple(SINGLE_PASS_FIELDS if mode == 'single_pass' else PASS1_FIELDS))
+
+
+def pass2_schema(fields: Sequence[str] = None) -> Dict:
+    return response_schema(tuple(fields or PASS2_FIELDS))
+
+
+def pass2_batch_schema(image_ids: Sequence[str], fields: Sequence[str] = None) -> Dict:
+    """Um objeto do Pass 2 por ID de imagem (cada um com a sua cópia do schema)"""
+    return {
+        'type': 'object',
+        'properties': {image_id: pass2_schema(fields) for image_id in image_ids},
+        'required': list(image_ids)
+    }
+
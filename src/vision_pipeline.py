@@ -4,10 +4,13 @@ Usa Qwen2-VL via Ollama com Metal acceleration
 """
 
 import ollama
+import hashlib
 import json
-import re
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 import sys
 
@@ -20,6 +23,18 @@ from config.acquaplan_config import (
     SpeciesCandidate,
     LocationGuess
 )
+from src.batch_engine import BatchEngine
+from src.image_preprocessing import ImagePreprocessor, compute_content_hash
+from src.inference_cache import InferenceCache
+from src.keyword_normalizer import KeywordNormalizer
+from src.json_stream import JsonObjectScanner, JsonTimings, repair_truncated_json
+from src.compact_vocabulary import CompactVocabulary
+from src.model_cascade import CascadeStats, escalation_reason
+from src.quality_prescreen import QualityPrescreen, QualityReport, PrescreenStats, NUMPY_AVAILABLE
+from src.instrumentation import StageMetrics
+from src.model_telemetry import call_record, share_calls
+from src.pass_staging import PassStaging, backoff_delay, file_fingerprint
+from src.schemas import pass1_schema, pass2_schema, pass2_batch_schema, subset_schema, short_lists, SCHEMA_VERSION
 
 # Prompts melhorados v1.4 (sem caracteres especiais problemáticos)
 try:
@@ -30,56 +45,234 @@ except ImportError:
     print("⚠️  Prompts v1.4 não encontrados, usando v1.3")
 
 
+# Tarefas do Pass 2 (prompt individual e em lote)
+PASS2_TASKS = """TAREFAS:
+1. title: titulo conciso (5-8 palavras)
+2. description_short: 1 frase impactante (20-30 palavras)
+3. description_long: 2-4 frases com contexto ecologico (60-100 palavras)
+4. keywords_normalized: termos hierarquicos categoria:valor, TODAS categorias relevantes, sem duplicatas
+   (ex.: bioma:manguezal, fauna:rhizophora_mangle)
+
+CATEGORIAS: bioma, geomorfologia, fauna, flora, atividade, clima, tecnica, conservacao, cores, elementos"""
+
+# Campos essenciais de cada resposta (faltando = continuação / status partial)
+PASS1_REQUIRED_FIELDS = [
+    'scene_summary', 'habitat_guess', 'habitat_confidence',
+    'species_candidates', 'keywords_raw'
+]
+SINGLE_PASS_REQUIRED_FIELDS = [
+    'scene_summary', 'title', 'description_short', 'description_long',
+    'habitat_guess', 'habitat_confidence', 'species_candidates', 'keywords_normalized'
+]
+
+# Chave interna com os campos não recuperados (não vai ao modelo nem ao cache)
+MISSING_FIELDS_KEY = '_missing_fields'
+
+# Chamadas ao modelo deste resultado (tokens/tempos do Ollama; fora do cache)
+TELEMETRY_KEY = '_telemetry'
+
+
 class VisionPipeline:
     """Pipeline completo de análise de imagem"""
     
-    def __init__(self, model: str = None):
+    def __init__(
+        self,
+        model: str = None,
+        preprocess: bool = None,
+        cache: bool = None,
+        mode: str = None,
+        normalizer: str = None,
+        vocabulary: str = None,
+        cascade: bool = None,
+        text_model: str = None,
+        prescreen: bool = None,
+        hopeless_policy: str = None,
+        staging: bool = None,
+        verify: bool = True
+    ):
         self.model = model or Config.VISION_MODEL
-        self._verify_ollama()
+        
+        # Pass 2 não envia imagem: pode rodar num modelo só de texto
+        self.text_model = text_model or Config.TEXT_MODEL or self.model
+        
+        # Cascata: modelo rápido no Pass 1, self.model só quando escalonar
+        if cascade is None:
+            cascade = Config.USE_CASCADE
+        self.fast_model = Config.FAST_VISION_MODEL if cascade else None
+        self.cascade_stats = CascadeStats()
+        
+        self.mode = mode or Config.PROCESSING_MODE
+        if self.mode not in Config.PROCESSING_MODES:
+            raise ValueError(f"Modo inválido: {self.mode} (use {', '.join(Config.PROCESSING_MODES)})")
+        
+        self.normalizer_profile = normalizer or Config.NORMALIZER_PROFILE
+        if self.normalizer_profile not in Config.NORMALIZER_PROFILES:
+            raise ValueError(
+                f"Normalizador inválido: {self.normalizer_profile} "
+                f"(use {', '.join(Config.NORMALIZER_PROFILES)})"
+            )
+        self.normalizer = KeywordNormalizer()
+        
+        self.vocabulary_mode = vocabulary or Config.OUTPUT_VOCABULARY
+        if self.vocabulary_mode not in Config.OUTPUT_VOCABULARIES:
+            raise ValueError(
+                f"Vocabulário inválido: {self.vocabulary_mode} "
+                f"(use {', '.join(Config.OUTPUT_VOCABULARIES)})"
+            )
+        self.vocabulary = CompactVocabulary() if self.vocabulary_mode == 'compact' else None
+        
+        if preprocess is None:
+            preprocess = Config.PREPROCESS_IMAGES
+        self.preprocessor = ImagePreprocessor() if preprocess else None
+        
+        if cache is None:
+            cache = Config.USE_INFERENCE_CACHE
+        self.cache = InferenceCache() if cache else None
+        
+        # Saídas de cada passe por imagem até o sink confirmar (retomada)
+        if staging is None:
+            staging = Config.USE_PASS_STAGING
+        self.staging = PassStaging() if staging else None
+        self.retries = 0
+        self._retry_lock = threading.Lock()
+        
+        # Pré-triagem de qualidade técnica (sem modelo)
+        if prescreen is None:
+            prescreen = Config.PRESCREEN_QUALITY
+        if prescreen and not NUMPY_AVAILABLE:
+            print("⚠️  numpy não instalado: pré-triagem de qualidade desativada")
+            prescreen = False
+        self.prescreen = QualityPrescreen() if prescreen else None
+        self.prescreen_stats = PrescreenStats()
+        self.hopeless_policy = hopeless_policy or Config.PRESCREEN_HOPELESS_POLICY
+        if self.hopeless_policy not in Config.PRESCREEN_POLICIES:
+            raise ValueError(
+                f"Política inválida: {self.hopeless_policy} "
+                f"(use {', '.join(Config.PRESCREEN_POLICIES)})"
+            )
+        
+        # Ciclo de vida do modelo (ver model_session)
+        self.keep_alive = Config.KEEP_ALIVE
+        self.warmup_seconds = None
+        self._sessions = 0
+        
+        # Streaming com parada no fim do JSON + tempo até o JSON completo
+        self.stream = Config.STREAM_RESPONSES
+        self.json_timings = JsonTimings()
+        
+        # Durações por estágio (p50/p95/p99), exportadas no fim do run
+        self.metrics = StageMetrics()
+        
+        # verify=False: quem cria verifica depois (AsyncVisionPipeline.start)
+        if verify:
+            self._verify_ollama()
     
     def _verify_ollama(self):
         """Verifica se Ollama está rodando e modelo disponível"""
         try:
-            models = ollama.list()
-            
-            # A API do Ollama retorna formato diferente dependendo da versão
-            # Tentar ambos os formatos
-            model_names = []
-            if isinstance(models, dict) and 'models' in models:
-                # Formato novo: {'models': [{'model': 'name:tag', ...}, ...]}
-                for m in models['models']:
-                    if isinstance(m, dict):
-                        # Tentar 'model' primeiro, depois 'name'
-                        name = m.get('model') or m.get('name', '')
-                        if name:
-                            model_names.append(name)
-            elif isinstance(models, list):
-                # Formato antigo: [{'name': 'model:tag', ...}, ...]
-                model_names = [m.get('name', '') for m in models if isinstance(m, dict)]
-            
-            # Verificar se modelo está instalado
-            # Aceitar match parcial (ex: 'llama3.2-vision' em 'llama3.2-vision:11b')
-            model_found = any(
-                self.model in name or name.startswith(self.model.split(':')[0])
-                for name in model_names
-            )
-            
-            if not model_found:
-                print(f"⚠️  Modelo {self.model} não encontrado.")
+            for model in self._missing_models(ollama.list()):
+                print(f"⚠️  Modelo {model} não encontrado.")
                 print(f"📥 Baixando modelo... (isso pode demorar alguns minutos)")
-                ollama.pull(self.model)
-                print(f"✅ Modelo {self.model} instalado com sucesso!")
+                ollama.pull(model)
+                print(f"✅ Modelo {model} instalado com sucesso!")
         except Exception as e:
-            raise RuntimeError(
-                f"❌ Erro ao conectar com Ollama: {e}\n"
-                f"Certifique-se que Ollama está instalado e rodando:\n"
-                f"  brew install ollama\n"
-                f"  ollama serve"
-            )
+            raise self._connection_error(e)
+    
+    def _missing_models(self, models) -> List[str]:
+        """Modelos do batch que não aparecem na listagem do Ollama"""
+        # A API do Ollama retorna formato diferente dependendo da versão
+        # Tentar ambos os formatos
+        model_names = []
+        if isinstance(models, dict) and 'models' in models:
+            # Formato novo: {'models': [{'model': 'name:tag', ...}, ...]}
+            for m in models['models']:
+                if isinstance(m, dict):
+                    # Tentar 'model' primeiro, depois 'name'
+                    name = m.get('model') or m.get('name', '')
+                    if name:
+                        model_names.append(name)
+        elif isinstance(models, list):
+            # Formato antigo: [{'name': 'model:tag', ...}, ...]
+            model_names = [m.get('name', '') for m in models if isinstance(m, dict)]
+        
+        # Aceitar match parcial (ex: 'llama3.2-vision' em 'llama3.2-vision:11b')
+        return [
+            model for model in self._session_models()
+            if not any(model in name or name.startswith(model.split(':')[0]) for name in model_names)
+        ]
+    
+    @staticmethod
+    def _connection_error(error: Exception) -> RuntimeError:
+        return RuntimeError(
+            f"❌ Erro ao conectar com Ollama: {error}\n"
+            f"Certifique-se que Ollama está instalado e rodando:\n"
+            f"  brew install ollama\n"
+            f"  ollama serve"
+        )
+    
+    def _session_models(self) -> List[str]:
+        """Modelos usados no batch (aquecidos e descarregados juntos)"""
+        return list(dict.fromkeys(m for m in (self.fast_model, self.model, self.text_model) if m))
+    
+    def warm_up(self) -> float:
+        """
+        Carrega os modelos na memória do Ollama (requisição vazia)
+        
+        Returns:
+            Segundos até os modelos ficarem prontos
+        """
+        total = time.perf_counter()
+        for model in self._session_models():
+            start = time.perf_counter()
+            ollama.generate(model=model, prompt='', keep_alive=self.keep_alive)
+            print(f"🔥 Modelo {model} carregado em {time.perf_counter() - start:.1f}s")
+        self.warmup_seconds = time.perf_counter() - total
+        return self.warmup_seconds
+    
+    def unload(self):
+        """Descarrega os modelos da memória do Ollama"""
+        for model in self._session_models():
+            ollama.generate(model=model, prompt='', keep_alive=0)
+            print(f"💤 Modelo {model} descarregado")
+    
+    @contextmanager
+    def model_session(self, warm_up: bool = None, unload: bool = None):
+        """
+        Mantém o modelo carregado durante um batch
+        
+        Aquece na entrada e descarrega na saída; sessões aninhadas só
+        aquecem/descarregam na mais externa.
+        
+        Args:
+            warm_up: Aquecer na entrada (padrão: Config.WARMUP_ON_START)
+            unload: Descarregar na saída (padrão: Config.UNLOAD_AFTER_BATCH)
+        """
+        if warm_up is None:
+            warm_up = Config.WARMUP_ON_START
+        if unload is None:
+            unload = Config.UNLOAD_AFTER_BATCH
+        
+        outermost = self._sessions == 0
+        self._sessions += 1
+        
+        try:
+            if outermost and warm_up:
+                try:
+                    self.warm_up()
+                except Exception as e:
+                    print(f"⚠️  Aquecimento do modelo falhou: {e}")
+            yield self
+        finally:
+            self._sessions -= 1
+            if outermost and unload:
+                try:
+                    self.unload()
+                except Exception as e:
+                    print(f"⚠️  Não foi possível descarregar o modelo: {e}")
     
     def process_image(self, image_path: str, file_id: str = None, source: str = "lightroom") -> AcquaplanMetadata:
         """
-        Processa uma imagem completa (Pass 1 + Pass 2)
+        Processa uma imagem completa (Pass 1 + Pass 2, ou passe único)
         
         Args:
             image_path: Caminho para a imagem
@@ -94,23 +287,226 @@ class VisionPipeline:
         if not image_path.exists():
             raise FileNotFoundError(f"Imagem não encontrada: {image_path}")
         
-        print(f"  🔍 Pass 1: Extração visual...")
-        raw_data = self.pass1_extraction(str(image_path))
+        entry = self.stage_entry(
+            file_id or str(image_path), source, image_path.name,
+            str(image_path.parent), file_fingerprint(image_path)
+        )
+        raw_data = self.staged(entry, 'pass1')
+        
+        if raw_data is not None:
+            print(f"  🧩 Pass 1 retomado do staging")
+        else:
+            quality, action = self.screen(str(image_path), str(image_path.parent))
+            if action == 'skip':
+                print(f"  ⏭️  Pré-triagem: {quality.reason}, sem chamada ao modelo")
+                return self.skipped_metadata(quality, file_id or str(image_path), source, image_path.name)
+            
+            if self.mode == 'single_pass':
+                print(f"  🔍 Passe único: extração + normalização...")
+            else:
+                print(f"  🔍 Pass 1: Extração visual...")
+            
+            def run_pass1() -> Dict:
+                with self.metrics.timed('pass1'):
+                    return self.apply_prescreen(self.pass1_extraction(str(image_path)), quality)
+            
+            raw_data = self.run_pass(entry, 'pass1', run_pass1)
+        
+        if self.mode != 'single_pass':
+            print(f"  🧹 Pass 2: Normalização ({self.normalizer_profile})...")
+        normalized = self.staged(entry, 'pass2', raw_data)
         
-        print(f"  🧹 Pass 2: Normalização...")
-        normalized = self.pass2_normalization(raw_data)
+        if normalized is None:
+            def run_pass2() -> Dict:
+                with self.metrics.timed('pass2'):
+                    return self.pass2_normalization(raw_data)
+            
+            normalized = self.run_pass(entry, 'pass2', run_pass2, raw_data)
         
         print(f"  📦 Construindo metadados...")
-        metadata = self._build_metadata(
-            raw_data=raw_data,
-            normalized=normalized,
-            file_id=file_id or str(image_path),
-            source=source,
-            filename=image_path.name
-        )
+        with self.metrics.timed('build_metadata'):
+            metadata = self._build_metadata(
+                raw_data=raw_data,
+                normalized=normalized,
+                file_id=file_id or str(image_path),
+                source=source,
+                filename=image_path.name
+            )
         
+        # Sem sink aqui: quem chama recebe os metadados, o staging já pode sair
+        self.complete_staged(entry)
         return metadata
     
+    def stage_entry(
+        self,
+        file_id: str,
+        source: str,
+        filename: str,
+        folder: str,
+        fingerprint: str = ''
+    ) -> Optional[Dict]:
+        """Identificação da imagem no staging (None com o staging desativado)"""
+        if self.staging is None:
+            return None
+        return {
+            'key': PassStaging.make_key(source, file_id),
+            'source': source,
+            'file_id': file_id,
+            'filename': filename,
+            'folder': folder,
+            'fingerprint': fingerprint,
+        }
+    
+    def staged(self, entry: Optional[Dict], stage: str, raw_data: Dict = None) -> Optional[Dict]:
+        """Saída do passe gravada numa execução anterior (None: precisa rodar)"""
+        if entry is None:
+            return None
+        return self.staging.get(
+            entry['key'], stage, self._staging_signature(stage, raw_data), entry['fingerprint']
+        )
+    
+    def run_pass(
+        self,
+        entry: Optional[Dict],
+        stage: str,
+        run: Callable[[], Dict],
+        raw_data: Dict = None,
+        retry: bool = True
+    ) -> Dict:
+        """
+        Executa um passe com retry e grava a saída (ou a falha) no staging
+        
+        Saídas parciais (campos faltando) não são gravadas: a imagem é refeita
+        por inteiro na próxima execução, como no cache de inferência.
+        
+        Args:
+            entry: stage_entry() da imagem
+            stage: 'pass1' ou 'pass2'
+            run: Executa o passe e retorna a saída
+            raw_data: Saída do Pass 1 (assinatura do Pass 2)
+            retry: False quando `run` já repete por conta própria
+        """
+        try:
+            data = self.with_retry(stage, run) if retry else run()
+        except Exception as e:
+            if entry is not None:
+                self.staging.fail(entry['key'], stage, e, entry)
+            raise
+        
+        if entry is not None and MISSING_FIELDS_KEY not in data:
+            self.staging.put(entry['key'], stage, self._staging_signature(stage, raw_data), data, entry)
+        return data
+    
+    def with_retry(self, stage: str, run: Callable[[], Dict]) -> Dict:
+        """
+        Até Config.RETRY_ATTEMPTS tentativas, com backoff exponencial entre elas
+        
+        Arquivo inexistente não melhora esperando: sobe direto.
+        """
+        attempts = max(1, Config.RETRY_ATTEMPTS)
+        for attempt in range(1, attempts + 1):
+            try:
+                return run()
+            except FileNotFoundError:
+                raise
+            except Exception as e:
+                if attempt == attempts:
+                    raise
+                delay = backoff_delay(attempt)
+                with self._retry_lock:
+                    self.retries += 1
+                print(f"  🔁 {stage}: tentativa {attempt}/{attempts} falhou ({e}); nova tentativa em {delay:.1f}s")
+                time.sleep(delay)
+    
+    def complete_staged(self, entry: Optional[Dict]):
+        """Imagem gravada no destino: descarta as saídas intermediárias"""
+        if entry is not None:
+            self.staging.complete(entry['key'])
+    
+    def _staging_signature(self, stage: str, raw_data: Dict = None) -> str:
+        """
+        O que precisa bater para reaproveitar uma saída do staging
+        
+        Pass 2 inclui o hash da saída do Pass 1 que o alimentou: Pass 1 refeito
+        (outro modelo, arquivo alterado) invalida o Pass 2 gravado. O
+        vocabulário (full/compact) e a versão do schema mudam o formato da
+        saída gravada e entram nos dois.
+        """
+        versions = [self.vocabulary_mode, Config.PROMPT_VERSION, SCHEMA_VERSION]
+        if stage == 'pass1':
+            parts = [self.mode, self.model, self.fast_model or ''] + versions
+        else:
+            content = json.dumps(self._model_view(raw_data or {}), sort_keys=True, ensure_ascii=False, default=str)
+            parts = [self.mode, self.text_model, self.normalizer_profile] + versions + [
+                hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+            ]
+        return '|'.join(parts)
+    
+    def screen(
+        self,
+        image_path: str,
+        folder: str = "",
+        report: Optional[QualityReport] = None
+    ) -> Tuple[Optional[QualityReport], Optional[str]]:
+        """
+        Pré-triagem de uma imagem (registrada em prescreen_stats)
+        
+        Args:
+            report: Relatório já medido para esta imagem (não mede de novo)
+        
+        Returns:
+            (relatório ou None se desativada/ilegível, ação para frame sem
+            salvação: 'skip', 'defer' ou None para seguir ao modelo)
+        """
+        if self.prescreen is None:
+            return None, None
+        
+        if report is None:
+            try:
+                with self.metrics.timed('prescreen'):
+                    report = self.prescreen.assess(image_path)
+            except Exception:
+                return None, None
+        
+        action = None
+        if report.hopeless and self.hopeless_policy != 'process':
+            action = self.hopeless_policy
+        self.prescreen_stats.record(folder, report, action)
+        return report, action
+    
+    @staticmethod
+    def apply_prescreen(raw_data: Dict, quality: Optional[QualityReport]) -> Dict:
+        """technical_quality da pré-triagem substitui o palpite do modelo"""
+        if quality is None:
+            return raw_data
+        return dict(raw_data, technical_quality=quality.quality)
+    
+    def skipped_metadata(
+        self,
+        quality: QualityReport,
+        file_id: str,
+        source: str,
+        filename: str
+    ) -> AcquaplanMetadata:
+        """Metadados de um frame descartado na pré-triagem (só a qualidade técnica)"""
+        return AcquaplanMetadata(
+            file_id=file_id,
+            source=source,
+            original_filename=filename,
+            title='',
+            description_short='',
+            description_long='',
+            habitat_guess='',
+            habitat_confidence=0.0,
+            habitat_evidence='',
+            keywords=[f"tecnica:{quality.quality}"],
+            technical_quality=quality.quality,
+            processing_timestamp=datetime.now().isoformat(),
+            processing_mode=self.mode,
+            status='skipped',
+            skip_reason=quality.reason
+        )
+    
     def pass1_extraction(self, image_path: str) -> Dict:
         """
         Pass 1: Extração bruta de informações da imagem
@@ -118,197 +514,653 @@ class VisionPipeline:
         Returns:
             Dict com dados brutos do modelo
         """
-        # Preparar prompt
-        habitats_list = ", ".join([h.value for h in Habitat])
+        if self.fast_model is None:
+            return self._pass1_tier(image_path, self.model)
+        
+        # Cascata: modelo rápido primeiro
+        start = time.perf_counter()
+        fast_calls = []
+        try:
+            json_data = self._pass1_tier(image_path, self.fast_model, stage='pass1_fast')
+            fast_calls = json_data.get(TELEMETRY_KEY, [])
+            reason = escalation_reason(json_data, MISSING_FIELDS_KEY in json_data)
+        except Exception:
+            reason = escalation_reason(None)
+        self.cascade_stats.record('fast', time.perf_counter() - start, reason)
+        
+        if reason is None:
+            return json_data
+        
+        print(f"  ⬆️  Escalando para {self.model} ({reason})")
+        start = time.perf_counter()
+        json_data = self._pass1_tier(image_path, self.model)
+        self.cascade_stats.record('large', time.perf_counter() - start)
+        if fast_calls:
+            json_data[TELEMETRY_KEY] = fast_calls + json_data.get(TELEMETRY_KEY, [])
+        return json_data
+    
+    def _pass1_tier(self, image_path: str, model: str, stage: str = 'pass1') -> Dict:
+        """
+        Pass 1 em um modelo (cache + chamada + expansão)
+        
+        No modelo rápido da cascata não há continuação: resposta incompleta
+        escalona direto para o modelo grande.
+        """
+        cache_key = self._pass1_cache_key(image_path, model)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return self._expand(cached)
+        
+        request = dict(self._pass1_request(self._prepare_input(image_path)), model=model)
+        
+        try:
+            json_data = self._chat_json(
+                request, stage,
+                required=self._pass1_required_fields(),
+                continuation=model != self.fast_model
+            )
+        except Exception as e:
+            raise RuntimeError(f"Erro no Pass 1 (extração): {e}")
+        
+        calls = json_data.pop(TELEMETRY_KEY, [])
+        if MISSING_FIELDS_KEY not in json_data:
+            self._cache_put(cache_key, 'pass1', json_data, model)
+        return self._with_telemetry(self._expand(json_data), calls)
+    
+    def _pass1_required_fields(self) -> List[str]:
+        """Campos essenciais da resposta do Pass 1 (nomes compactos no vocabulário compact)"""
+        if self.vocabulary is not None:
+            return self.vocabulary.required(self.mode)
+        return SINGLE_PASS_REQUIRED_FIELDS if self.mode == 'single_pass' else PASS1_REQUIRED_FIELDS
+    
+    def _expand(self, json_data: Dict) -> Dict:
+        """
+        Resposta compacta -> campos completos
+        
+        Expandida já na saída do Pass 1 (o cache guarda a forma compacta), para
+        que Pass 2, normalizador local e _build_metadata vejam o mesmo dict.
+        """
+        if self.vocabulary is None:
+            return json_data
+        return self.vocabulary.expand(json_data, self.mode)
+    
+    def _prepare_input(self, image_path: str) -> str:
+        """
+        Pré-processamento do Pass 1: imagem reduzida ao tamanho do modelo
+        
+        Returns:
+            Caminho da miniatura em cache (ou o original se não se aplicar)
+        """
+        if self.preprocessor is None:
+            return image_path
+        
+        if Path(image_path).suffix.lower() not in Config.PREPROCESS_EXTENSIONS:
+            return image_path
+        
+        try:
+            with self.metrics.timed('preprocess'):
+                return self.preprocessor.prepare(image_path)
+        except Exception as e:
+            print(f"  ⚠️  Pré-processamento falhou ({e}), enviando original")
+            return image_path
+    
+    def _pass1_request(self, image_path: str) -> Dict:
+        """Monta a requisição do Pass 1 (compartilhada com o AsyncVisionPipeline)"""
+        if self.vocabulary is not None:
+            return self._compact_request(image_path)
+        
+        if self.mode == 'single_pass':
+            return self._single_pass_request(image_path)
         
         # Prompt v1.4 melhorado
         if USE_V14_PROMPTS:
-            prompt = EXTRACTION_PROMPT_V14.format(habitats=habitats_list)
+            habitats_list = ", ".join([h.value for h in Habitat])
+            instructions = EXTRACTION_PROMPT_V14.format(habitats=habitats_list)
         else:
-            # Prompt melhorado inline (sem caracteres especiais)
-            prompt = f"""Voce e um ecologo marinho especializado em ecossistemas costeiros brasileiros.
+            # Formato e vocabulários vêm do schema (format=...), o prompt só instrui
+            instructions = """Voce e um ecologo marinho especializado em ecossistemas costeiros brasileiros.
 
-Analise esta imagem CIENTIFICAMENTE e retorne JSON VALIDO.
+Analise a imagem CIENTIFICAMENTE e preencha o JSON.
+
+Instrucoes CRITICAS:
+1. Identifique elementos VISIVEIS (nao invente)
+2. habitat_guess: o MAIS ESPECIFICO; manguezal NAO e praia
+3. Especies: seja CONSERVADOR - confianca <0.5 NAO entra; na duvida use nivel taxonomico superior
+4. scene_summary: 2-3 frases objetivas; evidence: caracteristicas VISIVEIS
+5. keywords_raw: cores, elementos, texturas, clima, tecnica (ex.: "cores: azul_claro")"""
+        
+        return self._request(
+            instructions,
+            "Analise esta imagem. APENAS O JSON:",
+            images=[image_path],
+            schema=pass1_schema(),
+            options={
+                'temperature': 0.3,  # Um pouco mais criativo (era 0.1)
+                'num_predict': 3072,  # Mais tokens para keywords ricas (era 2048)
+                'top_p': 0.9,
+                'top_k': 40,
+            }
+        )
+    
+    def _single_pass_request(self, image_path: str) -> Dict:
+        """Requisição do passe único: campos do Pass 1 e do Pass 2 numa resposta"""
+        instructions = """Voce e um ecologo marinho especializado em ecossistemas costeiros brasileiros
+e em catalogacao cientifica.
 
-HABITATS VALIDOS: {habitats_list}
+Analise a imagem CIENTIFICAMENTE e preencha o JSON com os metadados finais.
 
 Instrucoes CRITICAS:
 1. Identifique elementos VISIVEIS (nao invente)
-2. Para especies: seja CONSERVADOR - se nao tiver certeza, use nivel taxonomico superior  
-3. Keywords: MINIMO 40 palavras (cores, elementos, texturas, condicoes)
+2. habitat_guess: o MAIS ESPECIFICO; manguezal NAO e praia
+3. Especies: seja CONSERVADOR - confianca <0.5 NAO entra; na duvida use nivel taxonomico superior
+4. title: 5-8 palavras; description_short: 1 frase (20-30 palavras); description_long: 2-4 frases com contexto ecologico
+5. keywords_normalized: categoria:valor sem duplicatas (ex.: bioma:manguezal, fauna:rhizophora_mangle)
+   Categorias: bioma, geomorfologia, fauna, flora, atividade, clima, tecnica, conservacao, cores, elementos"""
+        
+        return self._request(
+            instructions,
+            "Analise esta imagem. APENAS O JSON:",
+            images=[image_path],
+            schema=pass1_schema('single_pass'),
+            options={
+                'temperature': 0.3,
+                'num_predict': 4096,  # Pass 1 + Pass 2 numa resposta só
+                'top_p': 0.9,
+                'top_k': 40,
+            }
+        )
+    
+    def _compact_request(self, image_path: str) -> Dict:
+        """Pass 1 / passe único com vocabulário compacto (códigos expandidos localmente)"""
+        single = self.mode == 'single_pass'
+        texts = (
+            "\nt: titulo 5-8 palavras | ds: 1 frase (20-30 palavras) | "
+            "dl: 2-4 frases com contexto ecologico"
+        ) if single else ""
+        
+        instructions = f"""Voce e um ecologo marinho especializado em ecossistemas costeiros brasileiros.
 
-RETORNE APENAS JSON:
-{{
-  "scene_summary": "Descricao objetiva em 2-3 frases",
-  "habitat_guess": "O MAIS ESPECIFICO dos habitats",
-  "habitat_confidence": 0.85,
-  "habitat_evidence": "Elementos VISIVEIS que justificam",
-  "species_candidates": [
-    {{
-      "name_pt": "Nome popular EM PORTUGUES",
-      "name_scientific": "Genus species OU ordem Ordem",
-      "confidence": 0.75,
-      "evidence": "Caracteristicas morfologicas VISIVEIS",
-      "taxonomy_level": "species|genus|family|order"
-    }}
-  ],
-  "archaeology_flags": [],
-  "archaeology_evidence": "",
-  "activities": [],
-  "technical_quality": "sharp|blurred|underexposed|overexposed",
-  "keywords_raw": [
-    "MINIMO 40 keywords:",
-    "cores: azul_claro, verde_escuro",
-    "elementos: agua, vegetacao, areia",
-    "clima: ceu_claro, mare_baixa",
-    "tecnica: aerea, panoramica, HDR"
-  ]
-}}
+Analise a imagem CIENTIFICAMENTE e preencha o JSON usando os CODIGOS abaixo.
 
-IMPORTANTE:
-- Se nao identificar especie com confianca >50 porcento NAO invente
-- Se ve manguezal NAO classifique como praia
-- Use MINIMO 40 keywords descritivas
+Instrucoes CRITICAS:
+1. Identifique elementos VISIVEIS (nao invente)
+2. h: o habitat MAIS ESPECIFICO; manguezal NAO e praia
+3. Especies: seja CONSERVADOR - confianca <0.5 NAO entra; na duvida use nivel taxonomico superior
+4. Texto livre curto: so o que os codigos nao cobrem
 
-APENAS O JSON:"""
+{self.vocabulary.prompt_table()}{texts}"""
         
-        try:
-            response = ollama.chat(
-                model=self.model,
-                messages=[{
-                    'role': 'user',
-                    'content': prompt,
-                    'images': [image_path]
-                }],
-                options={
-                    'temperature': 0.3,  # Um pouco mais criativo (era 0.1)
-                    'num_predict': 3072,  # Mais tokens para keywords ricas (era 2048)
-                    'top_p': 0.9,
-                    'top_k': 40,
-                },
-                format='json'  # Forçar formato JSON
-            )
-            
-            # Extrair JSON da resposta
-            raw_text = response['message']['content']
-            json_data = self._extract_json(raw_text)
-            
-            return json_data
-            
-        except Exception as e:
-            raise RuntimeError(f"Erro no Pass 1 (extração): {e}")
+        return self._request(
+            instructions,
+            "Analise esta imagem. APENAS O JSON:",
+            images=[image_path],
+            schema=self.vocabulary.schema(self.mode),
+            options={
+                'temperature': 0.3,
+                'num_predict': 2048 if single else 1536,  # Códigos: resposta bem menor
+                'top_p': 0.9,
+                'top_k': 40,
+            }
+        )
     
     def pass2_normalization(self, raw_data: Dict) -> Dict:
         """
         Pass 2: Normaliza e refina os dados brutos
         
+        No modo single_pass os campos já vieram do passe único e no perfil
+        fast o KeywordNormalizer faz tudo: nenhum dos dois chama o modelo.
+        
         Args:
             raw_data: Saída do pass1_extraction
         
         Returns:
             Dict com dados normalizados
         """
-        # Prompt melhorado para normalização
-        if USE_V14_PROMPTS:
-            prompt = NORMALIZATION_PROMPT_V14.format(
-                raw_data=json.dumps(raw_data, indent=2, ensure_ascii=False)
+        local = self._local_normalization(raw_data)
+        if local is not None:
+            return local
+        
+        cache_key = self._pass2_cache_key(raw_data)
+        normalized = self._cache_get(cache_key)
+        calls = []
+        
+        if normalized is None:
+            request = self._pass2_request(raw_data)
+            
+            try:
+                normalized = self._chat_json(request, 'pass2', required=self._pass2_required_fields())
+            except Exception as e:
+                raise RuntimeError(f"Erro no Pass 2 (normalização): {e}")
+            
+            calls = normalized.pop(TELEMETRY_KEY, [])
+            if self._pass2_cacheable(normalized):
+                self._cache_put(cache_key, 'pass2', normalized, self.text_model)
+        
+        return self._with_telemetry(self._merge_normalization(raw_data, normalized), calls)
+    
+    def _pass2_cacheable(self, normalized: Dict) -> bool:
+        """Resposta inteira: sem campos faltando nem listas abaixo do mínimo do schema"""
+        return (
+            MISSING_FIELDS_KEY not in normalized
+            and not short_lists(normalized, self._pass2_required_fields())
+        )
+    
+    def pass2_normalization_batch(self, raw_items: List[Dict]) -> List[Optional[Dict]]:
+        """
+        Pass 2 em lote: uma chamada ao modelo para várias imagens
+        
+        Cada imagem recebe um ID no prompt e a resposta é um objeto por ID.
+        
+        Args:
+            raw_items: Saídas do pass1_extraction
+        
+        Returns:
+            Dados normalizados na mesma ordem; None onde a resposta do lote veio
+            faltando, malformada ou possivelmente cortada (o chamador refaz essa
+            imagem sozinha)
+        """
+        results: List[Optional[Dict]] = [None] * len(raw_items)
+        keys = [self._pass2_cache_key(raw_data) for raw_data in raw_items]
+        missing = {}
+        
+        for idx, (raw_data, cache_key) in enumerate(zip(raw_items, keys)):
+            local = self._local_normalization(raw_data)
+            if local is None:
+                cached = self._cache_get(cache_key)
+                if cached is not None:
+                    local = self._merge_normalization(raw_data, cached)
+            
+            if local is not None:
+                results[idx] = local
+            else:
+                missing[f"img_{idx}"] = idx
+        
+        if not missing:
+            return results
+        
+        request = self._pass2_batch_request({
+            image_id: self._model_view(raw_items[idx]) for image_id, idx in missing.items()
+        })
+        
+        try:
+            batch = self._chat_json(request, 'pass2_batch')
+        except Exception as e:
+            print(f"  ⚠️  Pass 2 em lote falhou ({e}), refazendo por imagem")
+            return results
+        
+        # Tokens e tempos da chamada divididos entre as imagens do lote
+        calls = share_calls(batch.pop(TELEMETRY_KEY, []), len(missing))
+        # JSON reparado: o último objeto escrito pode ter sido cortado no meio
+        # (ex.: keywords pela metade); os anteriores foram fechados no texto
+        repaired = bool(batch.pop(MISSING_FIELDS_KEY, None))
+        if isinstance(batch, dict) and isinstance(batch.get('results'), dict):
+            batch = batch['results']
+        if not isinstance(batch, dict):
+            return results
+        
+        suspect = list(batch)[-1:] if repaired else []
+        required = self._pass2_required_fields()
+        for image_id, idx in missing.items():
+            normalized = batch.get(image_id)
+            if image_id in suspect or not isinstance(normalized, dict):
+                continue
+            if any(not normalized.get(f) for f in required) or not self._pass2_cacheable(normalized):
+                continue
+            
+            self._cache_put(keys[idx], 'pass2', normalized, self.text_model)
+            results[idx] = self._with_telemetry(
+                self._merge_normalization(raw_items[idx], normalized), calls
             )
-        else:
-            # Prompt inline melhorado
-            prompt = f"""Voce e um especialista em catalogacao cientifica.
+        
+        return results
+    
+    def _pass2_required_fields(self) -> List[str]:
+        """Campos que toda resposta do Pass 2 precisa trazer (validação do lote)"""
+        if self.normalizer_profile == 'hybrid':
+            return ['description_short', 'description_long']
+        return ['title', 'description_short', 'description_long', 'keywords_normalized']
+    
+    def _pass2_batch_request(self, raw_by_id: Dict[str, Dict]) -> Dict:
+        """Requisição do Pass 2 em lote: instruções uma vez, dados de cada imagem por ID"""
+        fields = self._pass2_required_fields()
+        
+        instructions = f"""Voce e um especialista em catalogacao cientifica.
 
-Refine estes metadados:
+Refine os metadados de CADA imagem recebida (um objeto por ID, use exatamente os IDs recebidos).
+As imagens sao independentes.
 
-DADOS BRUTOS:
-{json.dumps(raw_data, indent=2, ensure_ascii=False)}
+{PASS2_TASKS}
+
+Gere apenas os campos: {', '.join(fields)}"""
+        
+        per_image = 512 if self.normalizer_profile == 'hybrid' else 2048
+        
+        return self._request(
+            instructions,
+            f"DADOS BRUTOS POR ID:\n{json.dumps(raw_by_id, indent=2, ensure_ascii=False)}\n\nAPENAS JSON:",
+            schema=pass2_batch_schema(list(raw_by_id), fields),
+            options={
+                'temperature': 0.4,
+                'num_predict': per_image * len(raw_by_id),
+                'num_ctx': Config.PASS2_BATCH_NUM_CTX,
+                'top_p': 0.9,
+            }
+        )
+    
+    def _local_normalization(self, raw_data: Dict) -> Optional[Dict]:
+        """Pass 2 sem modelo (single_pass ou perfil fast); None = precisa do modelo"""
+        if self.mode == 'single_pass':
+            return {
+                key: raw_data.get(key, [] if key == 'keywords_normalized' else '')
+                for key in ('title', 'description_short', 'description_long', 'keywords_normalized')
+            }
+        
+        if self.normalizer_profile == 'fast':
+            return self.normalizer.normalize(raw_data)
+        
+        return None
+    
+    def _merge_normalization(self, raw_data: Dict, normalized: Dict) -> Dict:
+        """Perfil hybrid: descrições do modelo, título e keywords das regras locais"""
+        if self.normalizer_profile != 'hybrid':
+            return normalized
+        
+        local = self.normalizer.normalize(raw_data)
+        for key in ('description_short', 'description_long'):
+            if normalized.get(key):
+                local[key] = normalized[key]
+        return local
+    
+    def _pass2_request(self, raw_data: Dict) -> Dict:
+        """Monta a requisição do Pass 2 (compartilhada com o AsyncVisionPipeline)"""
+        if self.normalizer_profile == 'hybrid':
+            return self._prose_request(raw_data)
+        
+        options = {
+            'temperature': 0.4,  # Mais criativo para keywords (era 0.1)
+            'num_predict': 2048,  # Mais tokens (era 1024)
+            'top_p': 0.9,
+        }
+        
+        # Prompt melhorado para normalização
+        if USE_V14_PROMPTS:
+            # Template externo intercala os dados: vai inteiro na mensagem do usuário
+            return self._request(
+                None,
+                NORMALIZATION_PROMPT_V14.format(
+                    raw_data=json.dumps(self._model_view(raw_data), indent=2, ensure_ascii=False)
+                ),
+                schema=pass2_schema(),
+                options=options
+            )
+        
+        # Prompt inline melhorado
+        instructions = f"""Voce e um especialista em catalogacao cientifica.
 
-TAREFAS:
-1. Titulo conciso (5-8 palavras)
-2. Descricao curta (1 frase, 20-30 palavras)
-3. Descricao longa (2-4 frases, 60-100 palavras)
-4. Normalizar keywords para 50-80 termos hierarquicos
+Refine os metadados recebidos (DADOS BRUTOS).
 
-CATEGORIAS: bioma, geomorfologia, fauna, flora, atividade, clima, tecnica, conservacao, cores, elementos
+{PASS2_TASKS}"""
+        
+        return self._request(
+            instructions,
+            f"DADOS BRUTOS:\n{json.dumps(self._model_view(raw_data), indent=2, ensure_ascii=False)}\n\nAPENAS JSON:",
+            schema=pass2_schema(),
+            options=options
+        )
+    
+    def _prose_request(self, raw_data: Dict) -> Dict:
+        """Pass 2 do perfil hybrid: só as descrições (keywords ficam com as regras)"""
+        prose_input = {
+            key: raw_data.get(key)
+            for key in ('scene_summary', 'habitat_guess', 'habitat_evidence',
+                        'species_candidates', 'archaeology_flags', 'activities')
+        }
+        
+        instructions = """Voce e um especialista em catalogacao cientifica.
 
-RETORNE APENAS JSON:
-{{
-  "title": "Titulo de 5-8 palavras",
-  "description_short": "1 frase impactante",
-  "description_long": "2-4 frases detalhadas com contexto ecologico",
-  "keywords_normalized": [
-    "50-80 keywords no formato categoria:valor",
-    "Exemplo: bioma:manguezal",
-    "Exemplo: fauna:rhizophora_mangle",
-    "Inclua TODAS categorias relevantes",
-    "Balance categorias",
-    "Remova duplicatas"
-  ]
-}}
+Escreva as descricoes de uma imagem a partir dos DADOS recebidos.
 
-APENAS JSON:"""
+description_short: 1 frase impactante (20-30 palavras)
+description_long: 2-4 frases com contexto ecologico (60-100 palavras)"""
         
-        try:
-            response = ollama.chat(
-                model=self.model,
-                messages=[{
-                    'role': 'user',
-                    'content': prompt
-                }],
-                options={
-                    'temperature': 0.4,  # Mais criativo para keywords (era 0.1)
-                    'num_predict': 2048,  # Mais tokens (era 1024)
-                    'top_p': 0.9,
-                },
-                format='json'  # Forçar JSON
-            )
-            
-            raw_text = response['message']['content']
-            normalized = self._extract_json(raw_text)
+        return self._request(
+            instructions,
+            f"DADOS:\n{json.dumps(prose_input, indent=2, ensure_ascii=False)}\n\nAPENAS JSON:",
+            schema=pass2_schema(['description_short', 'description_long']),
+            options={
+                'temperature': 0.4,
+                'num_predict': 512,  # Sem keywords: resposta curta
+                'top_p': 0.9,
+            }
+        )
+    
+    def _request(
+        self,
+        instructions: Optional[str],
+        content: str,
+        options: Dict,
+        images: List[str] = None,
+        schema: Dict = None
+    ) -> Dict:
+        """
+        Requisição com prefixo estável
+        
+        As instruções fixas vão na mensagem de sistema (idênticas entre imagens,
+        o servidor reaproveita o prefixo já processado); os dados da imagem vêm
+        por último na mensagem do usuário. O formato da resposta é imposto pelo
+        JSON Schema (structured outputs), não por exemplos no prompt.
+        
+        Requisições com imagem vão ao modelo de visão; as só de texto (Pass 2)
+        ao self.text_model.
+        """
+        messages = [{'role': 'system', 'content': instructions}] if instructions else []
+        
+        user = {'role': 'user', 'content': content}
+        if images:
+            user['images'] = images
+        messages.append(user)
+        
+        return {
+            'model': self.model if images else self.text_model,
+            'messages': messages,
+            'options': options,
+            'format': schema or 'json',
+            'keep_alive': self.keep_alive
+        }
+    
+    def _chat_json(
+        self,
+        request: Dict,
+        stage: str,
+        required: List[str] = None,
+        continuation: bool = True
+    ) -> Dict:
+        """
+        Chama o modelo e devolve o JSON da resposta
+        
+        JSON cortado é reparado (campos completos são mantidos); se faltar
+        algum campo de `required`, uma continuação pede só esses campos.
+        O que ainda faltar fica em MISSING_FIELDS_KEY (status partial) e as
+        chamadas feitas, em TELEMETRY_KEY.
+        """
+        data, missing, calls = self._chat_once(request, stage, required)
+        
+        if missing and continuation and Config.REPAIR_CONTINUATION:
+            print(f"  🩹 Resposta incompleta, pedindo só: {', '.join(missing)}")
+            try:
+                extra, _, more = self._chat_once(
+                    self._continuation_request(request, data, missing), f"{stage}_cont"
+                )
+                calls += more
+            except Exception as e:
+                print(f"  ⚠️  Continuação falhou: {e}")
+                extra = {}
+            missing = self._apply_continuation(data, extra, missing)
+        
+        if missing:
+            data[MISSING_FIELDS_KEY] = missing
+        data[TELEMETRY_KEY] = calls
+        return data
+    
+    def _chat_once(self, request: Dict, stage: str, required: List[str] = None):
+        """
+        Uma chamada ao modelo
+        
+        Com streaming, lê os pedaços num JsonObjectScanner; depois que o
+        objeto raiz termina, espera até Config.STREAM_DONE_WAIT pelo pedaço
+        final (done, com os totais do Ollama) e só então fecha a conexão (o
+        Ollama interrompe a geração).
+        
+        Returns:
+            (dados, campos faltando ou cortados, [registro da chamada])
+        """
+        start = time.perf_counter()
+        first_token = None
+        
+        if not self.stream:
+            response = ollama.chat(**request)
+            text, early_stop = response['message']['content'], False
+            chunks, final = None, response
+        else:
+            scanner = JsonObjectScanner()
+            chunks, final, closed_at, early_stop = 0, None, None, False
+            stream = ollama.chat(**request, stream=True)
             
-            return normalized
+            try:
+                for chunk in stream:
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    chunks += 1
+                    if scanner.feed(chunk['message']['content']) and closed_at is None:
+                        closed_at = time.perf_counter()
+                    # Totais do Ollama só vêm no pedaço final (done)
+                    if chunk.get('done'):
+                        final = chunk
+                        break
+                    if closed_at is not None and time.perf_counter() - closed_at > Config.STREAM_DONE_WAIT:
+                        # O modelo seguia gerando depois do '}': a geração é interrompida
+                        early_stop = True
+                        break
+            finally:
+                stream.close()
             
-        except Exception as e:
-            raise RuntimeError(f"Erro no Pass 2 (normalização): {e}")
+            text = scanner.text
+        
+        elapsed = time.perf_counter() - start
+        # eval_count da resposta final; sem ela, pedaços recebidos (~1 token cada)
+        tokens = final.get('eval_count') if final is not None else chunks
+        self.json_timings.record(stage, elapsed, early_stop, tokens)
+        call = call_record(stage, request['model'], final, elapsed, first_token, chunks)
+        return self._parse_response(text, required) + ([call],)
     
-    def _extract_json(self, text: str) -> Dict:
-        """Extrai JSON de texto que pode conter markdown ou texto extra"""
+    def _parse_response(self, text: str, required: List[str] = None):
+        """JSON da resposta (reparando se veio cortado) + campos faltando"""
+        with self.metrics.timed('json_parse'):
+            try:
+                data, incomplete = self._extract_json(text), []
+            except ValueError:
+                data, truncated_key = repair_truncated_json(text)
+                if data is None:
+                    raise
+                incomplete = [truncated_key] if truncated_key else []
         
-        # Primeiro: tentar parsear direto (caso ideal)
-        try:
-            return json.loads(text.strip())
-        except:
-            pass
+        missing = [f for f in (required or []) if f not in data]
+        return data, missing + [f for f in incomplete if f not in missing]
+    
+    @staticmethod
+    def _continuation_request(request: Dict, partial: Dict, missing: List[str]) -> Dict:
+        """Repete a conversa (mesmo prefixo) e pede apenas os campos que faltam"""
+        continuation = dict(request)
+        if isinstance(request.get('format'), dict):
+            continuation['format'] = subset_schema(request['format'], missing)
+        continuation['messages'] = request['messages'] + [
+            {'role': 'assistant', 'content': json.dumps(partial, ensure_ascii=False)},
+            {
+                'role': 'user',
+                'content': (
+                    "A resposta anterior ficou incompleta. Retorne APENAS JSON "
+                    f"com os campos: {', '.join(missing)}"
+                )
+            }
+        ]
+        return continuation
+    
+    @staticmethod
+    def _apply_continuation(data: Dict, extra: Dict, missing: List[str]) -> List[str]:
+        """Copia os campos recebidos na continuação; devolve os que ainda faltam"""
+        for field_name in missing:
+            if field_name in extra:
+                data[field_name] = extra[field_name]
+        return [f for f in missing if f not in extra]
+    
+    @staticmethod
+    def _model_view(raw_data: Dict) -> Dict:
+        """Dados do Pass 1 sem as chaves internas (o que vai no prompt)"""
+        return {k: v for k, v in raw_data.items() if k not in (MISSING_FIELDS_KEY, TELEMETRY_KEY)}
+    
+    @staticmethod
+    def _with_telemetry(data: Dict, calls: List[Dict]) -> Dict:
+        """Anexa as chamadas ao resultado (cache hit e normalização local: nenhuma)"""
+        if calls:
+            data[TELEMETRY_KEY] = data.get(TELEMETRY_KEY, []) + calls
+        return data
+    
+    def _pass1_cache_key(self, image_path: str, model: str = None) -> Optional[str]:
+        """Chave do Pass 1: bytes da imagem original + requisição"""
+        if self.cache is None:
+            return None
+        
+        if self.preprocessor is not None:
+            content_hash = self.preprocessor.content_hash(Path(image_path))
+            input_size = self.preprocessor.max_size
+        else:
+            content_hash = compute_content_hash(Path(image_path))
+            input_size = None
+        
+        request = dict(self._pass1_request(image_path), model=model or self.model)
+        return InferenceCache.make_key(
+            'pass1', content_hash, request, input_size=input_size,
+            vocabulary=self.vocabulary_mode, schema_version=SCHEMA_VERSION
+        )
+    
+    def _pass2_cache_key(self, raw_data: Dict) -> Optional[str]:
+        """Chave do Pass 2: conteúdo da saída do Pass 1 + requisição"""
+        if self.cache is None:
+            return None
         
-        # Remover markdown code blocks
-        text = re.sub(r'```json\s*', '', text)
-        text = re.sub(r'```\s*', '', text)
+        # Telemetria muda a cada execução: fora da chave
+        content = {k: v for k, v in raw_data.items() if k != TELEMETRY_KEY}
+        content_hash = hashlib.sha256(
+            json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
         
-        # Tentar novamente após remover markdown
+        return InferenceCache.make_key(
+            'pass2', content_hash, self._pass2_request(raw_data),
+            vocabulary=self.vocabulary_mode, schema_version=SCHEMA_VERSION
+        )
+    
+    def _cache_get(self, cache_key: Optional[str]) -> Optional[Dict]:
+        return self.cache.get(cache_key) if cache_key else None
+    
+    def _cache_put(self, cache_key: Optional[str], stage: str, payload: Dict, model: str = None):
+        if cache_key:
+            self.cache.put(cache_key, stage, model or self.model, payload)
+    
+    def _extract_json(self, text: str) -> Dict:
+        """
+        JSON da resposta
+        
+        Com format=schema o decodificador só emite o objeto; texto inválido
+        aqui é resposta cortada (tratada por repair_truncated_json).
+        """
         try:
-            return json.loads(text.strip())
-        except:
-            pass
-        
-        # Buscar objeto JSON no texto
-        json_match = re.search(r'\{[\s\S]*\}', text)
-        if json_match:
-            json_str = json_match.group(0)
-            try:
-                return json.loads(json_str)
-            except json.JSONDecodeError:
-                pass
-        
-        # Buscar array JSON
-        json_match = re.search(r'\[[\s\S]*\]', text)
-        if json_match:
-            json_str = json_match.group(0)
-            try:
-                return json.loads(json_str)
-            except json.JSONDecodeError:
-                pass
+            data = json.loads(text.strip())
+        except json.JSONDecodeError:
+            raise ValueError(f"Nenhum JSON válido encontrado na resposta: {text[:200]}")
         
-        # Se chegou aqui, não encontrou JSON válido
-        raise ValueError(f"Nenhum JSON válido encontrado na resposta: {text[:200]}")
+        if not isinstance(data, dict):
+            raise ValueError(f"Resposta não é um objeto JSON: {text[:200]}")
+        return data
     
     def _build_metadata(
         self,
@@ -342,6 +1194,9 @@ APENAS JSON:"""
                     evidence=loc.get('evidence', '')
                 )
         
+        missing_fields = raw_data.get(MISSING_FIELDS_KEY, []) + normalized.get(MISSING_FIELDS_KEY, [])
+        telemetry = raw_data.get(TELEMETRY_KEY, []) + normalized.get(TELEMETRY_KEY, [])
+        
         # Construir metadata
         metadata = AcquaplanMetadata(
             file_id=file_id,
@@ -360,7 +1215,11 @@ APENAS JSON:"""
             location_guess=location_guess,
             activities=raw_data.get('activities', []),
             technical_quality=raw_data.get('technical_quality', ''),
-            processing_timestamp=datetime.now().isoformat()
+            processing_timestamp=datetime.now().isoformat(),
+            processing_mode=self.mode,
+            status='partial' if missing_fields else 'complete',
+            missing_fields=missing_fields,
+            telemetry=telemetry
         )
         
         return metadata
@@ -369,35 +1228,47 @@ APENAS JSON:"""
         self,
         image_paths: list,
         source: str = "lightroom",
-        progress_callback: callable = None
+        progress_callback: callable = None,
+        concurrency: int = None,
+        ordered: bool = True,
+        pass2_batch_size: int = None
     ) -> list:
         """
         Processa múltiplas imagens em batch
         
+        Usa o BatchEngine: mantém até `concurrency` requisições em voo no Ollama
+        
         Args:
             image_paths: Lista de caminhos de imagem
             source: Origem dos arquivos
             progress_callback: Função chamada após cada imagem (opcional)
+            concurrency: Requisições simultâneas (padrão: Config.MAX_CONCURRENT_REQUESTS)
+            ordered: Entregar resultados na ordem de entrada (False = ordem de conclusão)
+            pass2_batch_size: Imagens por chamada do Pass 2 (padrão: Config.PASS2_BATCH_SIZE)
         
         Returns:
             Lista de AcquaplanMetadata
         """
+        engine = BatchEngine(
+            self,
+            concurrency=concurrency,
+            source=source,
+            pass2_batch_size=pass2_batch_size
+        )
         results = []
         total = len(image_paths)
         
-        for idx, img_path in enumerate(image_paths, 1):
-            print(f"\n[{idx}/{total}] {Path(img_path).name}")
+        for idx, result in enumerate(engine.run(image_paths, ordered=ordered), 1):
+            print(f"\n[{idx}/{total}] {Path(result.item).name}")
             
-            try:
-                metadata = self.process_image(img_path, source=source)
-                results.append(metadata)
-                
-                if progress_callback:
-                    progress_callback(idx, total, metadata)
-                
-            except Exception as e:
-                print(f"  ❌ Erro: {e}")
+            if not result.ok:
+                print(f"  ❌ Erro: {result.error}")
                 continue
+            
+            results.append(result.metadata)
+            
+            if progress_callback:
+                progress_callback(idx, total, result.metadata)
         
         return results
 
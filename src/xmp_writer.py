@@ -0,0 +1,372 @@
+"""
+Gravação de XMP sidecars em Python puro (sem exiftool)
+Mescla no .xmp existente sem mexer nas configurações de revelação do
+Lightroom (crs:*) nem em nada que não seja nosso
+"""
+
+import os
+import re
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config.acquaplan_config import Config
+
+
+RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+XMP_META = 'adobe:ns:meta/'
+XML_NS = 'http://www.w3.org/XML/1998/namespace'
+XML_LANG = f'{{{XML_NS}}}lang'
+
+# Invólucro do pacote XMP como o Lightroom/Camera Raw grava: cabeçalho,
+# ~2 KB de espaços (edição no lugar por outras ferramentas) e trailer
+XPACKET_BEGIN = '<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>'.encode('utf-8')
+XPACKET_END = b'<?xpacket end="w"?>'
+XPACKET_PADDING = (b' ' * 99 + b'\n') * 20
+
+# Prefixos usados na gravação (os declarados no arquivo existente têm precedência)
+NAMESPACES = {
+    'x': XMP_META,
+    'rdf': RDF,
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'photoshop': 'http://ns.adobe.com/photoshop/1.0/',
+    'xmp': 'http://ns.adobe.com/xap/1.0/',
+    'crs': 'http://ns.adobe.com/camera-raw-settings/1.0/',
+    'lr': 'http://ns.adobe.com/lightroom/1.0/',
+    'acquaplan': Config.XMP_NAMESPACE,
+}
+
+
+class XmpError(ValueError):
+    """Sidecar existente que não é XMP válido (não é sobrescrito)"""
+
+
+@dataclass
+class XmpUpdate:
+    """
+    Campos gravados pelo tagger (equivalentes aos argumentos do exiftool)
+    
+    None deixa a propriedade como está; texto vazio remove, como `-Tag=` no
+    exiftool. Keywords são somadas às que já estão no sidecar (como
+    `-XMP-dc:Subject+=`).
+    """
+    title: Optional[str] = None         # dc:title (x-default)
+    description: Optional[str] = None   # dc:description (x-default)
+    headline: Optional[str] = None      # photoshop:Headline (IPTC Headline)
+    keywords: List[str] = field(default_factory=list)  # dc:subject (IPTC Keywords)
+    custom: Dict[str, str] = field(default_factory=dict)  # acquaplan:<nome>
+
+
+def sidecar_path(photo_path: Path) -> Path:
+    """IMG_0001.CR3 -> IMG_0001.xmp (convenção do Lightroom/Camera Raw)"""
+    return Path(photo_path).with_suffix('.xmp')
+
+
+def _q(prefix: str, name: str) -> str:
+    return f"{{{NAMESPACES[prefix]}}}{name}"
+
+
+_PROLOG = re.compile(rb'(?:\s|\xef\xbb\xbf|<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^>]*>)*', re.S)
+
+
+def _split_packet(data: bytes) -> Tuple[bytes, bytes, bytes]:
+    """
+    Separa o que vem antes e depois do elemento raiz
+    
+    Returns:
+        (prólogo, XML do x:xmpmeta, epílogo) - prólogo e epílogo com o
+        <?xpacket?>, comentários e padding exatamente como estavam
+    """
+    start = _PROLOG.match(data).end()
+    end = len(data)
+    while True:
+        stripped = data[start:end].rstrip()
+        end = start + len(stripped)
+        if stripped.endswith(b'?>'):
+            opening = data.rfind(b'<?', start, end)
+        elif stripped.endswith(b'-->'):
+            opening = data.rfind(b'<!--', start, end)
+        else:
+            break
+        if opening < 0:
+            break
+        end = opening
+    return data[:start], data[start:end], data[end:]
+
+
+class _TreeBuilder(ET.TreeBuilder):
+    """Mantém comentários internos e anota os prefixos declarados no arquivo"""
+    
+    def __init__(self):
+        super().__init__(insert_comments=True, insert_pis=True)
+        self.declared: List[Tuple[str, str]] = []
+    
+    def start_ns(self, prefix: str, uri: str):
+        self.declared.append((prefix, uri))
+
+
+def _parse(data: bytes) -> Tuple[ET.Element, List[Tuple[str, str]]]:
+    """Uma passada: árvore + prefixos declarados no arquivo"""
+    builder = _TreeBuilder()
+    parser = ET.XMLParser(target=builder)
+    try:
+        parser.feed(data)
+        root = parser.close()
+    except ET.ParseError as e:
+        raise XmpError(f"XML inválido: {e}")
+    return root, builder.declared
+
+
+def _serialize(root: ET.Element, declared: Iterable[Tuple[str, str]]) -> bytes:
+    """
+    XML com um mapa de prefixos só desta gravação
+    
+    ET.tostring usa o registro global de ET.register_namespace, que uma
+    gravação concorrente pode alterar; aqui os prefixos vêm do próprio
+    arquivo e de NAMESPACES, e as declarações xmlns vão todas na raiz.
+    """
+    prefixes: Dict[str, str] = {}
+    for prefix, uri in list(declared) + list(NAMESPACES.items()):
+        if prefix and prefix != 'xml' and uri not in prefixes and prefix not in prefixes.values():
+            prefixes[uri] = prefix
+    used: Dict[str, str] = {}
+    
+    def name(qname: str) -> str:
+        if not qname.startswith('{'):
+            return qname
+        uri, local = qname[1:].split('}', 1)
+        if uri == XML_NS:
+            return f"xml:{local}"
+        if uri not in prefixes:
+            n = 0
+            while f"ns{n}" in prefixes.values():
+                n += 1
+            prefixes[uri] = f"ns{n}"
+        used[uri] = prefixes[uri]
+        return f"{prefixes[uri]}:{local}"
+    
+    def attribute(value: str) -> str:
+        return escape(value, {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'})
+    
+    parts: List[str] = []
+    
+    def write(element: ET.Element):
+        if element.tag is ET.Comment:
+            parts.append(f"<!--{element.text or ''}-->")
+        elif element.tag is ET.ProcessingInstruction:
+            parts.append(f"<?{element.text or ''}?>")
+        else:
+            tag = name(element.tag)
+            parts.append(f"<{tag}")
+            if element is root:
+                parts.append(None)  # declarações xmlns, preenchidas no fim
+            for key, value in element.attrib.items():
+                parts.append(f' {name(key)}="{attribute(value)}"')
+            if element.text or len(element):
+                parts.append(f">{escape(element.text or '')}")
+                for child in element:
+                    write(child)
+                parts.append(f"</{tag}>")
+            else:
+                parts.append("/>")
+        if element.tail:
+            parts.append(escape(element.tail))
+    
+    write(root)
+    xmlns = ''.join(f' xmlns:{prefix}="{attribute(uri)}"' for uri, prefix in used.items())
+    return ''.join(xmlns if part is None else part for part in parts).encode('utf-8')
+
+
+def _skeleton() -> ET.Element:
+    root = ET.Element(_q('x', 'xmpmeta'), {_q('x', 'xmptk'): 'Acquaplan XMP'})
+    rdf = ET.SubElement(root, _q('rdf', 'RDF'))
+    ET.SubElement(rdf, _q('rdf', 'Description'), {_q('rdf', 'about'): ''})
+    return root
+
+
+def _descriptions(root: ET.Element) -> List[ET.Element]:
+    if root.tag == _q('x', 'xmpmeta'):
+        rdf = root.find(_q('rdf', 'RDF'))
+    elif root.tag == _q('rdf', 'RDF'):
+        rdf = root
+    else:
+        raise XmpError(f"raiz inesperada: {root.tag}")
+    
+    if rdf is None:
+        raise XmpError("sem rdf:RDF")
+    
+    descriptions = rdf.findall(_q('rdf', 'Description'))
+    if not descriptions:
+        descriptions = [ET.SubElement(rdf, _q('rdf', 'Description'), {_q('rdf', 'about'): ''})]
+    return descriptions
+
+
+def _take(descriptions: List[ET.Element], qname: str) -> Tuple[Optional[str], Optional[ET.Element]]:
+    """
+    Tira a propriedade de todos os rdf:Description
+    
+    Returns:
+        (valor em forma de atributo, primeiro elemento encontrado)
+    """
+    attribute, element = None, None
+    for description in descriptions:
+        if qname in description.attrib:
+            attribute = description.attrib.pop(qname)
+        for child in description.findall(qname):
+            description.remove(child)
+            if element is None:
+                element = child
+    return attribute, element
+
+
+def _set_simple(descriptions: List[ET.Element], target: ET.Element, qname: str, value: Optional[str]):
+    if value is None:
+        return
+    _take(descriptions, qname)
+    if value:
+        ET.SubElement(target, qname).text = value
+
+
+def _set_alt(descriptions: List[ET.Element], target: ET.Element, qname: str, value: Optional[str]):
+    """Lang-alt: troca o x-default e mantém as outras línguas"""
+    if value is None:
+        return
+    _, element = _take(descriptions, qname)
+    if not value:
+        return
+    
+    alt = element.find(_q('rdf', 'Alt')) if element is not None else None
+    if alt is None:
+        element = ET.Element(qname)
+        alt = ET.SubElement(element, _q('rdf', 'Alt'))
+    target.append(element)
+    
+    items = alt.findall(_q('rdf', 'li'))
+    default = next((li for li in items if li.get(XML_LANG) == 'x-default'), None)
+    if default is None:
+        default = ET.Element(_q('rdf', 'li'), {XML_LANG: 'x-default'})
+        alt.insert(0, default)
+    default.text = value
+
+
+def _set_bag_union(descriptions: List[ET.Element], target: ET.Element, qname: str, values: List[str]):
+    """Bag com os itens existentes + os novos (sem repetir)"""
+    _, element = _take(descriptions, qname)
+    
+    existing = []
+    if element is not None:
+        container = element.find(_q('rdf', 'Bag'))
+        if container is None:
+            container = element.find(_q('rdf', 'Seq'))
+        if container is not None:
+            existing = [li.text or '' for li in container.findall(_q('rdf', 'li'))]
+    
+    merged = list(dict.fromkeys(existing + [v for v in values if v]))
+    if not merged:
+        return
+    
+    element = ET.SubElement(target, qname)
+    bag = ET.SubElement(element, _q('rdf', 'Bag'))
+    for item in merged:
+        ET.SubElement(bag, _q('rdf', 'li')).text = item
+
+
+def _indent_inserted(target: ET.Element, original: List[ET.Element], depth: int):
+    """
+    Indenta só o que foi acrescentado ao fim de `target` (1 espaço por nível,
+    como o Lightroom); os nós que já estavam no arquivo ficam como estão
+    
+    Args:
+        original: Filhos de `target` antes da mesclagem
+        depth: Nível de `target` na árvore (raiz = 0)
+    """
+    children = list(target)
+    position = {id(child): idx for idx, child in enumerate(original)}
+    
+    # Filhos originais que ficaram mantêm a ordem; o que vem depois é nosso
+    split, last = len(children), -1
+    for idx, child in enumerate(children):
+        current = position.get(id(child))
+        if current is None or current < last:
+            split = idx
+            break
+        last = current
+    
+    if not children:
+        return
+    inner = '\n' + ' ' * (depth + 1)
+    if split == 0:
+        target.text = inner
+    else:
+        children[split - 1].tail = inner
+    for child in children[split:]:
+        ET.indent(child, space=' ', level=depth + 1)
+        child.tail = inner
+    children[-1].tail = '\n' + ' ' * depth
+
+
+def merge_sidecar(existing: Optional[bytes], update: XmpUpdate) -> bytes:
+    """
+    XMP resultante de aplicar `update` sobre o conteúdo atual do sidecar
+    
+    Só as propriedades do XmpUpdate são tocadas; o resto (crs:*, xmp:Rating,
+    rótulos, histórico...) sai como entrou, inclusive os prefixos, os
+    comentários, a formatação e o invólucro <?xpacket?> com o padding.
+    """
+    created = not (existing and existing.strip())
+    if created:
+        prolog, epilog = b'', b''
+        root, declared = _skeleton(), []
+    else:
+        prolog, body, epilog = _split_packet(existing)
+        root, declared = _parse(body)
+    
+    descriptions = _descriptions(root)
+    target = descriptions[0]
+    original = list(target)
+    
+    _set_alt(descriptions, target, _q('dc', 'title'), update.title)
+    _set_alt(descriptions, target, _q('dc', 'description'), update.description)
+    _set_simple(descriptions, target, _q('photoshop', 'Headline'), update.headline)
+    _set_bag_union(descriptions, target, _q('dc', 'subject'), update.keywords)
+    for name, value in update.custom.items():
+        _set_simple(descriptions, target, _q('acquaplan', name), '' if value is None else str(value))
+    
+    if created:
+        ET.indent(root, space=' ')
+    else:
+        _indent_inserted(target, original, 2 if root.tag == _q('x', 'xmpmeta') else 1)
+    if b'<?xpacket begin' not in prolog:
+        prolog += XPACKET_BEGIN + b'\n'
+    if b'<?xpacket end' not in epilog:
+        epilog = epilog.rstrip() + b'\n' + XPACKET_PADDING + XPACKET_END + b'\n'
+    return prolog + _serialize(root, declared) + epilog
+
+
+def write_sidecar(photo_path: Path, update: XmpUpdate) -> Path:
+    """
+    Grava (ou mescla) o sidecar da foto, atomicamente
+    
+    O conteúdo vai para um temporário na mesma pasta e é renomeado por cima:
+    o Lightroom nunca lê um sidecar pela metade.
+    
+    Returns:
+        Caminho do .xmp
+    """
+    path = sidecar_path(photo_path)
+    existing = path.read_bytes() if path.exists() else None
+    data = merge_sidecar(existing, update)
+    
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    
+    return path
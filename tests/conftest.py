@@ -0,0 +1,23 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Os módulos importam `config.` e `src.` a partir da raiz do repositório
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@pytest.fixture
+def make_pipeline():
+    """VisionPipeline sem Ollama, cache, staging nem pré-triagem"""
+    from src.vision_pipeline import VisionPipeline
+    
+    def make(**kwargs) -> VisionPipeline:
+        options = dict(
+            preprocess=False, cache=False, prescreen=False, staging=False,
+            cascade=False, verify=False
+        )
+        options.update(kwargs)
+        return VisionPipeline(**options)
+    
+    return make
@@ -0,0 +1,149 @@
+import threading
+import time
+from contextlib import nullcontext
+
+from src.batch_engine import Pass2Batcher
+
+
+class FakePipeline:
+    """O que o Pass2Batcher usa do VisionPipeline, sem modelo"""
+    
+    def __init__(self, answer=None):
+        self.answer = answer or (lambda raw: {'id': raw['id'], 'batch': True})
+        self.batches = []
+        self.singles = []
+        self.metrics = self
+    
+    def timed(self, stage):
+        return nullcontext()
+    
+    def with_retry(self, stage, run):
+        return run()
+    
+    def _local_normalization(self, raw_data):
+        return {'id': raw_data['id'], 'local': True} if raw_data.get('local') else None
+    
+    def pass2_normalization_batch(self, raw_items):
+        self.batches.append([raw['id'] for raw in raw_items])
+        return [self.answer(raw) for raw in raw_items]
+    
+    def pass2_normalization(self, raw_data):
+        self.singles.append(raw_data['id'])
+        return {'id': raw_data['id'], 'single': True}
+
+
+def _batcher(pipeline, batch_size=3, max_wait=30.0):
+    return Pass2Batcher(pipeline, threading.BoundedSemaphore(2), batch_size, max_wait)
+
+
+def _normalize_all(batcher, items):
+    """normalize() de cada item numa thread, como os workers do BatchEngine"""
+    results = {}
+    
+    def run(raw):
+        results[raw['id']] = batcher.normalize(raw)
+    
+    threads = [threading.Thread(target=run, args=(raw,)) for raw in items]
+    for thread in threads:
+        thread.start()
+    return results, threads
+
+
+def _join(threads, timeout=5.0):
+    for thread in threads:
+        thread.join(timeout)
+        assert not thread.is_alive()
+
+
+def test_full_batch_goes_in_one_call():
+    pipeline = FakePipeline()
+    batcher = _batcher(pipeline, batch_size=3)
+    for _ in range(3):
+        batcher.expect()
+    
+    results, threads = _normalize_all(batcher, [{'id': i} for i in range(3)])
+    _join(threads)
+    
+    assert [sorted(b) for b in pipeline.batches] == [[0, 1, 2]]
+    assert all(results[i] == {'id': i, 'batch': True} for i in range(3))
+    assert batcher.batches == 1 and batcher.fallbacks == 0
+
+
+def test_partial_batch_flushes_after_max_wait():
+    pipeline = FakePipeline()
+    batcher = _batcher(pipeline, batch_size=3, max_wait=0.05)
+    for _ in range(3):
+        batcher.expect()
+    
+    # Dois itens chegam, o terceiro ainda está no Pass 1
+    results, threads = _normalize_all(batcher, [{'id': 0}, {'id': 1}])
+    _join(threads)
+    
+    assert [sorted(b) for b in pipeline.batches] == [[0, 1]]
+    assert set(results) == {0, 1}
+
+
+def test_end_of_input_flushes_without_waiting():
+    pipeline = FakePipeline()
+    batcher = _batcher(pipeline, batch_size=3, max_wait=30.0)
+    for _ in range(3):
+        batcher.expect()
+    
+    start = time.perf_counter()
+    results, threads = _normalize_all(batcher, [{'id': 0}, {'id': 1}])
+    while len(batcher._queue) < 2:
+        time.sleep(0.001)
+    assert pipeline.batches == []
+    
+    batcher.skip()          # o terceiro falhou no Pass 1
+    batcher.end_of_input()
+    _join(threads)
+    
+    assert [sorted(b) for b in pipeline.batches] == [[0, 1]]
+    assert time.perf_counter() - start < 5.0
+
+
+def test_items_missing_from_batch_are_redone_individually():
+    pipeline = FakePipeline(answer=lambda raw: None if raw['id'] == 1 else {'id': raw['id'], 'batch': True})
+    batcher = _batcher(pipeline, batch_size=2)
+    batcher.expect()
+    batcher.expect()
+    
+    results, threads = _normalize_all(batcher, [{'id': 0}, {'id': 1}])
+    _join(threads)
+    
+    assert results[0] == {'id': 0, 'batch': True}
+    assert results[1] == {'id': 1, 'single': True}
+    assert pipeline.singles == [1]
+    assert batcher.fallbacks == 1
+
+
+def test_failed_batch_falls_back_for_every_item():
+    def broken(raw):
+        raise RuntimeError("lote inválido")
+    
+    pipeline = FakePipeline(answer=broken)
+    batcher = _batcher(pipeline, batch_size=2)
+    batcher.expect()
+    batcher.expect()
+    
+    results, threads = _normalize_all(batcher, [{'id': 0}, {'id': 1}])
+    _join(threads)
+    
+    assert sorted(pipeline.singles) == [0, 1]
+    assert all(results[i]['single'] for i in (0, 1))
+    assert batcher.batches == 0 and batcher.fallbacks == 2
+
+
+def test_local_normalization_skips_the_queue():
+    pipeline = FakePipeline()
+    batcher = _batcher(pipeline, batch_size=2, max_wait=30.0)
+    batcher.expect()
+    batcher.expect()
+    batcher.end_of_input()
+    
+    results, threads = _normalize_all(batcher, [{'id': 0, 'local': True}, {'id': 1}])
+    _join(threads)
+    
+    assert results[0] == {'id': 0, 'local': True}
+    assert pipeline.batches == [[1]]
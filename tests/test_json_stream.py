@@ -0,0 +1,43 @@
+from src.json_stream import JsonObjectScanner, repair_truncated_json
+
+
+def test_repair_returns_complete_object_untouched():
+    assert repair_truncated_json('{"a": 1, "b": [1, 2, 3]} resto') == ({'a': 1, 'b': [1, 2, 3]}, None)
+
+
+def test_repair_keeps_complete_list_items():
+    assert repair_truncated_json('{"a": "x", "b": ["p", "q", "r') == ({'a': 'x', 'b': ['p', 'q']}, 'b')
+
+
+def test_repair_drops_half_written_values():
+    assert repair_truncated_json('{"a": 1, "desc": "meio do te') == ({'a': 1}, 'desc')
+    assert repair_truncated_json('{"a": 1, "n": 12') == ({'a': 1}, 'n')
+    assert repair_truncated_json('{"a": 1, "b": ') == ({'a': 1}, 'b')
+    assert repair_truncated_json('{"a": 1, "b"') == ({'a': 1}, 'b')
+
+
+def test_repair_closes_nested_containers():
+    data, key = repair_truncated_json('texto {"a": {"b": [1, {"c": 2')
+    assert data == {'a': {'b': [1, {}]}}
+    assert key == 'a'
+
+
+def test_repair_ignores_braces_and_escaped_quotes_in_strings():
+    assert repair_truncated_json('{"a": "x\\"y", "b": "{') == ({'a': 'x"y'}, 'b')
+
+
+def test_repair_without_object():
+    assert repair_truncated_json('sem json') == (None, None)
+
+
+def test_scanner_stops_at_root_object_end():
+    scanner = JsonObjectScanner()
+    chunks = ['ok ', '{"a": "}', '{"', ', "b": {"c": 1}', '} resto']
+    
+    assert [scanner.feed(c) for c in chunks] == [False, False, False, False, True]
+    assert scanner.complete
+    assert scanner.text == 'ok {"a": "}{", "b": {"c": 1}}'
+    
+    # Depois de completo, o resto é ignorado
+    assert scanner.feed('mais')
+    assert scanner.text.endswith('}}')
@@ -0,0 +1,60 @@
+from src.keyword_normalizer import KeywordNormalizer, fold
+
+
+def test_fold_removes_accents_and_separators():
+    assert fold('Maré Baixa') == 'mare_baixa'
+    assert fold('  --Ação!! ') == 'acao'
+
+
+def test_keyword_maps_aliases_and_dictionary_terms():
+    normalizer = KeywordNormalizer()
+    assert normalizer.keyword('habitat: Manguezal') == 'bioma:manguezal'
+    assert normalizer.keyword('especie:Ardea alba') == 'fauna:ardea_alba'
+    # Sinônimo do habitat, sem categoria
+    assert normalizer.keyword('mangrove') == 'bioma:manguezal'
+
+
+def test_keyword_unknown_terms_fall_back_to_default_category():
+    normalizer = KeywordNormalizer()
+    assert normalizer.keyword('pescador artesanal') == 'elementos:pescador_artesanal'
+    assert normalizer.keyword('xyz:garça') == 'elementos:garca'
+    assert normalizer.keyword('') is None
+    assert normalizer.keyword('cores: ') is None
+
+
+RAW = {
+    'habitat_guess': 'manguezal',
+    'species_candidates': [
+        {'name_pt': 'Garça-branca', 'name_scientific': 'Ardea alba', 'confidence': 0.9},
+        {'name_pt': 'Urubu', 'confidence': 0.1},
+    ],
+    'activities': ['pesca_artesanal'],
+    'keywords_raw': ['cores: azul, verde', 'Manguezal', 'lama'],
+    'technical_quality': 'nitida',
+    'scene_summary': 'Garça no mangue. Maré baixa',
+    'habitat_evidence': 'raízes aéreas.',
+}
+
+
+def test_normalize_builds_pass2_fields():
+    result = KeywordNormalizer().normalize(RAW)
+    
+    assert result['title'] == 'Manguezal com Garça-branca'
+    assert result['description_short'] == 'Garça no mangue.'
+    assert result['description_long'] == 'Garça no mangue. Maré baixa. Evidências do habitat: raízes aéreas.'
+    assert result['keywords_normalized'] == [
+        'bioma:manguezal', 'fauna:ardea_alba', 'fauna:garca_branca',
+        'atividade:pesca_artesanal', 'tecnica:nitida',
+        'cores:azul', 'cores:verde', 'elementos:lama',
+    ]
+
+
+def test_keywords_skip_low_confidence_species_and_respect_limit():
+    keywords = KeywordNormalizer(max_keywords=3).keywords(RAW)
+    assert keywords == ['bioma:manguezal', 'fauna:ardea_alba', 'fauna:garca_branca']
+    assert not any('urubu' in k for k in KeywordNormalizer().keywords(RAW))
+
+
+def test_title_without_species_or_habitat():
+    assert KeywordNormalizer().title({}) == 'Paisagem costeira'
+    assert KeywordNormalizer().title({'habitat_guess': 'praia'}) == 'Praia'
@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from config.acquaplan_config import AcquaplanMetadata
+from src.near_duplicates import BKTree, cluster_near_duplicates, hamming_distance, propagate_metadata
+
+
+def test_bktree_search_matches_linear_scan():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    # Alguns vizinhos próximos e repetidos
+    values += [values[0] ^ 0b1011, values[1], values[2] ^ (1 << 63)]
+    
+    tree = BKTree()
+    for idx, value in enumerate(values):
+        tree.add(value, idx)
+    
+    for query in values[:20] + [rng.getrandbits(64)]:
+        for radius in (0, 3, 8):
+            expected = sorted(
+                (hamming_distance(query, v), idx) for idx, v in enumerate(values)
+                if hamming_distance(query, v) <= radius
+            )
+            assert sorted(tree.search(query, radius)) == expected
+
+
+def test_bktree_empty():
+    assert BKTree().search(0, 64) == []
+
+
+def test_cluster_uses_first_item_as_representative():
+    hashes = {'a': 0b0000, 'b': 0b0001, 'c': 0b0011, 'far': (1 << 64) - 1}
+    clusters = cluster_near_duplicates(hashes, max_distance=2)
+    
+    assert [(c.representative, c.members) for c in clusters] == [('a', ['b', 'c']), ('far', [])]
+
+
+def test_cluster_does_not_chain_neighbours():
+    # a~b e b~c, mas a≁c: c fica fora do cluster de a
+    hashes = {'a': 0b000000, 'b': 0b000111, 'c': 0b111111}
+    clusters = cluster_near_duplicates(hashes, max_distance=3)
+    
+    assert [(c.representative, c.members) for c in clusters] == [('a', ['b']), ('c', [])]
+
+
+def _metadata(status: str = 'complete', **kwargs) -> AcquaplanMetadata:
+    fields = dict(
+        file_id='rep', source='lightroom', original_filename='IMG_0001.CR3',
+        title='Manguezal', description_short='Curta.', description_long='Longa.',
+        habitat_guess='manguezal', habitat_confidence=0.9, habitat_evidence='raízes',
+        keywords=['bioma:manguezal'], technical_quality='sharp', status=status,
+    )
+    fields.update(kwargs)
+    return AcquaplanMetadata(**fields)
+
+
+def test_propagate_copies_scene_but_not_frame_quality():
+    member = propagate_metadata(_metadata(), 'm1', 'IMG_0002.CR3', technical_quality='blurred')
+    
+    assert member.file_id == 'm1'
+    assert member.original_filename == 'IMG_0002.CR3'
+    assert member.derived_from == 'rep'
+    assert member.keywords == ['bioma:manguezal']
+    assert member.technical_quality == 'blurred'
+    assert member.status == 'complete'
+
+
+def test_propagate_keeps_partial_status_and_copies_lists():
+    source = _metadata('partial', missing_fields=['keywords_normalized'])
+    member = propagate_metadata(source, 'm1', 'IMG_0002.CR3')
+    
+    assert member.status == 'partial'
+    assert member.missing_fields == ['keywords_normalized']
+    member.keywords.append('x')
+    assert source.keywords == ['bioma:manguezal']
+
+
+def test_propagate_refuses_skipped_representative():
+    with pytest.raises(ValueError):
+        propagate_metadata(_metadata('skipped'), 'm1', 'IMG_0002.CR3')
@@ -0,0 +1,78 @@
+import pytest
+
+from src.pass_staging import PassStaging, file_fingerprint
+from src.vision_pipeline import MISSING_FIELDS_KEY
+
+
+META = {
+    'source': 'lightroom', 'file_id': '/fotos/IMG_0001.CR3', 'filename': 'IMG_0001.CR3',
+    'folder': '/fotos', 'fingerprint': '1024:1',
+}
+KEY = PassStaging.make_key(META['source'], META['file_id'])
+
+
+@pytest.fixture
+def staging(tmp_path):
+    store = PassStaging(tmp_path / 'staging.db', max_age_days=0)
+    yield store
+    store.close()
+
+
+def test_output_is_reused_only_with_same_signature_and_fingerprint(staging):
+    staging.put(KEY, 'pass1', 'sig-a', {'scene_summary': 'Praia.'}, META)
+    
+    assert staging.get(KEY, 'pass1', 'sig-a', '1024:1') == {'scene_summary': 'Praia.'}
+    assert staging.get(KEY, 'pass1', 'sig-b', '1024:1') is None
+    assert staging.get(KEY, 'pass1', 'sig-a', '2048:2') is None
+    assert staging.get(KEY, 'pass2', 'sig-a', '1024:1') is None
+    assert staging.reused == 1
+
+
+def test_failure_clears_output_and_complete_removes_image(staging):
+    staging.put(KEY, 'pass1', 'sig', {'a': 1}, META)
+    staging.put(KEY, 'pass2', 'sig', {'b': 2}, META)
+    staging.fail(KEY, 'pass2', RuntimeError('timeout'), META)
+    
+    assert staging.get(KEY, 'pass1', 'sig', '1024:1') == {'a': 1}
+    assert staging.get(KEY, 'pass2', 'sig', '1024:1') is None
+    assert len(staging.pending()) == 1
+    
+    staging.complete(KEY)
+    assert staging.pending() == []
+
+
+def test_file_fingerprint_changes_with_file(tmp_path):
+    photo = tmp_path / 'IMG_0001.CR3'
+    assert file_fingerprint(photo) == ''
+    
+    photo.write_bytes(b'a')
+    first = file_fingerprint(photo)
+    photo.write_bytes(b'ab')
+    assert file_fingerprint(photo) != first
+
+
+@pytest.fixture
+def pipeline(make_pipeline, tmp_path):
+    pipeline = make_pipeline()
+    pipeline.staging = PassStaging(tmp_path / 'pipeline.db', max_age_days=0)
+    yield pipeline
+    pipeline.staging.close()
+
+
+def test_pipeline_resumes_staged_pass_for_same_file(pipeline):
+    entry = pipeline.stage_entry('id-1', 'lightroom', 'IMG_0001.CR3', '/fotos', '1024:1')
+    raw = {'scene_summary': 'Praia.'}
+    
+    assert pipeline.staged(entry, 'pass1') is None
+    pipeline.run_pass(entry, 'pass1', lambda: raw, retry=False)
+    assert pipeline.staged(entry, 'pass1') == raw
+    
+    edited = pipeline.stage_entry('id-1', 'lightroom', 'IMG_0001.CR3', '/fotos', '2048:2')
+    assert pipeline.staged(edited, 'pass1') is None
+
+
+def test_partial_output_is_not_staged(pipeline):
+    entry = pipeline.stage_entry('id-1', 'lightroom', 'IMG_0001.CR3', '/fotos', '1024:1')
+    
+    pipeline.run_pass(entry, 'pass1', lambda: {'scene_summary': 'Pr', MISSING_FIELDS_KEY: ['habitat_guess']}, retry=False)
+    assert pipeline.staged(entry, 'pass1') is None
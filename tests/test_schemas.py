@@ -0,0 +1,20 @@
+from src.schemas import pass1_schema, pass2_batch_schema, pass2_schema
+
+
+def test_schemas_are_fresh_copies():
+    schema = pass1_schema()
+    schema['properties'].clear()
+    schema['required'].append('extra')
+    
+    assert pass1_schema()['properties']
+    assert 'extra' not in pass1_schema()['required']
+
+
+def test_batch_schema_items_are_independent():
+    schema = pass2_batch_schema(['img1', 'img2'])
+    first, second = schema['properties']['img1'], schema['properties']['img2']
+    
+    assert first == second == pass2_schema()
+    first['properties'].pop('title')
+    assert 'title' in second['properties']
+    assert 'title' in pass2_schema()['properties']
@@ -0,0 +1,130 @@
+import time
+
+import ollama
+
+from config.acquaplan_config import Config
+from src.quality_prescreen import QualityReport
+from src.vision_pipeline import MISSING_FIELDS_KEY, TELEMETRY_KEY
+
+
+def test_pass2_cacheable_requires_complete_lists(make_pipeline):
+    pipeline = make_pipeline()
+    complete = {
+        'title': 'Praia', 'description_short': 'Praia.', 'description_long': 'Praia.',
+        'keywords_normalized': [f'elementos:k{i}' for i in range(40)],
+    }
+    
+    assert pipeline._pass2_cacheable(complete)
+    assert not pipeline._pass2_cacheable({**complete, 'keywords_normalized': ['elementos:k0']})
+    assert not pipeline._pass2_cacheable({**complete, MISSING_FIELDS_KEY: ['title']})
+
+
+def test_staging_signature_depends_on_vocabulary_and_pass1_output(make_pipeline):
+    full = make_pipeline(vocabulary='full')
+    compact = make_pipeline(vocabulary='compact')
+    raw = {'scene_summary': 'Praia.', 'keywords_raw': ['areia']}
+    
+    assert full._staging_signature('pass1') != compact._staging_signature('pass1')
+    assert full._staging_signature('pass2', raw) != compact._staging_signature('pass2', raw)
+    assert full._staging_signature('pass2', raw) != full._staging_signature('pass2', {**raw, 'scene_summary': 'Mar.'})
+    # Chaves internas não fazem parte do que o modelo recebe
+    assert full._staging_signature('pass2', raw) == full._staging_signature('pass2', {**raw, TELEMETRY_KEY: [{}]})
+
+
+class FakeStream:
+    """Stream do ollama.chat: pedaços com conteúdo e, no fim, o pedaço done"""
+    
+    def __init__(self, chunks, delay=0.0):
+        self.chunks = chunks
+        self.delay = delay
+        self.read = 0
+        self.closed = False
+    
+    def __iter__(self):
+        for chunk in self.chunks:
+            if self.delay:
+                time.sleep(self.delay)
+            self.read += 1
+            yield chunk
+    
+    def close(self):
+        self.closed = True
+
+
+def _content(text, done=False, **totals):
+    return {'message': {'content': text}, 'done': done, **totals}
+
+
+TOTALS = dict(
+    prompt_eval_count=120, eval_count=9, load_duration=2_000_000,
+    prompt_eval_duration=30_000_000, eval_duration=90_000_000, total_duration=130_000_000,
+)
+REQUEST = {'model': 'fake', 'messages': [{'role': 'user', 'content': 'x'}]}
+
+
+def _streaming(make_pipeline, monkeypatch, stream):
+    pipeline = make_pipeline()
+    pipeline.stream = True
+    monkeypatch.setattr(ollama, 'chat', lambda **request: stream)
+    return pipeline
+
+
+def test_stream_reads_final_chunk_after_object_closes(make_pipeline, monkeypatch):
+    stream = FakeStream([_content('{"a": '), _content('1}'), _content('', done=True, **TOTALS)])
+    pipeline = _streaming(make_pipeline, monkeypatch, stream)
+    
+    data, missing, calls = pipeline._chat_once(REQUEST, 'pass1', ['a'])
+    
+    assert data == {'a': 1} and missing == []
+    assert stream.read == 3 and stream.closed
+    assert calls[0]['estimated'] is False
+    assert calls[0]['prompt_eval_count'] == 120
+    assert calls[0]['load_duration'] == 0.002
+
+
+def test_stream_closes_when_final_chunk_does_not_come(make_pipeline, monkeypatch):
+    monkeypatch.setattr(Config, 'STREAM_DONE_WAIT', 0.05)
+    chunks = [_content('{"a": 1}')] + [_content(' ') for _ in range(200)] + [_content('', done=True, **TOTALS)]
+    stream = FakeStream(chunks, delay=0.005)
+    pipeline = _streaming(make_pipeline, monkeypatch, stream)
+    
+    data, _, calls = pipeline._chat_once(REQUEST, 'pass1', ['a'])
+    
+    assert data == {'a': 1}
+    assert stream.read < len(chunks) and stream.closed
+    assert calls[0]['estimated'] is True
+
+
+def test_early_stop_counts_only_interrupted_generation(make_pipeline, monkeypatch):
+    monkeypatch.setattr(Config, 'STREAM_DONE_WAIT', 0.05)
+    pipeline = make_pipeline()
+    pipeline.stream = True
+    streams = iter([
+        FakeStream([_content('{"a": 1}'), _content('', done=True, **TOTALS)]),
+        FakeStream([_content('{"a": 1}')] + [_content(' ') for _ in range(200)], delay=0.005),
+    ])
+    monkeypatch.setattr(ollama, 'chat', lambda **request: next(streams))
+    
+    pipeline._chat_once(REQUEST, 'pass1', ['a'])
+    assert pipeline.json_timings.summary()['pass1']['early_stops'] == 0
+    # Tokens do Ollama (eval_count), não pedaços recebidos
+    assert pipeline.json_timings.tokens['pass1'] == [9]
+    
+    pipeline._chat_once(REQUEST, 'pass1', ['a'])
+    assert pipeline.json_timings.summary()['pass1']['early_stops'] == 1
+
+
+def test_screen_reuses_report_measured_before(make_pipeline):
+    pipeline = make_pipeline(hopeless_policy='skip')
+    
+    class NoAssess:
+        def assess(self, image_path):
+            raise AssertionError("pré-triagem medida de novo")
+    
+    pipeline.prescreen = NoAssess()
+    report = QualityReport('underexposed', 0.0, 2.0, 0.99, 0.0, hopeless=True, reason='black_frame')
+    
+    assert pipeline.screen('/fotos/IMG_1.CR3', '/fotos', report) == (report, 'skip')
+    assert pipeline.prescreen_stats.summary() == {
+        '/fotos': {'underexposed': 1, 'skip:black_frame': 1}
+    }
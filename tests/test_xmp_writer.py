@@ -0,0 +1,140 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from src.xmp_writer import XmpError, XmpUpdate, merge_sidecar, sidecar_path, write_sidecar
+
+
+LIGHTROOM_SIDECAR = (
+    '<?xpacket begin="﻿" id="W5M0MpCehiHzreSzNTczkc9d"?>\n'
+    '<!-- sidecar do Lightroom -->\n'
+    '<x:xmpmeta xmlns:x="adobe:ns:meta/" x:xmptk="Adobe XMP Core 7.0">\n'
+    ' <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">\n'
+    '  <rdf:Description rdf:about=""\n'
+    '    xmlns:crs="http://ns.adobe.com/camera-raw-settings/1.0/"\n'
+    '    xmlns:xmp="http://ns.adobe.com/xap/1.0/"\n'
+    '    xmlns:dc="http://purl.org/dc/elements/1.1/"\n'
+    '    xmlns:photoshop="http://ns.adobe.com/photoshop/1.0/"\n'
+    '    xmlns:Iptc4xmpCore="http://iptc.org/std/Iptc4xmpCore/1.0/xmlns/"\n'
+    '   crs:Exposure2012="+0.35" xmp:Rating="3" Iptc4xmpCore:Location="Itajaí"\n'
+    '   photoshop:Headline="Manchete antiga">\n'
+    '   <crs:ToneCurvePV2012><rdf:Seq><rdf:li>0, 0</rdf:li><rdf:li>255, 255</rdf:li></rdf:Seq></crs:ToneCurvePV2012>\n'
+    '   <dc:subject><rdf:Bag><rdf:li>porto</rdf:li><rdf:li>draga</rdf:li></rdf:Bag></dc:subject>\n'
+    '   <dc:title><rdf:Alt>\n'
+    '    <rdf:li xml:lang="x-default">Título antigo</rdf:li>\n'
+    '    <rdf:li xml:lang="en-US">Old title</rdf:li>\n'
+    '   </rdf:Alt></dc:title>\n'
+    '  </rdf:Description>\n'
+    ' </rdf:RDF>\n'
+    '</x:xmpmeta>\n'
+    + (' ' * 99 + '\n') * 3 +
+    '<?xpacket end="w"?>'
+).encode('utf-8')
+
+NS = {
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'crs': 'http://ns.adobe.com/camera-raw-settings/1.0/',
+    'photoshop': 'http://ns.adobe.com/photoshop/1.0/',
+}
+
+
+def _tree(data: bytes) -> ET.Element:
+    body = data.split(b'?>', 1)[1].rsplit(b'<?xpacket', 1)[0]
+    return ET.fromstring(body)
+
+
+def _description(data: bytes) -> ET.Element:
+    return _tree(data).find('rdf:RDF/rdf:Description', NS)
+
+
+def test_keywords_are_unioned_with_existing_bag():
+    out = merge_sidecar(LIGHTROOM_SIDECAR, XmpUpdate(keywords=['draga', 'bioma:estuario']))
+    items = [li.text for li in _description(out).findall('dc:subject/rdf:Bag/rdf:li', NS)]
+    assert items == ['porto', 'draga', 'bioma:estuario']
+
+
+def test_empty_string_deletes_and_none_leaves_as_is():
+    out = merge_sidecar(LIGHTROOM_SIDECAR, XmpUpdate(headline=''))
+    description = _description(out)
+    
+    assert description.find('photoshop:Headline', NS) is None
+    assert f"{{{NS['photoshop']}}}Headline" not in description.attrib
+    # title=None: lang-alt intacto
+    items = description.findall('dc:title/rdf:Alt/rdf:li', NS)
+    assert [li.text for li in items] == ['Título antigo', 'Old title']
+
+
+def test_title_replaces_only_x_default():
+    out = merge_sidecar(LIGHTROOM_SIDECAR, XmpUpdate(title='Garça no manguezal'))
+    items = _description(out).findall('dc:title/rdf:Alt/rdf:li', NS)
+    assert [li.text for li in items] == ['Garça no manguezal', 'Old title']
+
+
+def test_develop_settings_and_foreign_prefixes_are_preserved():
+    out = merge_sidecar(LIGHTROOM_SIDECAR, XmpUpdate(title='Novo', keywords=['x'], custom={'Habitat': 'praia'}))
+    description = _description(out)
+    text = out.decode('utf-8')
+    
+    assert description.get(f"{{{NS['crs']}}}Exposure2012") == '+0.35'
+    curve = description.findall('crs:ToneCurvePV2012/rdf:Seq/rdf:li', NS)
+    assert [li.text for li in curve] == ['0, 0', '255, 255']
+    assert 'Iptc4xmpCore:Location="Itajaí"' in text
+    assert 'acquaplan:Habitat' in text
+    assert 'ns0:' not in text
+
+
+def test_xpacket_wrapper_and_comments_are_kept():
+    out = merge_sidecar(LIGHTROOM_SIDECAR, XmpUpdate(keywords=['x']))
+    
+    assert out.startswith('<?xpacket begin="﻿" id="W5M0MpCehiHzreSzNTczkc9d"?>'.encode('utf-8'))
+    assert b'<!-- sidecar do Lightroom -->' in out
+    assert out.endswith(b'<?xpacket end="w"?>')
+    
+    again = merge_sidecar(out, XmpUpdate(keywords=['y']))
+    assert again.count(b'<?xpacket begin') == 1
+    assert again.count(b'<?xpacket end') == 1
+
+
+def test_new_sidecar_gets_xpacket_wrapper():
+    out = merge_sidecar(None, XmpUpdate(title='Praia', keywords=['bioma:praia']))
+    
+    assert out.startswith(b'<?xpacket begin=')
+    assert out.rstrip().endswith(b'<?xpacket end="w"?>')
+    items = _description(out).findall('dc:subject/rdf:Bag/rdf:li', NS)
+    assert [li.text for li in items] == ['bioma:praia']
+
+
+def test_prefixes_are_not_registered_globally():
+    merge_sidecar(LIGHTROOM_SIDECAR, XmpUpdate(keywords=['x']))
+    assert 'http://iptc.org/std/Iptc4xmpCore/1.0/xmlns/' not in ET._namespace_map
+
+
+def test_invalid_sidecar_is_rejected():
+    with pytest.raises(XmpError):
+        merge_sidecar(b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF', XmpUpdate())
+
+
+def test_write_sidecar_merges_in_place(tmp_path):
+    photo = tmp_path / 'IMG_0001.CR3'
+    sidecar_path(photo).write_bytes(LIGHTROOM_SIDECAR)
+    
+    path = write_sidecar(photo, XmpUpdate(keywords=['bioma:estuario']))
+    
+    assert path == tmp_path / 'IMG_0001.xmp'
+    assert [p.name for p in tmp_path.iterdir()] == ['IMG_0001.xmp']
+    assert b'bioma:estuario' in path.read_bytes()
+    assert b'crs:Exposure2012="+0.35"' in path.read_bytes()
+
+
+def test_existing_nodes_keep_their_formatting():
+    out = merge_sidecar(LIGHTROOM_SIDECAR, XmpUpdate(description='Curta.', keywords=['x'])).decode('utf-8')
+    
+    # Nó do Lightroom numa linha só continua numa linha só
+    assert (
+        '   <crs:ToneCurvePV2012><rdf:Seq><rdf:li>0, 0</rdf:li><rdf:li>255, 255</rdf:li>'
+        '</rdf:Seq></crs:ToneCurvePV2012>\n'
+    ) in out
+    # Os nós gravados entram indentados no nível do rdf:Description
+    assert '   <dc:description>\n    <rdf:Alt>\n     <rdf:li xml:lang="x-default">Curta.</rdf:li>' in out
+    assert '   </dc:subject>\n  </rdf:Description>' in out